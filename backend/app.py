@@ -1,40 +1,40 @@
-from flask import Flask, request, jsonify, session
+from flask import Flask, request, jsonify, session, Response, stream_with_context
 from flask_cors import CORS
 from database import db, init_db
-from models import User, MCQSet, MCQ, Test, TestAnswer
-from mcq_ai import generate_mcqs, generate_mcqs_from_pdf, generate_mcqs_from_topic
+from models import User, MCQSet, Test, GenerationJob
+from mcq_ai import generate_mcqs, generate_mcqs_from_pdf
+from mcq_ai import stream_mcqs, stream_mcqs_from_pdf
+from question_pool import generate_topic_mcqs, stream_topic_mcqs
+from mcq_store import save_mcq_set, save_test_submission
 from summarize_ai import generate_summary, generate_summary_from_pdf
-from datetime import timedelta
+import jobs
+import json
+import time
+import logging
+from sqlalchemy import select, func, case, or_, and_
+from datetime import datetime, timedelta
 import os
 from dotenv import load_dotenv
+from logging_config import configure_logging
+from metrics import registry, HTTP_REQUEST_SECONDS
+from tracing import start_span
 
 basedir = os.path.abspath(os.path.dirname(__file__))
 dotenv_path = os.path.join(basedir, '.env')
 load_dotenv(dotenv_path)
 
-groq_api_key = os.getenv('GROQ_API_KEY')
-gemini_api_key = os.getenv('GEMINI_API_KEY')
-print("\n" + "="*60)
-print("[v0] ENVIRONMENT VARIABLE CHECK")
-print("="*60)
-print(f"Backend directory: {basedir}")
-print(f".env file path: {dotenv_path}")
-print(f".env file exists: {os.path.exists(dotenv_path)}")
-print(f"GROQ_API_KEY exists: {groq_api_key is not None}")
-if groq_api_key:
-    print(f"GROQ_API_KEY value: {groq_api_key[:10]}...{groq_api_key[-10:]}")
-else:
-    print("⚠️  WARNING: GROQ_API_KEY not found!")
-    print(f"   Make sure .env file exists at: {dotenv_path}")
-    print("   and contains: GROQ_API_KEY=your_actual_key_here")
-print(f"GEMINI_API_KEY exists: {gemini_api_key is not None}")
-if gemini_api_key:
-    print(f"GEMINI_API_KEY value: {gemini_api_key[:10]}...{gemini_api_key[-10:]}")
-else:
-    print("⚠️  WARNING: GEMINI_API_KEY not found!")
-    print(f"   Make sure .env file exists at: {dotenv_path}")
-    print("   and contains: GEMINI_API_KEY=your_actual_key_here")
-print("="*60 + "\n")
+HISTORY_PAGE_SIZE = int(os.getenv('HISTORY_PAGE_SIZE', '50'))
+HISTORY_MAX_PAGE_SIZE = int(os.getenv('HISTORY_MAX_PAGE_SIZE', '200'))
+
+configure_logging()
+logger = logging.getLogger(__name__)
+
+# Only report whether keys are set; their values never go to the logs
+for key_name in ('GROQ_API_KEY', 'GEMINI_API_KEY'):
+    if os.getenv(key_name):
+        logger.info("%s is set", key_name)
+    else:
+        logger.warning("%s not found; add it to %s", key_name, dotenv_path)
 
 app = Flask(__name__)
 
@@ -59,22 +59,258 @@ CORS(app,
      methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"])
 
 init_db(app)
+jobs.start_workers(app)
 
 @app.before_request
-def log_session_info():
-    print(f"\n{'='*60}")
-    print(f"[v0] REQUEST: {request.method} {request.path}")
-    print(f"[v0] Session ID: {session.get('_id', 'NO SESSION')}")
-    print(f"[v0] User ID in session: {session.get('user_id', 'NOT SET')}")
-    print(f"[v0] Session permanent: {session.permanent}")
-    print(f"[v0] Cookies received: {list(request.cookies.keys())}")
-    print(f"{'='*60}\n")
+def start_request_timer():
+    request.started_at = time.perf_counter()
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    # Root of the request's trace; joins the caller's trace when it sends a traceparent header
+    request.span = start_span(f"{request.method} {route}", traceparent=request.headers.get('traceparent'), kind=2,
+                              method=request.method, route=route)
+
+@app.after_request
+def log_request(response):
+    duration = time.perf_counter() - getattr(request, 'started_at', time.perf_counter())
+    # Route templates, not paths, so ids in URLs don't create new series
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    HTTP_REQUEST_SECONDS.observe(duration, method=request.method, route=route, status=response.status_code)
+    request.span.set_attribute('status', response.status_code)
+    if response.status_code >= 500:
+        request.span.set_error(f"HTTP {response.status_code}")
+    # Sampled access log; skipped entirely unless INFO is enabled
+    if logger.isEnabledFor(logging.INFO):
+        logger.info("%s %s %s", request.method, request.path, response.status_code, extra={
+            'sample': True,
+            'user_id': session.get('user_id'),
+            'duration_ms': round(duration * 1000, 1)
+        })
+    return response
+
+@app.teardown_request
+def end_request_span(error=None):
+    # Runs after streamed responses finish, so the span covers the whole stream
+    request_span = getattr(request, 'span', None)
+    if request_span is not None:
+        if error is not None:
+            request_span.record_exception(error)
+        request_span.end()
 
 def get_current_user():
     """Get user_id from session. Returns None if not logged in."""
-    user_id = session.get('user_id')
-    print(f"[v0] get_current_user() -> {user_id}")
-    return user_id
+    return session.get('user_id')
+
+def wants_async():
+    """True when the client asked for a background job instead of waiting for the result."""
+    value = request.args.get('async') or request.form.get('async')
+    if value is None and request.is_json:
+        value = (request.get_json(silent=True) or {}).get('async')
+    return str(value).lower() in ('1', 'true', 'yes')
+
+# Request parsing, validation and response building shared by the views below
+# and the async views in asgi.py, which differ only in how they generate.
+
+NO_MCQS_ERROR = 'No MCQs were generated. Please check if your text is meaningful and try again.'
+NO_SUMMARY_ERROR = 'No summary was generated. Please check if your text is meaningful and try again.'
+MISSING_FIELD_ERRORS = {
+    'text': 'Text is required for MCQ generation',
+    'source_text': 'Source text is required',
+    'topic': 'Topic is required for MCQ generation'
+}
+
+def read_int_field(name, default):
+    """Return (value, error_response) for an integer form field."""
+    try:
+        return int(request.form.get(name, default)), None
+    except ValueError:
+        return None, (jsonify({'error': f'{name} must be a whole number'}), 400)
+
+def read_generation_form():
+    """
+    Return (source_type, num_questions, difficulty, error_response) of a
+    multipart generation request; error_response is None for a valid form.
+    """
+    num_questions, error = read_int_field('num_questions', 5)
+    return request.form.get('source_type', 'text'), num_questions, request.form.get('difficulty', 'medium'), error
+
+def read_mcq_source(source_type, text_field='text', check_filename=False):
+    """
+    Validate the source of a multipart MCQ request.
+    
+    Returns (source, None) with the uploaded PDF, the topic or the text (any
+    other source_type counts as text), or (None, error_response) when the
+    source is missing.
+    """
+    if source_type == 'pdf':
+        pdf_file = request.files.get('pdf_file')
+        if pdf_file is None:
+            return None, (jsonify({'error': 'PDF file is required'}), 400)
+        if check_filename and pdf_file.filename == '':
+            return None, (jsonify({'error': 'No file selected'}), 400)
+        if check_filename and not pdf_file.filename.endswith('.pdf'):
+            return None, (jsonify({'error': 'Only PDF files are allowed'}), 400)
+        return pdf_file, None
+    
+    field = 'topic' if source_type == 'topic' else text_field
+    value = request.form.get(field, '')
+    if not value:
+        return None, (jsonify({'error': MISSING_FIELD_ERRORS[field]}), 400)
+    return value, None
+
+def read_test_request():
+    """
+    Parse and validate a test creation request, multipart or JSON.
+    
+    Returns (source_type, source, num_questions, difficulty, time_duration,
+    error_response); error_response is None for a valid request.
+    """
+    if request.content_type and 'multipart/form-data' in request.content_type:
+        source_type, num_questions, difficulty, error = read_generation_form()
+        time_duration, duration_error = read_int_field('time_duration', 10)
+        error = error or duration_error
+        if error:
+            return source_type, None, num_questions, difficulty, time_duration, error
+        source, error = read_mcq_source(source_type, text_field='source_text', check_filename=True)
+        return source_type, source, num_questions, difficulty, time_duration, error
+    
+    data = request.get_json()
+    source = data.get('source_text', '')
+    error = None if source else (jsonify({'error': MISSING_FIELD_ERRORS['source_text']}), 400)
+    return 'text', source, data.get('num_questions', 5), data.get('difficulty', 'medium'), data.get('time_duration', 10), error
+
+def read_summary_request():
+    """
+    Return (source_type, summary_length, source, error_response) of a
+    summarization request; source is None for an unknown source_type.
+    """
+    source_type = request.form.get('source_type', 'text')
+    summary_length = request.form.get('summary_length', 'medium')
+    if source_type == 'text':
+        source = request.form.get('text', '')
+        if not source:
+            return source_type, summary_length, None, (jsonify({'error': 'Text is required for summarization'}), 400)
+    elif source_type == 'pdf':
+        source = request.files.get('pdf_file')
+        if source is None:
+            return source_type, summary_length, None, (jsonify({'error': 'PDF file is required'}), 400)
+    else:
+        source = None
+    return source_type, summary_length, source, None
+
+def generate_for_source(source_type, source, num_questions, difficulty, user_id=None):
+    """Generate MCQs from a source returned by read_mcq_source()."""
+    if source_type == 'pdf':
+        return generate_mcqs_from_pdf(source, num_questions, difficulty)
+    if source_type == 'topic':
+        return generate_topic_mcqs(source, num_questions, difficulty, user_id=user_id)
+    return generate_mcqs(source, num_questions, difficulty)
+
+def stream_for_source(source_type, source, num_questions, difficulty, user_id=None):
+    """generate_for_source() one MCQ at a time."""
+    if source_type == 'pdf':
+        return stream_mcqs_from_pdf(source, num_questions, difficulty)
+    if source_type == 'topic':
+        return stream_topic_mcqs(source, num_questions, difficulty, user_id=user_id)
+    return stream_mcqs(source, num_questions, difficulty)
+
+def save_for_user(user_id, source_type, difficulty, mcqs):
+    """Save a generated set for a signed-in user; returns the response fields reporting the outcome."""
+    if user_id is None:
+        return {'saved': False}
+    try:
+        save_mcq_set(user_id, source_type, difficulty, mcqs)
+    except Exception as e:
+        logger.exception("Saving MCQ set failed")
+        db.session.rollback()
+        return {'saved': False, 'save_error': str(e)}
+    return {'saved': True}
+
+def generation_result(user_id, saved, **result):
+    """Body of a successful MCQ generation response (or the done event of a stream)."""
+    return {
+        'message': 'MCQs generated successfully',
+        **result,
+        'authenticated': user_id is not None,
+        'user_id': user_id,
+        **saved
+    }
+
+def mcq_response(user_id, source_type, difficulty, mcqs):
+    """Response to a finished MCQ generation; the set is saved for signed-in users."""
+    if not mcqs:
+        logger.warning("No MCQs generated from %s", source_type)
+        return jsonify({'error': NO_MCQS_ERROR}), 500
+    
+    logger.info("Generated %d MCQs", len(mcqs))
+    saved = save_for_user(user_id, source_type, difficulty, mcqs)
+    return jsonify(generation_result(user_id, saved, mcqs=mcqs)), 200
+
+def test_response(mcqs, difficulty, time_duration):
+    """Response to a test creation request."""
+    if not mcqs:
+        return jsonify({'error': 'Could not generate MCQs'}), 400
+    
+    return jsonify({
+        'message': 'Test created successfully',
+        'test_data': {
+            'num_questions': len(mcqs),
+            'difficulty': difficulty,
+            'time_duration': time_duration,
+            'mcqs': mcqs
+        }
+    }), 200
+
+def summary_response(source_type, summary):
+    """Response to a summarization request."""
+    if not summary:
+        logger.warning("No summary generated from %s", source_type)
+        return jsonify({'error': NO_SUMMARY_ERROR}), 500
+    
+    logger.info("Summary generated (%d chars)", len(summary))
+    return jsonify({
+        'message': 'Summary generated successfully',
+        'summary': summary
+    }), 200
+
+def generation_error(error, action='MCQ generation'):
+    """
+    Response for an exception raised while generating: 400 for validation
+    errors such as a missing API key, 500 otherwise. Call from the except block.
+    """
+    if isinstance(error, ValueError):
+        logger.warning("Validation error: %s", error)
+        return jsonify({'error': str(error)}), 400
+    logger.exception("%s failed", action)
+    return jsonify({'error': f"{action} failed: {str(error)}"}), 500
+
+def enqueue_generation(kind, user_id, source_type, source, num_questions, difficulty, time_duration=None):
+    """Queue a validated multipart generation request as a background job."""
+    params = {
+        'source_type': source_type,
+        'num_questions': num_questions,
+        'difficulty': difficulty
+    }
+    if time_duration is not None:
+        params['time_duration'] = time_duration
+    source_blob = None
+    
+    if source_type == 'pdf':
+        source_blob = source.read()
+    elif source_type == 'topic':
+        params['topic'] = source
+    else:
+        params['text'] = source
+    
+    job = jobs.enqueue_job(kind, params, user_id=user_id, source_blob=source_blob)
+    logger.info("Queued %s generation job %s", kind, job.id)
+    
+    return jsonify({
+        'message': 'Generation job queued',
+        'job_id': job.id,
+        'status': job.status,
+        'status_url': f"/api/jobs/{job.id}",
+        'result_url': f"/api/jobs/{job.id}/result"
+    }), 202
 
 # AUTHENTICATION ROUTES
 
@@ -107,7 +343,7 @@ def signup():
         
         session['user_id'] = user.id
         session.permanent = True
-        print(f"[v0] User {user.id} signed up and logged in via session")
+        logger.info("User %s signed up", user.id)
         
         return jsonify({
             'message': 'User registered successfully',
@@ -140,14 +376,7 @@ def login():
         session['user_id'] = user.id
         session.permanent = True
         
-        print(f"\n{'*'*60}")
-        print(f"[v0] ✓✓✓ LOGIN SUCCESSFUL ✓✓✓")
-        print(f"[v0] User ID: {user.id}")
-        print(f"[v0] Email: {user.email}")
-        print(f"[v0] Session ID: {session.get('_id', 'GENERATED')}")
-        print(f"[v0] Session user_id: {session.get('user_id')}")
-        print(f"[v0] Session permanent: {session.permanent}")
-        print(f"{'*'*60}\n")
+        logger.info("User %s logged in", user.id)
         
         return jsonify({
             'message': 'Login successful',
@@ -181,7 +410,7 @@ def verify_session():
 def logout():
     """Logout user by clearing session"""
     session.pop('user_id', None)
-    print("[v0] User logged out, session cleared")
+    logger.info("User logged out")
     return jsonify({'message': 'Logged out successfully'}), 200
 
 # MCQ GENERATION ROUTES
@@ -190,150 +419,107 @@ def logout():
 def generate_mcq():
     """Generate MCQs from text or PDF (public or authenticated)"""
     
-    print(f"\n{'#'*60}")
-    print("[v0] MCQ GENERATION - SESSION CHECK")
-    print(f"{'#'*60}")
-    print(f"Session exists: {bool(session)}")
-    print(f"Session keys: {list(session.keys())}")
-    print(f"Session user_id: {session.get('user_id', 'NOT SET')}")
-    print(f"Session _id: {session.get('_id', 'NOT SET')}")
-    print(f"Cookies in request: {dict(request.cookies)}")
-    print(f"{'#'*60}\n")
-    
     user_id = get_current_user()
-    is_authenticated = user_id is not None
-    
-    print(f"[BACKEND AUTH CHECK]")
-    print(f"User ID from session: {user_id}")
-    print(f"Is Authenticated: {is_authenticated}")
     
     try:
-        # Get form data
-        source_type = request.form.get('source_type', 'text')
-        num_questions = int(request.form.get('num_questions', 5))
-        difficulty = request.form.get('difficulty', 'medium')
-        
-        print(f"Generating {num_questions} MCQs from {source_type} (difficulty: {difficulty})")
+        source_type, num_questions, difficulty, error = read_generation_form()
+        if error:
+            return error
         
-        mcqs = []
-        try:
-            if source_type == 'text':
-                text = request.form.get('text', '')
-                if not text:
-                    return jsonify({'error': 'Text is required for MCQ generation'}), 400
-                print(f"[v0] Generating MCQs from text (length: {len(text)} chars)")
-                mcqs = generate_mcqs(text, num_questions, difficulty)
-            
-            elif source_type == 'pdf':
-                if 'pdf_file' not in request.files:
-                    return jsonify({'error': 'PDF file is required'}), 400
-                
-                pdf_file = request.files['pdf_file']
-                print(f"[v0] Generating MCQs from PDF: {pdf_file.filename}")
-                mcqs = generate_mcqs_from_pdf(pdf_file, num_questions, difficulty)
-            
-            elif source_type == 'topic':
-                topic = request.form.get('topic', '')
-                if not topic:
-                    return jsonify({'error': 'Topic is required for MCQ generation'}), 400
-                print(f"[v0] Generating MCQs from topic: {topic}")
-                mcqs = generate_mcqs_from_topic(topic, num_questions, difficulty)
-            
-            if not mcqs or len(mcqs) == 0:
-                error_msg = 'No MCQs were generated. Please check if your text is meaningful and try again.'
-                print(f"[v0] ERROR: {error_msg}")
-                return jsonify({'error': error_msg}), 500
-            
-            print(f"[v0] ✓ Generated {len(mcqs)} MCQs successfully")
-        
-        except ValueError as ve:
-            # Handle missing API key or validation errors
-            error_msg = str(ve)
-            print(f"[v0] VALIDATION ERROR: {error_msg}")
-            return jsonify({'error': error_msg}), 400
+        logger.info("Generating %s MCQs from %s (difficulty: %s)", num_questions, source_type, difficulty,
+                    extra={'user_id': user_id})
         
-        except Exception as gen_error:
-            # Handle any other generation errors
-            error_msg = f"MCQ generation failed: {str(gen_error)}"
-            print(f"[v0] GENERATION ERROR: {error_msg}")
-            import traceback
-            traceback.print_exc()
-            return jsonify({'error': error_msg}), 500
-        
-        # If user is logged in, save to database
-        saved_successfully = False
-        save_error = None
-        
-        if is_authenticated and user_id:
-            print(f"\n--- SAVING TO DATABASE ---")
-            print(f"Authenticated user {user_id} - attempting to save MCQs...")
-            try:
-                # Create MCQ set
-                mcq_set = MCQSet(
-                    user_id=user_id,
-                    title=f"MCQ Set - {source_type.upper()}",
-                    source_type=source_type,
-                    difficulty=difficulty
-                )
-                db.session.add(mcq_set)
-                db.session.flush()
-                
-                print(f"✓ Created MCQ set with ID: {mcq_set.id}")
-                
-                # Add all MCQs
-                for idx, mcq_data in enumerate(mcqs):
-                    mcq = MCQ(
-                        mcq_set_id=mcq_set.id,
-                        question=mcq_data['question'],
-                        option_a=mcq_data['option_a'],
-                        option_b=mcq_data['option_b'],
-                        option_c=mcq_data['option_c'],
-                        option_d=mcq_data['option_d'],
-                        correct_answer=mcq_data['correct_answer'],
-                        difficulty=mcq_data.get('difficulty', difficulty)
-                    )
-                    db.session.add(mcq)
-                
-                db.session.commit()
-                saved_successfully = True
-                print(f"✓✓✓ ALL {len(mcqs)} MCQs SAVED TO DATABASE SUCCESSFULLY!")
-                
-            except Exception as save_error_ex:
-                save_error = str(save_error_ex)
-                print(f"✗ Database save error: {save_error}")
-                import traceback
-                traceback.print_exc()
-                db.session.rollback()
-        else:
-            print(f"\n--- NOT SAVING ---")
-            print(f"Reason: is_authenticated={is_authenticated}, user_id={user_id}")
-        
-        response_data = {
-            'message': 'MCQs generated successfully',
-            'mcqs': mcqs,
-            'saved': saved_successfully,
-            'authenticated': is_authenticated,
-            'user_id': user_id
-        }
+        source, error = read_mcq_source(source_type)
+        if error:
+            return error
         
-        if save_error:
-            response_data['save_error'] = save_error
+        if wants_async():
+            return enqueue_generation('mcq', user_id, source_type, source, num_questions, difficulty)
         
-        print(f"\n--- RESPONSE ---")
-        print(f"authenticated: {is_authenticated}")
-        print(f"saved: {saved_successfully}")
-        print(f"user_id: {user_id}")
-        print(f"----------------\n")
+        try:
+            mcqs = generate_for_source(source_type, source, num_questions, difficulty, user_id)
+        except Exception as gen_error:
+            return generation_error(gen_error)
         
-        return jsonify(response_data), 200
+        return mcq_response(user_id, source_type, difficulty, mcqs)
         
     except Exception as e:
         db.session.rollback()
-        print(f"\n✗✗✗ CRITICAL ERROR in generate_mcq: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Unhandled error in generate_mcq")
         return jsonify({'error': f'Server error: {str(e)}'}), 500
 
+SSE_HEADERS = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+
+def sse_event(event, data):
+    """Format one Server-Sent Events message."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.route('/api/mcq/generate/stream', methods=['POST'])
+def generate_mcq_stream():
+    """Generate MCQs from text, PDF or topic and stream each one as a Server-Sent Event"""
+    user_id = get_current_user()
+    
+    source_type, num_questions, difficulty, error = read_generation_form()
+    if error:
+        return error
+    source, error = read_mcq_source(source_type)
+    if error:
+        return error
+    mcq_stream = stream_for_source(source_type, source, num_questions, difficulty, user_id)
+    
+    logger.info("Streaming %s MCQs from %s (difficulty: %s)", num_questions, source_type, difficulty,
+                extra={'user_id': user_id})
+    
+    def events():
+        mcqs = []
+        try:
+            for mcq in mcq_stream:
+                mcqs.append(mcq)
+                yield sse_event('mcq', dict(mcq, index=len(mcqs) - 1))
+        except Exception as e:
+            logger.exception("Streamed MCQ generation failed")
+            yield sse_event('error', {'error': f"MCQ generation failed: {str(e)}"})
+            return
+        
+        if not mcqs:
+            yield sse_event('error', {'error': NO_MCQS_ERROR})
+            return
+        
+        saved = save_for_user(user_id, source_type, difficulty, mcqs)
+        yield sse_event('done', generation_result(user_id, saved, count=len(mcqs)))
+    
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers=SSE_HEADERS)
+
+def paginate_history(query, model, time_column):
+    """
+    Keyset-paginate a user's history newest first.
+    
+    Reads ?limit= and ?after=<timestamp>,<id> (the next_cursor of the previous
+    page) and returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    limit = request.args.get('limit', HISTORY_PAGE_SIZE, type=int)
+    limit = max(1, min(limit, HISTORY_MAX_PAGE_SIZE))
+    
+    after = request.args.get('after')
+    if after:
+        try:
+            after_time, after_id = after.rsplit(',', 1)
+            after_time, after_id = datetime.fromisoformat(after_time), int(after_id)
+        except ValueError:
+            raise ValueError('Invalid cursor')
+        query = query.filter(or_(
+            time_column < after_time,
+            and_(time_column == after_time, model.id < after_id)
+        ))
+    
+    rows = query.order_by(time_column.desc(), model.id.desc()).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, f"{getattr(last, time_column.key).isoformat()},{last.id}"
+
 @app.route('/api/mcq/history', methods=['GET'])
 def get_mcq_history():
     """Get user's MCQ generation history"""
@@ -343,12 +529,15 @@ def get_mcq_history():
         if not user_id:
             return jsonify({'error': 'Authentication required'}), 401
         
-        mcq_sets = MCQSet.query.filter_by(user_id=user_id).order_by(MCQSet.created_at.desc()).all()
+        mcq_sets, next_cursor = paginate_history(MCQSet.query.filter_by(user_id=user_id), MCQSet, MCQSet.created_at)
         
         return jsonify({
-            'mcq_sets': [mcq_set.to_dict() for mcq_set in mcq_sets]
+            'mcq_sets': [mcq_set.to_dict() for mcq_set in mcq_sets],
+            'next_cursor': next_cursor
         }), 200
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -385,72 +574,19 @@ def create_test():
         if not user_id:
             return jsonify({'error': 'Authentication required'}), 401
         
-        if request.content_type and 'multipart/form-data' in request.content_type:
-            # Handle file upload
-            source_type = request.form.get('source_type', 'text')
-            num_questions = int(request.form.get('num_questions', 5))
-            difficulty = request.form.get('difficulty', 'medium')
-            time_duration = int(request.form.get('time_duration', 10))
-            
-            if source_type == 'pdf':
-                if 'pdf_file' not in request.files:
-                    return jsonify({'error': 'PDF file is required'}), 400
-                
-                pdf_file = request.files['pdf_file']
-                
-                if pdf_file.filename == '':
-                    return jsonify({'error': 'No file selected'}), 400
-                
-                if not pdf_file.filename.endswith('.pdf'):
-                    return jsonify({'error': 'Only PDF files are allowed'}), 400
-                
-                # Generate MCQs from PDF
-                from mcq_ai import generate_mcqs_from_pdf
-                mcqs = generate_mcqs_from_pdf(pdf_file, num_questions, difficulty)
-            elif source_type == 'topic':
-                topic = request.form.get('topic', '')
-                
-                if not topic:
-                    return jsonify({'error': 'Topic is required'}), 400
-                
-                print(f"[v0] Generating test MCQs from topic: {topic}")
-                mcqs = generate_mcqs_from_topic(topic, num_questions, difficulty)
-            else:
-                source_text = request.form.get('source_text', '')
-                
-                if not source_text:
-                    return jsonify({'error': 'Source text is required'}), 400
-                
-                mcqs = generate_mcqs(source_text, num_questions, difficulty)
-        else:
-            data = request.get_json()
-            
-            num_questions = data.get('num_questions', 5)
-            difficulty = data.get('difficulty', 'medium')
-            time_duration = data.get('time_duration', 10)
-            source_text = data.get('source_text', '')
-            
-            if not source_text:
-                return jsonify({'error': 'Source text is required'}), 400
-            
-            mcqs = generate_mcqs(source_text, num_questions, difficulty)
+        source_type, source, num_questions, difficulty, time_duration, error = read_test_request()
+        if error:
+            return error
         
-        if not mcqs:
-            return jsonify({'error': 'Could not generate MCQs'}), 400
+        if wants_async():
+            return enqueue_generation('test', user_id, source_type, source, num_questions, difficulty,
+                                      time_duration=time_duration)
         
-        return jsonify({
-            'message': 'Test created successfully',
-            'test_data': {
-                'num_questions': len(mcqs),
-                'difficulty': difficulty,
-                'time_duration': time_duration,
-                'mcqs': mcqs
-            }
-        }), 200
+        mcqs = generate_for_source(source_type, source, num_questions, difficulty, user_id)
+        return test_response(mcqs, difficulty, time_duration)
         
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        logger.exception("Test creation failed")
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/test/submit', methods=['POST'])
@@ -470,81 +606,15 @@ def submit_test():
         questions = data.get('questions', [])
         answers = data.get('answers', {})
         
-        print(f"\n{'='*60}")
-        print(f"[v0] TEST SUBMISSION DEBUG")
-        print(f"{'='*60}")
-        print(f"User ID: {user_id}")
-        print(f"Total Questions: {len(questions)}")
-        print(f"User Answers: {answers}")
-        print(f"\n[v0] First Question Structure:")
-        if questions:
-            print(f"  Question: {questions[0].get('question', 'N/A')}")
-            print(f"  Options keys: {list(questions[0].get('options', {}).keys())}")
-            print(f"  Options values: {questions[0].get('options', {})}")
-        print(f"{'='*60}\n")
-        
         if not questions:
             return jsonify({'error': 'No questions provided'}), 400
         
-        score = 0
-        total_marks = len(questions)
-        
-        test = Test(
-            user_id=user_id,
-            title=test_title,
-            difficulty=difficulty,
-            total_questions=total_marks,
-            time_duration=time_duration,
-            total_marks=total_marks
-        )
-        db.session.add(test)
-        db.session.flush()
-        
-        for idx, question in enumerate(questions):
-            # Get user answer (convert index to string for dict lookup)
-            user_answer = answers.get(str(idx))
-            correct_answer = question['correct_answer']
-            
-            user_answer_normalized = user_answer.strip().upper() if user_answer else None
-            correct_answer_normalized = correct_answer.strip().upper() if correct_answer else None
-            
-            is_correct = user_answer_normalized == correct_answer_normalized
-            
-            print(f"Question {idx + 1}:")
-            print(f"  Correct: {correct_answer} (normalized: {correct_answer_normalized})")
-            print(f"  User: {user_answer} (normalized: {user_answer_normalized})")
-            print(f"  Is Correct: {is_correct}")
-            options = question.get('options', {})
-            option_a = options.get('A') or options.get('a') or question.get('option_a') or ''
-            option_b = options.get('B') or options.get('b') or question.get('option_b') or ''
-            option_c = options.get('C') or options.get('c') or question.get('option_c') or ''
-            option_d = options.get('D') or options.get('d') or question.get('option_d') or ''
-            
-            print(f"  Option A: {option_a[:50]}..." if len(option_a) > 50 else f"  Option A: {option_a}")
-            print(f"  Option B: {option_b[:50]}..." if len(option_b) > 50 else f"  Option B: {option_b}")
-            
-            if is_correct:
-                score += 1
-            
-            test_answer = TestAnswer(
-                test_id=test.id,
-                question=question['question'],
-                option_a=option_a,
-                option_b=option_b,
-                option_c=option_c,
-                option_d=option_d,
-                correct_answer=correct_answer,
-                user_answer=user_answer,
-                is_correct=is_correct
-            )
-            db.session.add(test_answer)
-        
-        test.score = score
-        test.percentage = round((score / total_marks * 100), 2) if total_marks > 0 else 0
+        test = save_test_submission(user_id, test_title, difficulty, time_duration, questions, answers)
+        score = test.score
+        total_marks = test.total_marks
         
-        db.session.commit()
-        
-        print(f"\n[v0] Test submitted: Score {score}/{total_marks} ({test.percentage}%)\n")
+        logger.info("Test %s submitted: score %s/%s (%s%%)", test.id, score, total_marks, test.percentage,
+                    extra={'user_id': user_id})
         
         return jsonify({
             'message': 'Test submitted successfully',
@@ -556,9 +626,7 @@ def submit_test():
         
     except Exception as e:
         db.session.rollback()
-        print(f"[v0] Error submitting test: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Test submission failed")
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/test/<int:test_id>', methods=['GET'])
@@ -592,12 +660,56 @@ def get_test_history():
         if not user_id:
             return jsonify({'error': 'Authentication required'}), 401
         
-        tests = Test.query.filter_by(user_id=user_id).order_by(Test.submitted_at.desc()).all()
+        tests, next_cursor = paginate_history(Test.query.filter_by(user_id=user_id), Test, Test.submitted_at)
         
         return jsonify({
-            'tests': [test.to_dict() for test in tests]
+            'tests': [test.to_dict() for test in tests],
+            'next_cursor': next_cursor
         }), 200
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# JOB ROUTES
+
+def get_job_for_request(job_id):
+    """Load a job, hiding other users' jobs. Returns (job, error_response)."""
+    job = db.session.get(GenerationJob, job_id)
+    if not job or (job.user_id is not None and job.user_id != get_current_user()):
+        return None, (jsonify({'error': 'Job not found'}), 404)
+    return job, None
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job_status(job_id):
+    """Get status and per-batch progress of a generation job"""
+    try:
+        job, error = get_job_for_request(job_id)
+        if error:
+            return error
+        
+        return jsonify({'job': job.to_dict()}), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/jobs/<job_id>/result', methods=['GET'])
+def get_job_result(job_id):
+    """Get the result of a finished generation job"""
+    try:
+        job, error = get_job_for_request(job_id)
+        if error:
+            return error
+        
+        if job.status == 'failed':
+            return jsonify({'error': job.error, 'job': job.to_dict()}), 500
+        
+        if job.status != 'completed':
+            return jsonify({'job': job.to_dict()}), 202
+        
+        return jsonify(json.loads(job.result)), 200
+        
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -608,62 +720,26 @@ def generate_summary_endpoint():
     """Generate summary from text or PDF"""
     
     try:
-        # Get form data
-        source_type = request.form.get('source_type', 'text')
-        summary_length = request.form.get('summary_length', 'medium')
+        source_type, summary_length, source, error = read_summary_request()
         
-        print(f"\n{'='*60}")
-        print("[v0] SUMMARIZATION REQUEST")
-        print(f"{'='*60}")
-        print(f"Source type: {source_type}")
-        print(f"Summary length: {summary_length}")
+        logger.info("Summarizing %s (length: %s)", source_type, summary_length)
+        
+        if error:
+            return error
         
         summary = ""
         try:
             if source_type == 'text':
-                text = request.form.get('text', '')
-                if not text:
-                    return jsonify({'error': 'Text is required for summarization'}), 400
-                print(f"[v0] Generating summary from text (length: {len(text)} chars)")
-                summary = generate_summary(text, summary_length)
-            
+                summary = generate_summary(source, summary_length)
             elif source_type == 'pdf':
-                if 'pdf_file' not in request.files:
-                    return jsonify({'error': 'PDF file is required'}), 400
-                
-                pdf_file = request.files['pdf_file']
-                print(f"[v0] Generating summary from PDF: {pdf_file.filename}")
-                summary = generate_summary_from_pdf(pdf_file, summary_length)
-            
-            if not summary:
-                error_msg = 'No summary was generated. Please check if your text is meaningful and try again.'
-                print(f"[v0] ERROR: {error_msg}")
-                return jsonify({'error': error_msg}), 500
-            
-            print(f"[v0] ✓ Summary generated successfully")
-            print(f"{'='*60}\n")
-        
-        except ValueError as ve:
-            error_msg = str(ve)
-            print(f"[v0] VALIDATION ERROR: {error_msg}")
-            return jsonify({'error': error_msg}), 400
-        
+                summary = generate_summary_from_pdf(source, summary_length)
         except Exception as gen_error:
-            error_msg = f"Summary generation failed: {str(gen_error)}"
-            print(f"[v0] GENERATION ERROR: {error_msg}")
-            import traceback
-            traceback.print_exc()
-            return jsonify({'error': error_msg}), 500
+            return generation_error(gen_error, 'Summary generation')
         
-        return jsonify({
-            'message': 'Summary generated successfully',
-            'summary': summary
-        }), 200
+        return summary_response(source_type, summary)
         
     except Exception as e:
-        print(f"\n✗✗✗ CRITICAL ERROR in generate_summary_endpoint: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Unhandled error in generate_summary_endpoint")
         return jsonify({'error': f'Server error: {str(e)}'}), 500
 
 # DASHBOARD ROUTES
@@ -672,19 +748,9 @@ def generate_summary_endpoint():
 def get_dashboard_data():
     """Get dashboard statistics for user"""
     
-    print(f"\n{'#'*60}")
-    print("[v0] DASHBOARD - SESSION CHECK")
-    print(f"{'#'*60}")
-    print(f"Session exists: {bool(session)}")
-    print(f"Session keys: {list(session.keys())}")
-    print(f"Session user_id: {session.get('user_id', 'NOT SET')}")
-    print(f"Cookies in request: {dict(request.cookies)}")
-    print(f"{'#'*60}\n")
-    
     user_id = get_current_user()
     
     if not user_id:
-        print("[v0] Dashboard: No valid session - user_id is None")
         return jsonify({'error': 'Authentication required', 'authenticated': False}), 401
     
     try:
@@ -694,20 +760,19 @@ def get_dashboard_data():
             session.pop('user_id', None)
             return jsonify({'error': 'User not found'}), 404
         
-        # Get statistics
-        total_tests = Test.query.filter_by(user_id=user_id).count()
-        total_mcq_sets = MCQSet.query.filter_by(user_id=user_id).count()
+        # Get statistics in one round trip; zero-mark tests count as 0%
+        percentage = case((Test.total_marks > 0, Test.score * 100.0 / Test.total_marks), else_=0)
+        total_tests, avg_score, total_mcq_sets = db.session.execute(select(
+            select(func.count(Test.id)).where(Test.user_id == user_id).scalar_subquery(),
+            select(func.avg(percentage)).where(Test.user_id == user_id).scalar_subquery(),
+            select(func.count(MCQSet.id)).where(MCQSet.user_id == user_id).scalar_subquery()
+        )).one()
+        # Decimal on PostgreSQL, which jsonify would turn into a string
+        avg_score = round(float(avg_score), 2) if avg_score is not None else 0
         
         # Get recent tests
         recent_tests = Test.query.filter_by(user_id=user_id).order_by(Test.submitted_at.desc()).limit(5).all()
         
-        # Calculate average score
-        tests = Test.query.filter_by(user_id=user_id).all()
-        avg_score = 0
-        if tests:
-            total_percentage = sum([(t.score / t.total_marks * 100) for t in tests if t.total_marks > 0])
-            avg_score = round(total_percentage / len(tests), 2)
-        
         return jsonify({
             'user': user.to_dict(),
             'stats': {
@@ -721,6 +786,13 @@ def get_dashboard_data():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# METRICS
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus scrape endpoint"""
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
 # RUN APPLICATION
 
 if __name__ == '__main__':
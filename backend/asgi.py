@@ -0,0 +1,361 @@
+"""
+ASGI entry point: serves the Flask app with the LLM-bound routes running on asyncio.
+
+    uvicorn asgi:application --port 5000
+
+httpx, uvicorn and a2wsgi come with requirements.txt.
+
+POST /api/mcq/generate, /api/mcq/generate/stream, /api/test/create and
+/api/summary/generate run as coroutines that wait on Groq through the async
+client, so a request waiting for generation holds no thread and one process
+can keep hundreds of them in flight. They still run inside Flask's request
+context, so sessions, CORS, the before/after request hooks (metrics, tracing,
+access log) and error handling behave as under app.run(). Database writes,
+cache lookups, form parsing and PDF extraction run in worker threads.
+
+Every other route is a short database request and is served by its
+unchanged Flask view through a2wsgi's WSGI adapter, on a pool of
+ASGI_WSGI_THREADS threads.
+"""
+import os
+import asyncio
+import logging
+import tempfile
+from contextlib import aclosing, suppress
+from a2wsgi import WSGIMiddleware
+from a2wsgi.wsgi import build_environ
+from dotenv import load_dotenv
+from flask import request, jsonify, Response
+
+basedir = os.path.abspath(os.path.dirname(__file__))
+dotenv_path = os.path.join(basedir, '.env')
+load_dotenv(dotenv_path)
+
+from app import app, get_current_user, wants_async, sse_event, SSE_HEADERS, NO_MCQS_ERROR
+from app import read_generation_form, read_mcq_source, read_test_request, read_summary_request
+from app import save_for_user, generation_result, generation_error, mcq_response, test_response, summary_response
+from database import db
+from llm_client import async_groq_client
+from mcq_ai import generate_mcqs_async, generate_mcqs_from_pdf_async, stream_mcqs_async, stream_mcqs_from_pdf_async
+from question_pool import generate_topic_mcqs_async, stream_topic_mcqs_async
+from summarize_ai import summarize_with_groq_async, generate_summary_from_pdf_async
+
+logger = logging.getLogger(__name__)
+
+if async_groq_client is None:
+    raise RuntimeError("The ASGI entry point needs httpx for async Groq calls: pip install -r requirements.txt")
+
+ASGI_WSGI_THREADS = int(os.getenv('ASGI_WSGI_THREADS', '16'))  # Threads serving the routes that stay synchronous
+BODY_SPOOL_BYTES = 1024 * 1024  # Request bodies above this size are buffered on disk
+
+_wsgi_app = WSGIMiddleware(app, workers=ASGI_WSGI_THREADS)
+
+# (method, path) -> coroutine function producing a Flask response value
+ASYNC_ROUTES = {}
+
+
+def async_route(path, methods=('POST',)):
+    def register(handler):
+        for method in methods:
+            ASYNC_ROUTES[(method, path)] = handler
+        return handler
+    return register
+
+
+class ClientDisconnected(Exception):
+    """The client went away before its request body was received."""
+
+
+# ASYNC ROUTES
+# Request parsing, validation and responses are app.py's helpers; only the
+# generation step differs from the Flask views.
+
+async def agenerate_for_source(source_type, source, num_questions, difficulty, user_id=None):
+    """app.generate_for_source on the event loop."""
+    if source_type == 'pdf':
+        return await generate_mcqs_from_pdf_async(source, num_questions, difficulty)
+    if source_type == 'topic':
+        return await generate_topic_mcqs_async(source, num_questions, difficulty, user_id=user_id)
+    return await generate_mcqs_async(source, num_questions, difficulty)
+
+
+def astream_for_source(source_type, source, num_questions, difficulty, user_id=None):
+    """app.stream_for_source as an async generator."""
+    if source_type == 'pdf':
+        return stream_mcqs_from_pdf_async(source, num_questions, difficulty)
+    if source_type == 'topic':
+        return stream_topic_mcqs_async(source, num_questions, difficulty, user_id=user_id)
+    return stream_mcqs_async(source, num_questions, difficulty)
+
+
+@async_route('/api/mcq/generate')
+async def generate_mcq():
+    """app.generate_mcq with generation awaited on the event loop"""
+    if wants_async():
+        return await _sync_view()
+
+    user_id = get_current_user()
+
+    try:
+        source_type, num_questions, difficulty, error = read_generation_form()
+        if error:
+            return error
+
+        logger.info("Generating %s MCQs from %s (difficulty: %s)", num_questions, source_type, difficulty,
+                    extra={'user_id': user_id})
+
+        source, error = read_mcq_source(source_type)
+        if error:
+            return error
+
+        try:
+            mcqs = await agenerate_for_source(source_type, source, num_questions, difficulty, user_id)
+        except Exception as gen_error:
+            return generation_error(gen_error)
+
+        # Saving the set is a database write
+        return await asyncio.to_thread(mcq_response, user_id, source_type, difficulty, mcqs)
+
+    except Exception as e:
+        await asyncio.to_thread(db.session.rollback)
+        logger.exception("Unhandled error in generate_mcq")
+        return jsonify({'error': f'Server error: {str(e)}'}), 500
+
+
+@async_route('/api/mcq/generate/stream')
+async def generate_mcq_stream():
+    """app.generate_mcq_stream with the events produced by an async generator"""
+    user_id = get_current_user()
+
+    source_type, num_questions, difficulty, error = read_generation_form()
+    if error:
+        return error
+    source, error = read_mcq_source(source_type)
+    if error:
+        return error
+    mcq_stream = astream_for_source(source_type, source, num_questions, difficulty, user_id)
+
+    logger.info("Streaming %s MCQs from %s (difficulty: %s)", num_questions, source_type, difficulty,
+                extra={'user_id': user_id})
+
+    async def events():
+        mcqs = []
+        try:
+            async with aclosing(mcq_stream):
+                async for mcq in mcq_stream:
+                    mcqs.append(mcq)
+                    yield sse_event('mcq', dict(mcq, index=len(mcqs) - 1))
+        except Exception as e:
+            logger.exception("Streamed MCQ generation failed")
+            yield sse_event('error', {'error': f"MCQ generation failed: {str(e)}"})
+            return
+
+        if not mcqs:
+            yield sse_event('error', {'error': NO_MCQS_ERROR})
+            return
+
+        saved = await asyncio.to_thread(save_for_user, user_id, source_type, difficulty, mcqs)
+        yield sse_event('done', generation_result(user_id, saved, count=len(mcqs)))
+
+    return Response(events(), mimetype='text/event-stream', headers=SSE_HEADERS)
+
+
+@async_route('/api/test/create')
+async def create_test():
+    """app.create_test with generation awaited on the event loop"""
+    if wants_async():
+        return await _sync_view()
+
+    try:
+        user_id = get_current_user()
+
+        if not user_id:
+            return jsonify({'error': 'Authentication required'}), 401
+
+        source_type, source, num_questions, difficulty, time_duration, error = read_test_request()
+        if error:
+            return error
+
+        mcqs = await agenerate_for_source(source_type, source, num_questions, difficulty, user_id)
+        return test_response(mcqs, difficulty, time_duration)
+
+    except Exception as e:
+        logger.exception("Test creation failed")
+        return jsonify({'error': str(e)}), 500
+
+
+@async_route('/api/summary/generate')
+async def generate_summary_endpoint():
+    """app.generate_summary_endpoint with generation awaited on the event loop"""
+    try:
+        source_type, summary_length, source, error = read_summary_request()
+
+        logger.info("Summarizing %s (length: %s)", source_type, summary_length)
+
+        if error:
+            return error
+
+        summary = ""
+        try:
+            if source_type == 'text':
+                summary = await summarize_with_groq_async(source, summary_length)
+            elif source_type == 'pdf':
+                summary = await generate_summary_from_pdf_async(source, summary_length)
+        except Exception as gen_error:
+            return generation_error(gen_error, 'Summary generation')
+
+        return summary_response(source_type, summary)
+
+    except Exception as e:
+        logger.exception("Unhandled error in generate_summary_endpoint")
+        return jsonify({'error': f'Server error: {str(e)}'}), 500
+
+
+async def _sync_view():
+    """Run the route's regular Flask view in a worker thread (e.g. to queue a background job)."""
+    return await asyncio.to_thread(app.dispatch_request)
+
+
+# ASGI PLUMBING
+# Everything but ASYNC_ROUTES goes through a2wsgi's WSGI adapter. The async
+# routes reuse its environ builder, then run inside a Flask request context.
+
+
+def _join_cookies(scope):
+    """
+    Merge repeated Cookie headers into one joined with "; " as RFC 6265 requires.
+
+    HTTP/2 clients may send every cookie as its own header, and the WSGI
+    environ builder joins repeated headers with ",", which breaks parsing.
+    """
+    cookies = [value for name, value in scope['headers'] if name.lower() == b'cookie']
+    if len(cookies) < 2:
+        return scope
+    headers = [(name, value) for name, value in scope['headers'] if name.lower() != b'cookie']
+    headers.append((b'cookie', b'; '.join(cookies)))
+    return dict(scope, headers=headers)
+
+
+def _route_path(scope):
+    """The request path relative to the app's mount point (PATH_INFO)."""
+    root_path, path = scope.get('root_path', ''), scope['path']
+    return path[len(root_path):] if root_path and path.startswith(root_path) else path
+
+
+async def _read_body(receive):
+    """Receive the whole request body into a spooled file; returns (file, length)."""
+    body = tempfile.SpooledTemporaryFile(max_size=BODY_SPOOL_BYTES)
+    more_body = True
+    while more_body:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            body.close()
+            raise ClientDisconnected()
+        body.write(message.get('body', b''))
+        more_body = message.get('more_body', False)
+    length = body.tell()
+    body.seek(0)
+    return body, length
+
+
+def _response_start(status, headers):
+    return {
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+    }
+
+
+async def _wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def _send_response(response, environ, receive, send):
+    """Send a Flask response; an async iterable body is streamed until it ends or the client disconnects."""
+    headers = response.get_wsgi_headers(environ).to_wsgi_list()
+    body = response.response
+    if not hasattr(body, '__aiter__'):
+        await send(_response_start(response.status_code, headers))
+        await send({'type': 'http.response.body', 'body': response.get_data()})
+        return
+
+    async def stream():
+        await send(_response_start(response.status_code, headers))
+        async with aclosing(body):
+            async for chunk in body:
+                await send({'type': 'http.response.body', 'body': chunk.encode('utf-8') if isinstance(chunk, str) else chunk,
+                            'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+
+    # Stop generating, and calling Groq, for a client that has gone away
+    streamer = asyncio.ensure_future(stream())
+    watcher = asyncio.ensure_future(_wait_for_disconnect(receive))
+    try:
+        await asyncio.wait({streamer, watcher}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        watcher.cancel()
+        if not streamer.done():
+            logger.info("Client disconnected from %s %s", environ['REQUEST_METHOD'], environ['PATH_INFO'])
+            streamer.cancel()
+            with suppress(asyncio.CancelledError):
+                await streamer
+    if not streamer.cancelled():
+        streamer.result()
+
+
+async def _serve_async(handler, scope, receive, send):
+    """Run an async route inside a Flask request context, with the app's hooks and error handling."""
+    try:
+        body, length = await _read_body(receive)
+    except ClientDisconnected:
+        return
+    with body:
+        environ = build_environ(scope, body)
+        environ['CONTENT_LENGTH'] = str(length)
+        ctx = app.request_context(environ)
+        ctx.push()
+        error = None
+        try:
+            try:
+                # Multipart parsing of a large upload is CPU work; keep it off the event loop
+                await asyncio.to_thread(lambda: request.form)
+                rv = app.preprocess_request()
+                if rv is None:
+                    rv = await handler()
+                response = app.finalize_request(rv)
+            except Exception as e:
+                error = e
+                response = app.handle_exception(e)
+            await _send_response(response, environ, receive, send)
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            ctx.pop(error)
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await async_groq_client.aclose()
+            _wsgi_app.executor.shutdown(wait=False)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    """The ASGI application."""
+    if scope['type'] == 'lifespan':
+        await _lifespan(receive, send)
+        return
+    if scope['type'] == 'http':
+        scope = _join_cookies(scope)
+        handler = ASYNC_ROUTES.get((scope['method'], _route_path(scope)))
+        if handler is not None:
+            await _serve_async(handler, scope, receive, send)
+            return
+    await _wsgi_app(scope, receive, send)
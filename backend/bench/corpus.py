@@ -0,0 +1,75 @@
+"""
+Synthetic, deterministic source material for benchmarks: plain text of a
+given length and small text-only PDFs built without any PDF library.
+"""
+import random
+
+SUBJECTS = [
+    "The river", "A glacier", "The enzyme", "Each cell", "The planet", "A comet", "The senate",
+    "The treaty", "An aquifer", "The current", "The protein", "The colony", "A nebula", "The membrane"
+]
+VERBS = [
+    "carries", "shapes", "regulates", "absorbs", "releases", "transforms", "limits", "supports",
+    "divides", "reflects", "governs", "stores", "measures", "replaces"
+]
+OBJECTS = [
+    "sediment toward the estuary", "the valley floor over centuries", "energy from sunlight",
+    "the flow of charge through a resistor", "trade between distant provinces", "water beneath the plateau",
+    "the orbit of smaller bodies", "signals across the membrane", "the balance of power in parliament",
+    "heat from the planet's core", "genetic material during mitosis", "light from distant galaxies"
+]
+CLAUSES = [
+    "because pressure rises with depth", "although the effect is slow", "which scientists measured in 1890",
+    "unless temperatures drop sharply", "as recorded in early surveys", "so the system stays in balance"
+]
+
+
+def sentence(rng):
+    return f"{rng.choice(SUBJECTS)} {rng.choice(VERBS)} {rng.choice(OBJECTS)}, {rng.choice(CLAUSES)}."
+
+
+def make_text(words=2000, seed=0):
+    """Paragraphs of varied, factual-sounding sentences totalling about words words."""
+    rng = random.Random(seed)
+    paragraphs = []
+    count = 0
+    while count < words:
+        paragraph = " ".join(sentence(rng) for _ in range(rng.randint(4, 8)))
+        paragraphs.append(paragraph)
+        count += len(paragraph.split())
+    return "\n\n".join(paragraphs)
+
+
+def _escape_pdf_text(text):
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def make_pdf(pages=10, words_per_page=300, seed=0):
+    """A valid PDF with one Helvetica text stream per page."""
+    objects = {
+        1: b"<< /Type /Catalog /Pages 2 0 R >>",
+        3: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"
+    }
+    kids = []
+    for page in range(pages):
+        text = make_text(words_per_page, seed=seed * 100003 + page).replace("\n\n", " ")
+        lines = [text[i:i + 90] for i in range(0, len(text), 90)]
+        stream = ("BT /F1 9 Tf 36 806 Td 11 TL " + " ".join(f"({_escape_pdf_text(line)}) '" for line in lines) + " ET").encode('latin-1')
+        page_id, content_id = 4 + 2 * page, 5 + 2 * page
+        kids.append(f"{page_id} 0 R")
+        objects[page_id] = (f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+                            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>").encode('latin-1')
+        objects[content_id] = b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream)
+    objects[2] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {pages} >>".encode('latin-1')
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = {}
+    for number in sorted(objects):
+        offsets[number] = len(out)
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, objects[number])
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for number in sorted(objects):
+        out += b"%010d 00000 n \n" % offsets[number]
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
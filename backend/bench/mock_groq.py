@@ -0,0 +1,211 @@
+"""
+Local stand-in for Groq's OpenAI-compatible chat completions endpoint.
+
+Answers MCQ prompts ("Generate exactly N ...") with N varied questions, in
+the JSON object format when response_format is set and as a bare array
+otherwise, and any other prompt with a short summary. Supports stream=True
+(SSE). Latency, 429s and malformed output can be injected:
+
+    python -m bench.mock_groq --port 8799 --latency 0.8 --rate-limit 0.05 --malformed 0.1
+
+then point GROQ_API_URL at http://127.0.0.1:8799/v1/chat/completions.
+"""
+import re
+import json
+import time
+import random
+import argparse
+import threading
+import itertools
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORDS = (
+    "river delta basin erosion sediment glacier valley canyon plateau aquifer estuary tributary "
+    "cell membrane enzyme protein nucleus mitosis genome ribosome chloroplast photosynthesis "
+    "orbit planet comet nebula galaxy gravity inertia momentum friction voltage current resistor "
+    "empire treaty senate monarchy revolution colony parliament dynasty republic constitution"
+).split()
+
+
+class MockGroqServer:
+    """
+    Threaded HTTP server answering chat completion requests.
+
+    latency + uniform(0, jitter) seconds are spent before every response,
+    plus per_question seconds for each generated question. A rate_limit
+    share of requests gets a 429 with a retry-after header, and a malformed
+    share gets broken JSON: a truncated array or one corrupted item, or in
+    JSON mode the 400 json_validate_failed error Groq returns instead.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, jitter=0.0, per_question=0.0,
+                 rate_limit=0.0, malformed=0.0, retry_after=0.05, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.per_question = per_question
+        self.rate_limit = rate_limit
+        self.malformed = malformed
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.counter = itertools.count()
+        self.stats = {'requests': 0, 'rate_limited': 0, 'malformed': 0}
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1/chat/completions"
+
+    def serve_forever(self):
+        self._httpd.serve_forever()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def _roll(self, share):
+        return self.random.random() < share
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def _questions(self, count):
+        k = next(self.counter)
+        questions = []
+        for i in range(count):
+            subject, detail, context = (WORDS[(k * 7 + i) % len(WORDS)], WORDS[(k * 13 + i * 3 + 1) % len(WORDS)],
+                                        WORDS[(k * 5 + i * 11 + 2) % len(WORDS)])
+            questions.append({
+                'question': f"How does the {subject} relate to the {detail} in a {context} (case {k}.{i})?",
+                'options': [f"Through the {detail}", f"Through the {context}", f"Via {subject} alone", "It does not"],
+                'answer_index': i % 4
+            })
+        return questions
+
+    def _content(self, body):
+        """Response text for a request, and whether it was deliberately malformed."""
+        prompt = body['messages'][-1]['content']
+        match = re.search(r'exactly (\d+)', prompt)
+        if not match:
+            return f"Summary of {len(prompt)} characters of text: " + " ".join(prompt.split()[-30:]), False
+
+        count = int(match.group(1))
+        items = self._questions(count)
+        json_mode = bool(body.get('response_format'))
+        content = json.dumps({'questions': items} if json_mode else items)
+        if not self._roll(self.malformed):
+            return content, False
+        if self.random.random() < 0.5:
+            # Cut off mid-way, as when max_tokens runs out
+            return content[:len(content) * 2 // 3], True
+        # One item with a missing comma between fields
+        broken = json.dumps(items[0]).replace('", "options"', '" "options"', 1)
+        return content.replace(json.dumps(items[0]), broken, 1), True
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, payload, headers=()):
+                data = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                for name, value in headers:
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _chunk(self, data):
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                server._count('requests')
+                if server._roll(server.rate_limit):
+                    server._count('rate_limited')
+                    self._send(429, {'error': {'message': 'Rate limit reached', 'type': 'tokens', 'code': 'rate_limit_exceeded'}},
+                               [('retry-after', str(server.retry_after))])
+                    return
+
+                content, malformed = server._content(body)
+                if malformed:
+                    server._count('malformed')
+                questions = len(re.findall(r'"question"', content))
+                time.sleep(server.latency + server.random.uniform(0, server.jitter) + server.per_question * questions)
+
+                if malformed and body.get('response_format'):
+                    self._send(400, {'error': {
+                        'message': 'Failed to generate JSON. Please adjust your prompt.',
+                        'type': 'invalid_request_error',
+                        'code': 'json_validate_failed',
+                        'failed_generation': content
+                    }})
+                    return
+
+                if body.get('stream'):
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'text/event-stream')
+                    self.send_header('Transfer-Encoding', 'chunked')
+                    self.end_headers()
+                    for start in range(0, len(content), 16):
+                        event = {'choices': [{'delta': {'content': content[start:start + 16]}}]}
+                        self._chunk(f"data: {json.dumps(event)}\n\n".encode('utf-8'))
+                    self._chunk(b"data: [DONE]\n\n")
+                    self.wfile.write(b"0\r\n\r\n")
+                    return
+
+                prompt_tokens = sum(len(m.get('content', '')) for m in body['messages']) // 4
+                completion_tokens = len(content) // 4
+                self._send(200, {
+                    'model': body.get('model'),
+                    'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}],
+                    'usage': {
+                        'prompt_tokens': prompt_tokens,
+                        'completion_tokens': completion_tokens,
+                        'total_tokens': prompt_tokens + completion_tokens
+                    }
+                })
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8799)
+    parser.add_argument('--latency', type=float, default=0.5, help='Base seconds per response')
+    parser.add_argument('--jitter', type=float, default=0.2, help='Extra random seconds per response, up to this much')
+    parser.add_argument('--per-question', type=float, default=0.02, help='Extra seconds per generated question')
+    parser.add_argument('--rate-limit', type=float, default=0.0, help='Share of requests answered with 429')
+    parser.add_argument('--malformed', type=float, default=0.0, help='Share of MCQ responses with broken JSON')
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+
+    server = MockGroqServer(args.host, args.port, args.latency, args.jitter, args.per_question,
+                            args.rate_limit, args.malformed, seed=args.seed)
+    print(f"Mock Groq listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(json.dumps(server.stats))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,309 @@
+"""
+Offline benchmarks for MCQ generation, summarization and the Flask routes.
+
+Starts the mock Groq server (bench/mock_groq.py) and the app in this process.
+The app runs on a throwaway SQLite database with the LLM result and PDF text
+caches off, so every request does the full work. Each scenario runs a fixed
+number of concurrent clients for a fixed time. The report gives latency
+percentiles and throughput:
+
+    cd backend
+    python -m bench.run                                  # every scenario
+    python -m bench.run generate dashboard -c 8 -d 20    # some of them
+    python -m bench.run --latency 0.8 --rate-limit 0.05 --malformed 0.1
+    python -m bench.run --json baseline.json             # save results
+    python -m bench.run --baseline baseline.json         # exit 1 on a regression
+
+Compare runs made on the same machine with the same options. Groq's
+client-side rate limits are raised so they do not cap throughput. Set
+GROQ_REQUESTS_PER_MINUTE etc. in the environment to benchmark with them.
+"""
+import os
+import sys
+import json
+import math
+import time
+import logging
+import argparse
+import tempfile
+import threading
+from types import SimpleNamespace
+import requests
+from bench.mock_groq import MockGroqServer
+from bench.corpus import make_text, make_pdf
+
+SCENARIOS = {}
+
+
+def scenario(name, description):
+    def register(factory):
+        SCENARIOS[name] = (description, factory)
+        return factory
+    return register
+
+
+def _configure_environment(workdir, groq_url):
+    """Point the app at the mock and a scratch database; must run before the app is imported."""
+    os.environ.update({
+        'GROQ_API_KEY': 'bench',
+        'GROQ_API_URL': groq_url,
+        'DATABASE_URL': f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        'LLM_CACHE_ENABLED': '0',
+        'PDF_TEXT_CACHE_ENABLED': '0',
+        'QUESTION_POOL_ENABLED': '0',
+        'JOB_WORKERS': '0',
+    })
+    for key, value in {
+        'GROQ_REQUESTS_PER_MINUTE': '1000000',
+        'GROQ_TOKENS_PER_MINUTE': '1000000000',
+        'GROQ_CIRCUIT_FAILURES': '1000',
+        'LOG_LEVEL': 'WARNING',
+    }.items():
+        os.environ.setdefault(key, value)
+
+
+def _sample_questions(count):
+    return [
+        {
+            'question': f"Which statement about sample {i} is correct?",
+            'options': {'A': f"First {i}", 'B': f"Second {i}", 'C': f"Third {i}", 'D': f"Fourth {i}"},
+            'correct_answer': 'ABCD'[i % 4]
+        }
+        for i in range(count)
+    ]
+
+
+class Client:
+    """One simulated user: an HTTP session signed up and logged in to the app."""
+
+    def __init__(self, base_url, name):
+        self.base_url = base_url
+        self.session = requests.Session()
+        response = self.post('/api/auth/signup', json={
+            'username': name, 'email': f"{name}@bench.local", 'password': 'bench-password'
+        })
+        response.raise_for_status()
+
+    def post(self, path, **kwargs):
+        return self.session.post(self.base_url + path, timeout=300, **kwargs)
+
+    def get(self, path, **kwargs):
+        return self.session.get(self.base_url + path, timeout=300, **kwargs)
+
+
+@scenario('generate', "POST /api/mcq/generate from text")
+def generate_scenario(ctx):
+    def op(client):
+        return client.post('/api/mcq/generate', data={
+            'source_type': 'text', 'text': ctx.text, 'num_questions': ctx.args.questions, 'difficulty': 'medium'
+        }).ok
+    return op
+
+
+@scenario('generate_pdf', "POST /api/mcq/generate from a PDF upload")
+def generate_pdf_scenario(ctx):
+    def op(client):
+        return client.post('/api/mcq/generate', data={'source_type': 'pdf', 'num_questions': ctx.args.questions},
+                           files={'pdf_file': ('bench.pdf', ctx.pdf, 'application/pdf')}).ok
+    return op
+
+
+@scenario('submit', "POST /api/test/submit with 20 questions")
+def submit_scenario(ctx):
+    questions = _sample_questions(20)
+    answers = {str(i): 'ABCD'[(i * 3) % 4] for i in range(len(questions))}
+
+    def op(client):
+        return client.post('/api/test/submit', json={
+            'title': 'Bench test', 'difficulty': 'medium', 'time_duration': 10,
+            'questions': questions, 'answers': answers
+        }).ok
+    return op
+
+
+@scenario('dashboard', "GET /api/dashboard for users with 25 tests each")
+def dashboard_scenario(ctx):
+    questions = _sample_questions(10)
+
+    def setup(client):
+        for _ in range(25):
+            client.post('/api/test/submit', json={'title': 'Seed', 'questions': questions, 'answers': {'0': 'A'}})
+
+    def op(client):
+        return client.get('/api/dashboard').ok
+    op.setup = setup
+    return op
+
+
+@scenario('mcq_function', "generate_mcqs_with_groq() called directly")
+def mcq_function_scenario(ctx):
+    from mcq_ai import generate_mcqs_with_groq
+
+    def op(client):
+        return bool(generate_mcqs_with_groq(ctx.text, ctx.args.questions, 'medium'))
+    return op
+
+
+@scenario('summary_function', "summarize_with_groq() on a long text (map-reduce)")
+def summary_function_scenario(ctx):
+    from summarize_ai import summarize_with_groq
+    long_text = make_text(ctx.args.words * 4, seed=7)
+
+    def op(client):
+        return bool(summarize_with_groq(long_text, 'medium'))
+    return op
+
+
+def percentile(sorted_values, share):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[max(0, math.ceil(share * len(sorted_values)) - 1)]
+
+
+def run_scenario(ctx, name, op):
+    """Run op from ctx.args.concurrency client threads for ctx.args.duration seconds."""
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    window = {}
+
+    def start_clock():
+        window['start'] = time.perf_counter()
+        window['end'] = window['start'] + ctx.args.duration
+
+    # The clock starts once every client has signed up and warmed up
+    ready = threading.Barrier(ctx.args.concurrency + 1, action=start_clock)
+
+    def worker(index):
+        try:
+            client = Client(ctx.base_url, f"bench-{name}-{ctx.run_id}-{index}")
+            if hasattr(op, 'setup'):
+                op.setup(client)
+            op(client)  # warm-up, not measured
+        except Exception:
+            ready.abort()
+            raise
+        ready.wait()
+        while time.perf_counter() < window['end']:
+            started = time.perf_counter()
+            try:
+                ok = op(client)
+            except Exception:
+                ok = False
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                if not ok:
+                    errors[0] += 1
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(ctx.args.concurrency)]
+    for thread in threads:
+        thread.start()
+    ready.wait()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - window['start']
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': errors[0],
+        'rps': len(latencies) / wall if wall else 0.0,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'max_ms': (latencies[-1] if latencies else 0.0) * 1000,
+    }
+
+
+def print_report(results):
+    print(f"{'scenario':<18}{'reqs':>7}{'errors':>8}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for name, r in results.items():
+        print(f"{name:<18}{r['requests']:>7}{r['errors']:>8}{r['rps']:>9.2f}"
+              f"{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}{r['p99_ms']:>10.1f}{r['max_ms']:>10.1f}")
+
+
+def find_regressions(results, baseline, tolerance):
+    """Scenarios whose p95 latency rose or throughput fell by more than tolerance."""
+    regressions = []
+    for name, r in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        if base['p95_ms'] and r['p95_ms'] > base['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {base['p95_ms']:.1f} -> {r['p95_ms']:.1f} ms")
+        if base['rps'] and r['rps'] < base['rps'] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {base['rps']:.2f} -> {r['rps']:.2f} req/s")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('scenarios', nargs='*', help='Scenarios to run (default: all): ' + ', '.join(SCENARIOS))
+    parser.add_argument('-c', '--concurrency', type=int, default=4, help='Concurrent clients per scenario')
+    parser.add_argument('-d', '--duration', type=float, default=10, help='Measured seconds per scenario')
+    parser.add_argument('--questions', type=int, default=10, help='Questions per generation request')
+    parser.add_argument('--words', type=int, default=1500, help='Words of source text for generation')
+    parser.add_argument('--pages', type=int, default=20, help='Pages in the generated PDF')
+    parser.add_argument('--latency', type=float, default=0.3, help='Mock Groq base seconds per response')
+    parser.add_argument('--jitter', type=float, default=0.1, help='Mock Groq extra random seconds per response')
+    parser.add_argument('--per-question', type=float, default=0.005, help='Mock Groq extra seconds per question')
+    parser.add_argument('--rate-limit', type=float, default=0.0, help='Share of Groq calls answered with 429')
+    parser.add_argument('--malformed', type=float, default=0.0, help='Share of Groq MCQ responses with broken JSON')
+    parser.add_argument('--json', help='Write results to this file')
+    parser.add_argument('--baseline', help='Results file from an earlier run to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.15, help='Allowed p95/throughput change vs the baseline')
+    args = parser.parse_args(argv)
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    mock = MockGroqServer(latency=args.latency, jitter=args.jitter, per_question=args.per_question,
+                          rate_limit=args.rate_limit, malformed=args.malformed, seed=1).start()
+    workdir = tempfile.mkdtemp(prefix='mcq-bench-')
+    _configure_environment(workdir, mock.url)
+
+    from werkzeug.serving import make_server
+    from app import app
+
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)  # No per-request access lines
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    ctx = SimpleNamespace(
+        args=args,
+        base_url=f"http://127.0.0.1:{server.server_port}",
+        run_id=int(time.time()),
+        text=make_text(args.words),
+        pdf=make_pdf(args.pages)
+    )
+
+    results = {}
+    try:
+        for name in args.scenarios or list(SCENARIOS):
+            description, factory = SCENARIOS[name]
+            print(f"Running {name}: {description} ({args.concurrency} clients, {args.duration:g}s)", file=sys.stderr)
+            results[name] = run_scenario(ctx, name, factory(ctx))
+    finally:
+        server.shutdown()
+        mock.stop()
+
+    print_report(results)
+    print(f"Mock Groq: {mock.stats['requests']} calls, {mock.stats['rate_limited']} rate limited, "
+          f"{mock.stats['malformed']} malformed", file=sys.stderr)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = find_regressions(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,113 @@
+import os
+import re
+from dotenv import load_dotenv
+
+basedir = os.path.abspath(os.path.dirname(__file__))
+dotenv_path = os.path.join(basedir, '.env')
+load_dotenv(dotenv_path)
+
+CHARS_PER_TOKEN = 4  # Rough average for English text
+CHUNK_TOKENS = int(os.getenv('CHUNK_TOKENS', '3000'))  # Max tokens of source text per LLM call
+CHUNK_OVERLAP_TOKENS = int(os.getenv('CHUNK_OVERLAP_TOKENS', '100'))  # Context repeated between neighbouring chunks
+MIN_EXCERPT_TOKENS = int(os.getenv('MIN_EXCERPT_TOKENS', '75'))  # Smallest excerpt of a chunk worth sending when a call covers many chunks
+
+EXCERPT_SEPARATOR = "\n\n[...]\n\n"
+
+_SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+|\n\s*\n')
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN
+
+
+def _units(text, max_chars):
+    """Split text into sentences/paragraphs, hard-splitting any that are longer than max_chars."""
+    for unit in _SENTENCE_BOUNDARY.split(text):
+        unit = unit.strip()
+        while len(unit) > max_chars:
+            cut = unit.rfind(' ', 0, max_chars)
+            cut = cut if cut > max_chars // 2 else max_chars
+            yield unit[:cut].strip()
+            unit = unit[cut:].strip()
+        if unit:
+            yield unit
+
+
+def split_text(text, max_tokens=CHUNK_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS):
+    """
+    Split text into token-bounded chunks on sentence/paragraph boundaries.
+
+    Consecutive chunks share up to overlap_tokens of trailing sentences so
+    questions near a boundary still have their context.
+    """
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    overlap_chars = overlap_tokens * CHARS_PER_TOKEN
+    chunks = []
+    current = []
+    current_len = 0
+
+    for unit in _units(text, max_chars):
+        if current and current_len + len(unit) + 1 > max_chars:
+            chunks.append(" ".join(current))
+            # Carry the tail of this chunk into the next one
+            carried = []
+            carried_len = 0
+            for previous in reversed(current):
+                if carried_len + len(previous) + 1 > overlap_chars or carried_len + len(previous) + len(unit) + 2 > max_chars:
+                    break
+                carried.insert(0, previous)
+                carried_len += len(previous) + 1
+            current = carried
+            current_len = carried_len
+        current.append(unit)
+        current_len += len(unit) + 1
+
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+
+def assign_runs(num_chunks, num_batches):
+    """
+    Return the (start, end) range of chunks each of num_batches LLM calls covers.
+
+    With more chunks than batches, the document is cut into num_batches runs
+    of neighbouring chunks so every chunk belongs to exactly one call. With
+    fewer chunks, batches cycle through the chunks and several share one.
+    """
+    if num_chunks <= 0:
+        return [None] * num_batches
+    if num_chunks <= num_batches:
+        return [(i % num_chunks, i % num_chunks + 1) for i in range(num_batches)]
+    return [(i * num_chunks // num_batches, (i + 1) * num_chunks // num_batches)
+            for i in range(num_batches)]
+
+
+def runs_needed(num_chunks, max_tokens=CHUNK_TOKENS):
+    """Fewest runs that let every chunk contribute at least MIN_EXCERPT_TOKENS to its run's digest."""
+    per_run = max(1, max_tokens // MIN_EXCERPT_TOKENS)
+    return -(-num_chunks // per_run)
+
+
+def digest(chunks, max_tokens=CHUNK_TOKENS, offset=0):
+    """
+    Fit a run of chunks into one prompt of about max_tokens.
+
+    A run that fits is sent whole. Otherwise every chunk contributes an equal
+    share of whole sentences, taken from a different window of the chunk for
+    each offset so top-up rounds see other passages. Runs too long for even
+    MIN_EXCERPT_TOKENS per chunk (see runs_needed) use every k-th chunk,
+    rotating with offset.
+    """
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if sum(len(chunk) + len(EXCERPT_SEPARATOR) for chunk in chunks) <= max_chars:
+        return "\n\n".join(chunks)
+
+    stride = max(1, -(-len(chunks) * MIN_EXCERPT_TOKENS * CHARS_PER_TOKEN // max_chars))
+    picked = chunks[offset % stride::stride] or chunks[:1]
+    share = max_chars // len(picked) - len(EXCERPT_SEPARATOR)
+    excerpts = []
+    for chunk in picked:
+        windows = split_text(chunk, max_tokens=max(1, share // CHARS_PER_TOKEN), overlap_tokens=0)
+        excerpts.append(windows[(offset // stride) % len(windows)] if windows else chunk)
+    return EXCERPT_SEPARATOR.join(excerpts)
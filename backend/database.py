@@ -1,11 +1,81 @@
+import os
+import logging
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from dotenv import load_dotenv
+
+basedir = os.path.abspath(os.path.dirname(__file__))
+dotenv_path = os.path.join(basedir, '.env')
+load_dotenv(dotenv_path)
+
+logger = logging.getLogger(__name__)
+
+# SQLite (single file, fine for one web process)
+SQLITE_WAL = os.getenv('SQLITE_WAL', '1') not in ('0', 'false', 'False')
+SQLITE_BUSY_TIMEOUT = int(os.getenv('SQLITE_BUSY_TIMEOUT', '5000'))  # Milliseconds a writer waits for the lock
+SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024)))  # Bytes of the file read through mmap
+
+# Server databases (Postgres, MySQL)
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '10'))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '20'))
+DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', '30'))  # Seconds to wait for a free connection
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800'))  # Seconds before a connection is replaced
+DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', '1') not in ('0', 'false', 'False')
 
 db = SQLAlchemy()
 
+
+def normalize_database_url(url):
+    """Accept the postgres:// scheme many hosts hand out, which SQLAlchemy 2 rejects."""
+    if url.startswith('postgres://'):
+        return 'postgresql://' + url[len('postgres://'):]
+    return url
+
+
+def engine_options(url):
+    """Engine options for the configured database: busy timeout for SQLite, a sized pool otherwise."""
+    if make_url(url).get_backend_name() == 'sqlite':
+        return {'connect_args': {'timeout': SQLITE_BUSY_TIMEOUT / 1000}}
+    return {
+        'pool_size': DB_POOL_SIZE,
+        'max_overflow': DB_MAX_OVERFLOW,
+        'pool_timeout': DB_POOL_TIMEOUT,
+        'pool_recycle': DB_POOL_RECYCLE,
+        'pool_pre_ping': DB_POOL_PRE_PING
+    }
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """
+    Tune every new SQLite connection. WAL lets readers run while a write is in
+    progress, and synchronous=NORMAL is safe under WAL (only the last
+    transactions can be lost on power failure, never corruption).
+    """
+    cursor = dbapi_connection.cursor()
+    if SQLITE_WAL:
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT}")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    cursor.close()
+
+
 def init_db(app):
     """Initialize database with Flask app"""
+    url = normalize_database_url(app.config['SQLALCHEMY_DATABASE_URI'])
+    app.config['SQLALCHEMY_DATABASE_URI'] = url
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(url))
     db.init_app(app)
-    
+
     with app.app_context():
+        if db.engine.dialect.name == 'sqlite':
+            event.listen(db.engine, 'connect', _set_sqlite_pragmas)
+        from migrations import upgrade_schema
+        upgrade_schema(db.engine)
         db.create_all()
-        print("Database initialized successfully!")
+        # create_all skips existing tables, so add indexes declared since they were created
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(bind=db.engine, checkfirst=True)
+        logger.info("Database initialized (%s)", db.engine.dialect.name)
@@ -0,0 +1,118 @@
+import os
+import re
+import random
+import hashlib
+from dotenv import load_dotenv
+
+basedir = os.path.abspath(os.path.dirname(__file__))
+dotenv_path = os.path.join(basedir, '.env')
+load_dotenv(dotenv_path)
+
+DEDUPE_SIMILARITY = float(os.getenv('DEDUPE_SIMILARITY', '0.7'))  # Token Jaccard similarity treated as a repeat (1 = exact only)
+MINHASH_PERMUTATIONS = int(os.getenv('MINHASH_PERMUTATIONS', '64'))
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_WORD = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an the of to in on at by for with from and or is are was were be been being "
+    "which what who whom whose when where why how this that these those it its "
+    "does do did can could would should will following best most main primary known called".split()
+)
+
+
+def question_key(question):
+    """Normalize question text so trivially different copies merge as duplicates."""
+    return " ".join(question.lower().split())
+
+
+def _stem(word):
+    return word[:-1] if len(word) > 3 and word.endswith('s') and not word.endswith('ss') else word
+
+
+def tokens(text):
+    """Lowercased content words of text, without punctuation, plural s or common stopwords."""
+    words = _WORD.findall(text.lower())
+    return frozenset(_stem(word) for word in words if word not in _STOPWORDS) or frozenset(words)
+
+
+def _choose_bands(num_perm, threshold, recall=0.95):
+    """
+    Pick the fewest LSH bands that still make a pair at exactly threshold
+    similarity share a bucket with probability >= recall. Fewer bands means
+    fewer false candidates; candidates are verified exactly anyway.
+    """
+    for bands in range(1, num_perm + 1):
+        if num_perm % bands:
+            continue
+        rows = num_perm // bands
+        if 1 - (1 - threshold ** rows) ** bands >= recall:
+            return bands
+    return num_perm
+
+
+class NearDuplicateIndex:
+    """
+    Detects questions that repeat an earlier one, including light paraphrases.
+
+    Each question is reduced to its set of content words and a MinHash
+    signature of that set. Signatures are split into LSH bands, so a new
+    question is only compared against earlier ones sharing at least one band
+    bucket; candidates count as duplicates when their word sets have a
+    Jaccard similarity of at least threshold. Lookups cost about the same no
+    matter how many questions are indexed.
+    """
+
+    def __init__(self, threshold=DEDUPE_SIMILARITY, num_perm=MINHASH_PERMUTATIONS, seed=1):
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = _choose_bands(num_perm, threshold)
+        self.rows = num_perm // self.bands
+        rng = random.Random(seed)
+        self._perms = [(rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME)) for _ in range(num_perm)]
+        self._exact = set()
+        self._token_sets = []
+        self._buckets = [{} for _ in range(self.bands)]
+
+    def _signature(self, token_set):
+        hashes = [int.from_bytes(hashlib.blake2b(t.encode('utf-8'), digest_size=8).digest(), 'big') for t in token_set]
+        return [min((a * h + b) % _MERSENNE_PRIME for h in hashes) for a, b in self._perms]
+
+    def _band_keys(self, signature):
+        return [tuple(signature[i * self.rows:(i + 1) * self.rows]) for i in range(self.bands)]
+
+    def is_duplicate(self, question):
+        return self._check(question)[0]
+
+    def add(self, question):
+        """Index question unless it repeats an earlier one; returns True if it was new."""
+        duplicate, key, token_set, band_keys = self._check(question)
+        if duplicate:
+            return False
+        self._exact.add(key)
+        if band_keys is not None:
+            index = len(self._token_sets)
+            self._token_sets.append(token_set)
+            for bucket, band_key in zip(self._buckets, band_keys):
+                bucket.setdefault(band_key, []).append(index)
+        return True
+
+    def _check(self, question):
+        key = question_key(question)
+        if key in self._exact:
+            return True, key, None, None
+        token_set = tokens(question)
+        if self.threshold >= 1 or not token_set:
+            return False, key, token_set, None
+
+        band_keys = self._band_keys(self._signature(token_set))
+        candidates = set()
+        for bucket, band_key in zip(self._buckets, band_keys):
+            candidates.update(bucket.get(band_key, ()))
+        for index in candidates:
+            other = self._token_sets[index]
+            if len(token_set & other) >= self.threshold * len(token_set | other):
+                return True, key, token_set, band_keys
+        return False, key, token_set, band_keys
+
+    def __len__(self):
+        return len(self._exact)
@@ -0,0 +1,255 @@
+"""
+Background job queue for MCQ and test generation.
+
+Jobs are rows in the generation_jobs table, so their state survives restarts
+and any process pointed at the same database can work the queue. A job whose
+worker died mid-run is failed once it has gone JOB_STALE_AFTER seconds without
+a heartbeat (workers send one with every progress report). The web process
+runs JOB_WORKERS worker threads of its own; set JOB_WORKERS=0 there and run
+`python jobs.py <workers>` to scale generation separately.
+"""
+import io
+import os
+import sys
+import json
+import uuid
+import time
+import threading
+import multiprocessing
+import logging
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from dotenv import load_dotenv
+
+basedir = os.path.abspath(os.path.dirname(__file__))
+dotenv_path = os.path.join(basedir, '.env')
+load_dotenv(dotenv_path)
+
+from database import db
+from models import GenerationJob
+from mcq_ai import generate_mcqs, generate_mcqs_from_pdf
+from question_pool import generate_topic_mcqs
+from mcq_store import save_mcq_set
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '2'))
+JOB_POLL_INTERVAL = float(os.getenv('JOB_POLL_INTERVAL', '2'))  # Seconds between queue checks when idle
+JOB_STALE_AFTER = int(os.getenv('JOB_STALE_AFTER', '1800'))  # Seconds without a heartbeat before a running job counts as abandoned
+STALE_CHECK_INTERVAL = 60  # Seconds between idle workers' checks for abandoned jobs
+
+
+def enqueue_job(kind, params, user_id=None, source_blob=None):
+    """Persist a queued job and wake the local workers."""
+    job = GenerationJob(
+        id=uuid.uuid4().hex,
+        user_id=user_id,
+        kind=kind,
+        status='queued',
+        params=json.dumps(params),
+        source_blob=source_blob
+    )
+    db.session.add(job)
+    db.session.commit()
+    if worker_pool is not None:
+        worker_pool.notify()
+    return job
+
+
+def claim_next_job():
+    """Atomically move the oldest queued job to running and return its id."""
+    while True:
+        job_id = db.session.query(GenerationJob.id).filter_by(status='queued') \
+            .order_by(GenerationJob.created_at).limit(1).scalar()
+        if job_id is None:
+            return None
+        now = datetime.utcnow()
+        claimed = GenerationJob.query.filter_by(id=job_id, status='queued').update(
+            {'status': 'running', 'started_at': now, 'heartbeat_at': now},
+            synchronize_session=False
+        )
+        db.session.commit()
+        if claimed:
+            return job_id
+
+
+def fail_stale_jobs(stale_after=JOB_STALE_AFTER):
+    """
+    Fail running jobs whose worker has not reported for stale_after seconds.
+
+    Workers refresh heartbeat_at with every progress report, so a long job
+    that is still making progress is left alone. A job that went quiet had
+    its worker crash or restart mid-job, and nothing will ever finish it;
+    failing it lets polling clients stop and resubmit. Returns the number of
+    jobs failed.
+    """
+    now = datetime.utcnow()
+    last_seen = func.coalesce(GenerationJob.heartbeat_at, GenerationJob.started_at)
+    failed = GenerationJob.query.filter(
+        GenerationJob.status == 'running',
+        last_seen < now - timedelta(seconds=stale_after)
+    ).update({
+        'status': 'failed',
+        'error': 'The job was interrupted before it finished. Please try again.',
+        'source_blob': None,
+        'finished_at': now
+    }, synchronize_session=False)
+    db.session.commit()
+    if failed:
+        logger.warning("Failed %d generation jobs abandoned by a stopped worker", failed)
+    return failed
+
+
+def _report_progress(job_id):
+    def progress(batches_done, batches_total, questions_done):
+        GenerationJob.query.filter_by(id=job_id).update({
+            'batches_done': batches_done,
+            'batches_total': batches_total,
+            'questions_done': questions_done,
+            'heartbeat_at': datetime.utcnow()
+        }, synchronize_session=False)
+        db.session.commit()
+    return progress
+
+
+def _generate(job, params, progress):
+    source_type = params['source_type']
+    num_questions = params['num_questions']
+    difficulty = params['difficulty']
+    if source_type == 'pdf':
+        return generate_mcqs_from_pdf(io.BytesIO(job.source_blob), num_questions, difficulty, progress=progress)
+    if source_type == 'topic':
+        return generate_topic_mcqs(params['topic'], num_questions, difficulty, user_id=job.user_id, progress=progress)
+    return generate_mcqs(params['text'], num_questions, difficulty, progress=progress)
+
+
+def run_job(job_id):
+    """Run a claimed job to completion and record its result or error."""
+    job = db.session.get(GenerationJob, job_id)
+    params = json.loads(job.params)
+    logger.info("Job %s: running %s generation (%s, %s questions)", job_id, job.kind, params['source_type'], params['num_questions'])
+
+    try:
+        mcqs = _generate(job, params, _report_progress(job_id))
+        if not mcqs:
+            raise ValueError('No MCQs were generated. Please check if your text is meaningful and try again.')
+
+        if job.kind == 'test':
+            result = {
+                'message': 'Test created successfully',
+                'test_data': {
+                    'num_questions': len(mcqs),
+                    'difficulty': params['difficulty'],
+                    'time_duration': params.get('time_duration', 10),
+                    'mcqs': mcqs
+                }
+            }
+        else:
+            result = {
+                'message': 'MCQs generated successfully',
+                'mcqs': mcqs,
+                'saved': False,
+                'authenticated': job.user_id is not None,
+                'user_id': job.user_id
+            }
+            if job.user_id:
+                try:
+                    save_mcq_set(job.user_id, params['source_type'], params['difficulty'], mcqs)
+                    result['saved'] = True
+                except Exception as save_error:
+                    db.session.rollback()
+                    result['save_error'] = str(save_error)
+
+        job = db.session.get(GenerationJob, job_id)
+        job.status = 'completed'
+        job.result = json.dumps(result)
+        job.questions_done = len(mcqs)
+        job.source_blob = None
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+        logger.info("Job %s: completed with %d MCQs", job_id, len(mcqs))
+
+    except Exception as e:
+        db.session.rollback()
+        logger.exception("Job %s failed", job_id)
+        job = db.session.get(GenerationJob, job_id)
+        job.status = 'failed'
+        job.error = str(e)
+        job.source_blob = None
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+
+
+class JobWorkerPool:
+    """Worker threads that claim queued jobs from the database and run them."""
+
+    def __init__(self, app, workers=JOB_WORKERS, poll_interval=JOB_POLL_INTERVAL):
+        self.app = app
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._wakeup = threading.Event()
+        self._threads = []
+        self._next_stale_check = 0.0
+        self._stale_lock = threading.Lock()
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"job-worker-{i + 1}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info("Started %d generation job workers", self.workers)
+        return self
+
+    def notify(self):
+        self._wakeup.set()
+
+    def join(self):
+        for thread in self._threads:
+            thread.join()
+
+    def _check_stale(self):
+        """Fail abandoned jobs at startup and then every STALE_CHECK_INTERVAL seconds, from one worker at a time."""
+        with self._stale_lock:
+            if time.monotonic() < self._next_stale_check:
+                return
+            self._next_stale_check = time.monotonic() + STALE_CHECK_INTERVAL
+        fail_stale_jobs()
+
+    def _work(self):
+        while True:
+            try:
+                with self.app.app_context():
+                    self._check_stale()
+                    job_id = claim_next_job()
+                    if job_id is not None:
+                        with span('job.run', job_id=job_id):
+                            run_job(job_id)
+                        continue
+            except Exception:
+                logger.exception("Job worker error")
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+
+worker_pool = None
+
+
+def start_workers(app, workers=JOB_WORKERS):
+    """Start the in-process worker pool (no-op when workers is 0)."""
+    global worker_pool
+    if workers <= 0 or worker_pool is not None:
+        return worker_pool
+    if multiprocessing.parent_process() is not None:
+        # Helper processes (e.g. PDF extraction) that re-import the app must not run jobs
+        return None
+    worker_pool = JobWorkerPool(app, workers).start()
+    return worker_pool
+
+
+if __name__ == '__main__':
+    # Standalone worker process: keep the imported app from starting its own pool
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else max(JOB_WORKERS, 1)
+    os.environ['JOB_WORKERS'] = '0'
+    from app import app
+    start_workers(app, workers).join()
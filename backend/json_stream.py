@@ -0,0 +1,102 @@
+import re
+import json
+
+_TRAILING_COMMA = re.compile(r',\s*([}\]])')
+
+
+class IncrementalArrayParser:
+    """
+    Pull complete objects out of a JSON array while it is still arriving.
+
+    Feed text chunks as they stream in; every object that is a direct element
+    of the first array in the text is returned as soon as its closing brace
+    arrives. Anything before the array (prose, markdown fences, a wrapping
+    object, or a bracketed aside like "[25 questions]" that holds no objects)
+    is skipped, and so is any other array that ends without producing an
+    object, e.g. a "tags" list ahead of the real one in a wrapping object.
+    When is_item is given, objects it rejects are ignored as well, so an
+    array of unrelated objects does not end the search. Only the unfinished
+    tail is kept in memory.
+
+    Parsing is tolerant: an element that is not valid JSON (after forgiving
+    trailing commas and raw control characters) is counted in skipped and
+    dropped without affecting its neighbours, and a truncated array still
+    yields every object completed before the cut. salvaged counts the objects
+    returned so far.
+    """
+
+    def __init__(self, is_item=None):
+        self._is_item = is_item
+        self._buffer = ""
+        self._pos = 0
+        self._depth = 0
+        self._array_depth = None
+        self._object_start = None
+        self._in_string = False
+        self._escape = False
+        self._array_items = 0
+        self.finished = False
+        self.salvaged = 0
+        self.skipped = 0
+
+    def feed(self, chunk):
+        """Add a chunk of text and return the list of objects it completed."""
+        self._buffer += chunk
+        completed = []
+        buffer = self._buffer
+        i = self._pos
+
+        while i < len(buffer) and not self.finished:
+            ch = buffer[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in '[{':
+                self._depth += 1
+                if ch == '[' and self._array_depth is None:
+                    self._array_depth = self._depth
+                elif ch == '{' and self._array_depth is not None and self._depth == self._array_depth + 1:
+                    self._object_start = i
+            elif ch in ']}':
+                if ch == '}' and self._object_start is not None and self._depth == self._array_depth + 1:
+                    item = self._decode(buffer[self._object_start:i + 1])
+                    if item is None:
+                        self._array_items += 1
+                        self.skipped += 1
+                    elif self._is_item is None or self._is_item(item):
+                        self._array_items += 1
+                        completed.append(item)
+                        self.salvaged += 1
+                    self._object_start = None
+                elif ch == ']' and self._depth == self._array_depth:
+                    if self._array_items:
+                        self.finished = True
+                    else:
+                        # A list that produced no items (empty, strings, unrelated objects); keep looking
+                        self._array_depth = None
+                self._depth -= 1
+            i += 1
+
+        # Drop everything that can no longer be part of a pending object
+        keep_from = self._object_start if self._object_start is not None else i
+        self._buffer = buffer[keep_from:]
+        if self._object_start is not None:
+            self._object_start = 0
+        self._pos = i - keep_from
+        return completed
+
+    @staticmethod
+    def _decode(text):
+        for candidate in (text, _TRAILING_COMMA.sub(r'\1', text)):
+            try:
+                item = json.loads(candidate, strict=False)
+            except ValueError:
+                continue
+            return item if isinstance(item, dict) else None
+        return None
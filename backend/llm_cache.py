@@ -0,0 +1,158 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import logging
+from dotenv import load_dotenv
+from metrics import CACHE_REQUESTS
+
+basedir = os.path.abspath(os.path.dirname(__file__))
+dotenv_path = os.path.join(basedir, '.env')
+load_dotenv(dotenv_path)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = os.path.join(basedir, 'instance', 'llm_cache.db')
+
+
+def _count_lookup(key, result):
+    CACHE_REQUESTS.inc(namespace=key.split(':', 1)[0], result=result)
+
+
+def make_key(namespace, *parts):
+    """
+    Build a content-addressed cache key from the inputs of a generation call.
+
+    Bytes (e.g. uploaded PDFs) are hashed on their own so large uploads never
+    have to be serialized; everything else goes through sorted JSON.
+    """
+    digest = hashlib.sha256(namespace.encode('utf-8'))
+    for part in parts:
+        if isinstance(part, (bytes, bytearray)):
+            part = {'sha256': hashlib.sha256(part).hexdigest()}
+        digest.update(b'\0')
+        digest.update(json.dumps(part, sort_keys=True, default=str).encode('utf-8'))
+    return f"{namespace}:{digest.hexdigest()}"
+
+
+class ResultCache:
+    """
+    SQLite-backed cache for LLM results with TTL expiry and LRU size eviction.
+
+    Values are stored as JSON. Every hit refreshes the entry's access time and
+    whenever the total stored size goes over max_bytes the least recently used
+    entries are dropped until it fits again.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl=7 * 24 * 3600, max_bytes=256 * 1024 * 1024, enabled=True):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._initialized = False
+
+    def _connect(self):
+        if not self._initialized:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        if not self._initialized:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS cache_entries (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_cache_entries_accessed_at ON cache_entries (accessed_at)")
+            self._initialized = True
+        return conn
+
+    def get(self, key):
+        """Return the cached value for key, or None on a miss or expired entry."""
+        if not self.enabled:
+            return None
+        now = time.time()
+        try:
+            with self._lock:
+                conn = self._connect()
+                try:
+                    row = conn.execute(
+                        "SELECT value, created_at FROM cache_entries WHERE key = ?", (key,)
+                    ).fetchone()
+                    if row is None:
+                        _count_lookup(key, 'miss')
+                        return None
+                    value, created_at = row
+                    if self.ttl and now - created_at > self.ttl:
+                        conn.execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+                        _count_lookup(key, 'miss')
+                        return None
+                    conn.execute("UPDATE cache_entries SET accessed_at = ? WHERE key = ?", (now, key))
+                finally:
+                    conn.close()
+            _count_lookup(key, 'hit')
+            return json.loads(value)
+        except Exception as e:
+            logger.warning("Cache read error: %s", e)
+            return None
+
+    def set(self, key, value):
+        """Store value under key and evict old entries if the cache is over budget."""
+        if not self.enabled:
+            return
+        now = time.time()
+        try:
+            payload = json.dumps(value)
+            with self._lock:
+                conn = self._connect()
+                try:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO cache_entries (key, value, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                        (key, payload, len(payload), now, now)
+                    )
+                    self._evict(conn, now)
+                finally:
+                    conn.close()
+        except Exception as e:
+            logger.warning("Cache write error: %s", e)
+
+    def _evict(self, conn, now):
+        if self.ttl:
+            conn.execute("DELETE FROM cache_entries WHERE created_at < ?", (now - self.ttl,))
+        if not self.max_bytes:
+            return
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache_entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        freed = 0
+        stale = []
+        for key, size in conn.execute("SELECT key, size FROM cache_entries ORDER BY accessed_at"):
+            stale.append((key,))
+            freed += size
+            if total - freed <= self.max_bytes:
+                break
+        conn.executemany("DELETE FROM cache_entries WHERE key = ?", stale)
+
+    def clear(self):
+        """Remove every entry."""
+        with self._lock:
+            conn = self._connect()
+            try:
+                conn.execute("DELETE FROM cache_entries")
+            finally:
+                conn.close()
+
+
+# Shared cache for generated MCQs and summaries
+llm_cache = ResultCache(
+    path=os.getenv('LLM_CACHE_PATH', DEFAULT_CACHE_PATH),
+    ttl=int(os.getenv('LLM_CACHE_TTL', str(7 * 24 * 3600))),
+    max_bytes=int(os.getenv('LLM_CACHE_MAX_MB', '256')) * 1024 * 1024,
+    enabled=os.getenv('LLM_CACHE_ENABLED', '1') not in ('0', 'false', 'False')
+)
@@ -0,0 +1,469 @@
+import os
+import json
+import time
+import asyncio
+import random
+import logging
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+from rate_limiter import AdaptiveRateLimiter, CircuitBreaker, LLMError
+from metrics import LLM_REQUEST_SECONDS, LLM_REQUESTS, LLM_RETRIES, LLM_RATE_LIMITED, LLM_TOKENS
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+try:
+    import h2  # noqa: F401  (httpx only negotiates HTTP/2 when h2 is installed)
+except ImportError:
+    h2 = None
+
+basedir = os.path.abspath(os.path.dirname(__file__))
+dotenv_path = os.path.join(basedir, '.env')
+load_dotenv(dotenv_path)
+
+logger = logging.getLogger(__name__)
+
+GROQ_API_URL = os.getenv('GROQ_API_URL', 'https://api.groq.com/openai/v1/chat/completions')
+POOL_SIZE = int(os.getenv('GROQ_POOL_SIZE', '16'))  # Max open connections to Groq
+ASYNC_POOL_SIZE = int(os.getenv('GROQ_ASYNC_POOL_SIZE', '64'))  # Max open connections per event loop in async mode
+CONNECT_TIMEOUT = float(os.getenv('GROQ_CONNECT_TIMEOUT', '10'))
+USE_HTTP2 = os.getenv('GROQ_HTTP2', '1') not in ('0', 'false', 'False')
+MAX_RETRIES = int(os.getenv('GROQ_MAX_RETRIES', '4'))
+BACKOFF_BASE = float(os.getenv('GROQ_BACKOFF_BASE', '1'))  # Seconds
+BACKOFF_MAX = float(os.getenv('GROQ_BACKOFF_MAX', '20'))  # Seconds
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+TRANSPORT_ERRORS = (requests.RequestException,) + ((httpx.TransportError,) if httpx else ())
+
+
+def estimate_tokens(payload):
+    """
+    Tokens to reserve in the rate limiter for a call: the prompt (about 4
+    characters per token) plus max_tokens for the completion. The unused part
+    is refunded once the response reports its usage.
+    """
+    prompt = sum(len(str(m.get('content', ''))) for m in payload.get('messages', [])) // 4
+    return prompt + int(payload.get('max_tokens') or 0)
+
+
+def _record_attempt(model, mode, status, started=None):
+    """Count one HTTP attempt and, when it got a response, how long it took."""
+    LLM_REQUESTS.inc(model=model, status=status)
+    if status == 429:
+        LLM_RATE_LIMITED.inc(model=model)
+    if started is not None:
+        LLM_REQUEST_SECONDS.observe(time.perf_counter() - started, model=model, mode=mode)
+
+
+def _parse_stream_line(line):
+    """Content delta of one SSE line of a streamed completion, '' for other lines, None at [DONE]."""
+    if not line or not line.startswith('data:'):
+        return ''
+    data = line[len('data:'):].strip()
+    if data == '[DONE]':
+        return None
+    return json.loads(data)['choices'][0].get('delta', {}).get('content') or ''
+
+
+class _BaseLLMClient:
+    """Configuration and the retry, rate limit and metrics bookkeeping shared by the sync and async clients."""
+
+    def __init__(self, url, pool_size, connect_timeout, http2, rate_limiter, circuit_breaker, max_retries):
+        self.url = url
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.http2 = http2 and httpx is not None and h2 is not None
+        self.rate_limiter = rate_limiter or AdaptiveRateLimiter()
+        self.circuit_breaker = circuit_breaker or CircuitBreaker()
+        self.max_retries = max_retries
+        self._session = None
+
+    @staticmethod
+    def _headers(api_key):
+        return {
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json"
+        }
+
+    def _retry_delay(self, model, attempt, last_error, what="call"):
+        """Count a retry and return how long to back off before it."""
+        LLM_RETRIES.inc(model=model)
+        delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+        logger.warning("Retrying Groq %s in %.1fs (attempt %d/%d): %s", what, delay, attempt + 1, self.max_retries + 1, last_error)
+        return delay
+
+    def _record_response(self, response):
+        # 429s and client errors still mean the upstream is up; only 5xx/timeouts count against it
+        if response.status_code in RETRYABLE_STATUS and response.status_code != 429:
+            self.circuit_breaker.record_failure()
+        else:
+            self.circuit_breaker.record_success()
+        self.rate_limiter.update_from_headers(response.headers)
+
+    def _refund_completion(self, payload, estimated, completion_chars=0):
+        """Settle a reservation for a call whose usage is not reported: keep the prompt, refund unused completion tokens."""
+        prompt = estimated - int(payload.get('max_tokens') or 0)
+        self.rate_limiter.record_usage(estimated, prompt + completion_chars // 4)
+
+    def _record_usage(self, model, estimated, data):
+        usage = data.get('usage', {})
+        self.rate_limiter.record_usage(estimated, usage.get('total_tokens'))
+        for kind in ('prompt', 'completion'):
+            if usage.get(f'{kind}_tokens'):
+                LLM_TOKENS.inc(usage[f'{kind}_tokens'], model=model, kind=kind)
+
+
+class LLMClient(_BaseLLMClient):
+    """
+    Process-wide HTTP client for the Groq chat completions API.
+
+    Connections are pooled and kept alive between calls, so concurrent batches
+    and requests reuse the same TLS sessions instead of handshaking each time.
+    Uses httpx with HTTP/2 when httpx and h2 are installed, otherwise a
+    requests.Session with a sized connection pool. Both are safe to share
+    across threads.
+    """
+
+    def __init__(self, url=GROQ_API_URL, pool_size=POOL_SIZE, connect_timeout=CONNECT_TIMEOUT, http2=USE_HTTP2,
+                 rate_limiter=None, circuit_breaker=None, max_retries=MAX_RETRIES):
+        super().__init__(url, pool_size, connect_timeout, http2, rate_limiter, circuit_breaker, max_retries)
+        self._lock = threading.Lock()
+
+    def _get_session(self):
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    if self.http2:
+                        self._session = httpx.Client(
+                            http2=True,
+                            limits=httpx.Limits(
+                                max_connections=self.pool_size,
+                                max_keepalive_connections=self.pool_size
+                            )
+                        )
+                    else:
+                        session = requests.Session()
+                        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, pool_block=True)
+                        session.mount('https://', adapter)
+                        session.mount('http://', adapter)
+                        self._session = session
+        return self._session
+
+    def post(self, api_key, payload, timeout=90):
+        """Send a chat completion request and return the raw HTTP response."""
+        headers = self._headers(api_key)
+        session = self._get_session()
+        if self.http2:
+            return session.post(self.url, headers=headers, json=payload,
+                                timeout=httpx.Timeout(timeout, connect=self.connect_timeout))
+        return session.post(self.url, headers=headers, json=payload,
+                            timeout=(self.connect_timeout, timeout))
+
+    def chat_completion(self, api_key, payload, timeout=90):
+        """
+        Call the chat completions API with rate limiting and bounded retries.
+
+        Waits for capacity in the shared rate limiter before each attempt.
+        429s, 5xx responses and connection errors are retried up to
+        max_retries times with exponential backoff and full jitter (never
+        sooner than a retry-after header asks). Returns the decoded JSON body
+        or raises LLMError.
+        """
+        model = payload.get('model', 'unknown')
+        estimated = estimate_tokens(payload)
+        last_error = None
+
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                time.sleep(self._retry_delay(model, attempt, last_error))
+
+            self.rate_limiter.acquire(estimated)
+            self.circuit_breaker.before_call()
+            started = time.perf_counter()
+            try:
+                response = self.post(api_key, payload, timeout=timeout)
+            except TRANSPORT_ERRORS as e:
+                _record_attempt(model, 'complete', 'error')
+                self.circuit_breaker.record_failure()
+                self._refund_completion(payload, estimated)
+                last_error = LLMError(f"Groq API request failed: {e}")
+                continue
+            except Exception:
+                self.circuit_breaker.record_failure()
+                raise
+
+            self._record_response(response)
+            _record_attempt(model, 'complete', response.status_code, started)
+
+            if response.status_code == 200:
+                data = response.json()
+                self._record_usage(model, estimated, data)
+                return data
+
+            self._refund_completion(payload, estimated)
+            last_error = LLMError(f"Groq API returned status {response.status_code}: {response.text}",
+                                  status_code=response.status_code)
+            if response.status_code not in RETRYABLE_STATUS:
+                raise last_error
+
+        raise last_error
+
+    def stream_chat_completion(self, api_key, payload, timeout=90):
+        """
+        Call the chat completions API with stream=True and yield content deltas.
+
+        Rate limiting, retries and the circuit breaker apply the same way as
+        in chat_completion, but only until the response starts; once content
+        has been yielded a broken stream raises instead of retrying.
+        """
+        payload = dict(payload, stream=True)
+        headers = self._headers(api_key)
+        model = payload.get('model', 'unknown')
+        estimated = estimate_tokens(payload)
+        last_error = None
+        started = False
+
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                time.sleep(self._retry_delay(model, attempt, last_error, "stream"))
+
+            self.rate_limiter.acquire(estimated)
+            self.circuit_breaker.before_call()
+            session = self._get_session()
+            attempt_started = time.perf_counter()
+            responded = False
+            completion_chars = 0
+            try:
+                if self.http2:
+                    context = session.stream("POST", self.url, headers=headers, json=payload,
+                                             timeout=httpx.Timeout(timeout, connect=self.connect_timeout))
+                else:
+                    context = session.post(self.url, headers=headers, json=payload, stream=True,
+                                           timeout=(self.connect_timeout, timeout))
+                with context as response:
+                    self._record_response(response)
+                    responded = True
+
+                    if response.status_code != 200:
+                        _record_attempt(model, 'stream', response.status_code, attempt_started)
+                        self._refund_completion(payload, estimated)
+                        body = response.read() if self.http2 else response.content
+                        last_error = LLMError(f"Groq API returned status {response.status_code}: {body[:500]!r}",
+                                              status_code=response.status_code)
+                        if response.status_code not in RETRYABLE_STATUS:
+                            raise last_error
+                        continue
+
+                    if self.http2:
+                        lines = response.iter_lines()
+                    else:
+                        # SSE is UTF-8, but without a charset requests would decode it as ISO-8859-1
+                        response.encoding = 'utf-8'
+                        lines = response.iter_lines(decode_unicode=True)
+                    for line in lines:
+                        delta = _parse_stream_line(line)
+                        if delta is None:
+                            break
+                        if delta:
+                            started = True
+                            completion_chars += len(delta)
+                            yield delta
+                    _record_attempt(model, 'stream', 200, attempt_started)
+                    # Streamed responses carry no usage; settle on the text received
+                    self._refund_completion(payload, estimated, completion_chars)
+                    return
+            except TRANSPORT_ERRORS as e:
+                _record_attempt(model, 'stream', 'error')
+                self.circuit_breaker.record_failure()
+                self._refund_completion(payload, estimated, completion_chars)
+                last_error = LLMError(f"Groq API request failed: {e}")
+                if started:
+                    raise last_error
+            except LLMError:
+                raise
+            except Exception:
+                # As in chat_completion: an unexpected error before the response must not leave a trial call open
+                if not responded:
+                    self.circuit_breaker.record_failure()
+                raise
+
+        raise last_error
+
+    def close(self):
+        """Close pooled connections."""
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+
+class AsyncLLMClient(_BaseLLMClient):
+    """
+    asyncio counterpart of LLMClient, used by the ASGI entry point (asgi.py).
+
+    A coroutine waiting on Groq holds no thread, so one process can keep
+    hundreds of generation requests in flight. Connections are pooled in one
+    httpx.AsyncClient per event loop. Pass the sync client's rate limiter and
+    circuit breaker to enforce one set of limits across both clients.
+    Requires httpx.
+    """
+
+    def __init__(self, url=GROQ_API_URL, pool_size=ASYNC_POOL_SIZE, connect_timeout=CONNECT_TIMEOUT, http2=USE_HTTP2,
+                 rate_limiter=None, circuit_breaker=None, max_retries=MAX_RETRIES):
+        if httpx is None:
+            raise RuntimeError("AsyncLLMClient requires httpx (pip install httpx)")
+        super().__init__(url, pool_size, connect_timeout, http2, rate_limiter, circuit_breaker, max_retries)
+        self._loop = None
+
+    def _get_session(self):
+        # An AsyncClient is bound to the event loop it was first used on
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._loop is not loop:
+            self._session = httpx.AsyncClient(
+                http2=self.http2,
+                limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size)
+            )
+            self._loop = loop
+        return self._session
+
+    def _timeout(self, timeout):
+        # Waiting for a free pooled connection is not part of the request timeout
+        return httpx.Timeout(timeout, connect=self.connect_timeout, pool=None)
+
+    async def chat_completion(self, api_key, payload, timeout=90):
+        """Async LLMClient.chat_completion: same rate limiting, retries and errors."""
+        model = payload.get('model', 'unknown')
+        estimated = estimate_tokens(payload)
+        last_error = None
+
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                await asyncio.sleep(self._retry_delay(model, attempt, last_error))
+
+            await self.rate_limiter.acquire_async(estimated)
+            self.circuit_breaker.before_call()
+            started = time.perf_counter()
+            try:
+                response = await self._get_session().post(self.url, headers=self._headers(api_key), json=payload,
+                                                          timeout=self._timeout(timeout))
+            except httpx.TransportError as e:
+                _record_attempt(model, 'complete', 'error')
+                self.circuit_breaker.record_failure()
+                self._refund_completion(payload, estimated)
+                last_error = LLMError(f"Groq API request failed: {e}")
+                continue
+            except asyncio.CancelledError:
+                # The caller went away; that says nothing about Groq's health
+                self.circuit_breaker.release()
+                raise
+            except Exception:
+                self.circuit_breaker.record_failure()
+                raise
+
+            self._record_response(response)
+            _record_attempt(model, 'complete', response.status_code, started)
+
+            if response.status_code == 200:
+                data = response.json()
+                self._record_usage(model, estimated, data)
+                return data
+
+            self._refund_completion(payload, estimated)
+            last_error = LLMError(f"Groq API returned status {response.status_code}: {response.text}",
+                                  status_code=response.status_code)
+            if response.status_code not in RETRYABLE_STATUS:
+                raise last_error
+
+        raise last_error
+
+    async def stream_chat_completion(self, api_key, payload, timeout=90):
+        """Async generator version of LLMClient.stream_chat_completion."""
+        payload = dict(payload, stream=True)
+        model = payload.get('model', 'unknown')
+        estimated = estimate_tokens(payload)
+        last_error = None
+        started = False
+
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                await asyncio.sleep(self._retry_delay(model, attempt, last_error, "stream"))
+
+            await self.rate_limiter.acquire_async(estimated)
+            self.circuit_breaker.before_call()
+            attempt_started = time.perf_counter()
+            responded = False
+            completion_chars = 0
+            try:
+                async with self._get_session().stream("POST", self.url, headers=self._headers(api_key), json=payload,
+                                                      timeout=self._timeout(timeout)) as response:
+                    self._record_response(response)
+                    responded = True
+
+                    if response.status_code != 200:
+                        _record_attempt(model, 'stream', response.status_code, attempt_started)
+                        self._refund_completion(payload, estimated)
+                        body = await response.aread()
+                        last_error = LLMError(f"Groq API returned status {response.status_code}: {body[:500]!r}",
+                                              status_code=response.status_code)
+                        if response.status_code not in RETRYABLE_STATUS:
+                            raise last_error
+                        continue
+
+                    async for line in response.aiter_lines():
+                        delta = _parse_stream_line(line)
+                        if delta is None:
+                            break
+                        if delta:
+                            started = True
+                            completion_chars += len(delta)
+                            yield delta
+                    _record_attempt(model, 'stream', 200, attempt_started)
+                    self._refund_completion(payload, estimated, completion_chars)
+                    return
+            except asyncio.CancelledError:
+                self.circuit_breaker.release()
+                raise
+            except httpx.TransportError as e:
+                _record_attempt(model, 'stream', 'error')
+                self.circuit_breaker.record_failure()
+                self._refund_completion(payload, estimated, completion_chars)
+                last_error = LLMError(f"Groq API request failed: {e}")
+                if started:
+                    raise last_error
+            except LLMError:
+                raise
+            except Exception:
+                if not responded:
+                    self.circuit_breaker.record_failure()
+                raise
+
+        raise last_error
+
+    async def aclose(self):
+        """Close pooled connections of the current event loop's client."""
+        if self._session is not None:
+            await self._session.aclose()
+            self._session = None
+
+
+# Shared client used by mcq_ai and summarize_ai
+groq_client = LLMClient(
+    rate_limiter=AdaptiveRateLimiter(
+        requests_per_minute=int(os.getenv('GROQ_REQUESTS_PER_MINUTE', '30')),
+        tokens_per_minute=int(os.getenv('GROQ_TOKENS_PER_MINUTE', '12000')),
+        max_wait=float(os.getenv('GROQ_RATE_LIMIT_MAX_WAIT', '60'))
+    ),
+    circuit_breaker=CircuitBreaker(
+        failure_threshold=int(os.getenv('GROQ_CIRCUIT_FAILURES', '5')),
+        reset_timeout=float(os.getenv('GROQ_CIRCUIT_RESET', '30'))
+    )
+)
+
+# Async client for the ASGI entry point; shares the limits above. None without httpx.
+async_groq_client = AsyncLLMClient(
+    rate_limiter=groq_client.rate_limiter,
+    circuit_breaker=groq_client.circuit_breaker
+) if httpx else None
@@ -0,0 +1,148 @@
+"""
+Structured, leveled logging for the backend.
+
+configure_logging() routes every logger through a bounded in-memory queue
+that a background thread drains to stderr, so request threads never wait on
+console I/O; when the queue is full, records are dropped and counted instead
+of blocking. Output is one JSON object per line (LOG_FORMAT=json) or plain
+text with key=value fields. API keys, bearer tokens, passwords and cookies
+are redacted, and records logged with extra={'sample': True} (per-request
+noise) are kept at LOG_SAMPLE_RATE.
+"""
+import os
+import re
+import sys
+import json
+import queue
+import atexit
+import random
+import logging
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from dotenv import load_dotenv
+
+basedir = os.path.abspath(os.path.dirname(__file__))
+dotenv_path = os.path.join(basedir, '.env')
+load_dotenv(dotenv_path)
+
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text')  # 'text' or 'json'
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))  # Records buffered before new ones are dropped
+LOG_SAMPLE_RATE = float(os.getenv('LOG_SAMPLE_RATE', '0.1'))  # Share of sampled (per-request) records kept
+
+# Attributes every LogRecord has; anything else on a record came from extra={...}
+_STANDARD_ATTRS = set(logging.LogRecord('', 0, '', 0, '', (), None).__dict__) | {'message', 'asctime', 'sample'}
+
+_SECRET_PATTERNS = [
+    (re.compile(r'gsk_[A-Za-z0-9]{8,}'), 'gsk_***'),
+    (re.compile(r'(?i)(bearer\s+)[^\s"\',]+'), r'\1***'),
+    (re.compile(r'(?i)((?:api[_-]?key|password|secret|token|cookie|session)["\']?\s*[:=]\s*["\']?)[^\s"\',}]+'), r'\1***'),
+]
+_SECRET_FIELDS = re.compile(r'(?i)api[_-]?key|password|secret|token|cookie|session')
+
+
+def redact(text):
+    for pattern, replacement in _SECRET_PATTERNS:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+def _extra_fields(record):
+    return {
+        key: ('***' if _SECRET_FIELDS.search(key) else value)
+        for key, value in record.__dict__.items()
+        if key not in _STANDARD_ATTRS and not key.startswith('_')
+    }
+
+
+class SamplingFilter(logging.Filter):
+    """Keep only a share of below-WARNING records that were logged with extra={'sample': True}."""
+
+    def __init__(self, rate=LOG_SAMPLE_RATE):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if getattr(record, 'sample', False) and record.levelno < logging.WARNING:
+            return random.random() < self.rate
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': redact(record.getMessage()),
+        }
+        entry.update(_extra_fields(record))
+        exc_text = self.formatException(record.exc_info) if record.exc_info else record.exc_text
+        if exc_text:
+            entry['exc'] = redact(exc_text)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    def format(self, record):
+        text = super().format(record)
+        fields = _extra_fields(record)
+        if fields:
+            first_line, newline, rest = text.partition('\n')
+            text = first_line + ' ' + ' '.join(f"{key}={value}" for key, value in fields.items()) + newline + rest
+        return redact(text)
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler that never blocks: records that do not fit are counted in dropped."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Formatting happens on the listener thread; only freeze the message and traceback here
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_listener = None
+queue_handler = None
+
+
+def configure_logging(level=LOG_LEVEL, fmt=LOG_FORMAT):
+    """Install the queue-backed root handler (once per process)."""
+    global _listener, queue_handler
+    if _listener is not None:
+        return
+    output = logging.StreamHandler(sys.stderr)
+    output.setFormatter(JsonFormatter() if fmt == 'json' else TextFormatter())
+
+    queue_handler = DroppingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    queue_handler.addFilter(SamplingFilter())
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+    if root.level > logging.DEBUG:
+        # httpx logs every Groq request at INFO; those are covered by metrics and traces
+        logging.getLogger('httpx').setLevel(logging.WARNING)
+
+    _listener = QueueListener(queue_handler.queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
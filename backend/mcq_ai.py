@@ -1,139 +1,245 @@
 import os
 import json
-import re
-import requests
-from PyPDF2 import PdfReader
+import math
+import time
+import queue
+import asyncio
+import fastjsonschema
+import logging
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+from llm_cache import llm_cache, make_key
+from llm_client import groq_client, async_groq_client, LLMError
+from json_stream import IncrementalArrayParser
+from chunking import split_text, assign_runs, runs_needed, digest
+from dedupe import NearDuplicateIndex
+from pdf_extract import SpooledPDF
+from metrics import MCQ_BATCHES
+from tracing import span, start_span, in_context
 
 basedir = os.path.abspath(os.path.dirname(__file__))
 dotenv_path = os.path.join(basedir, '.env')
 load_dotenv(dotenv_path)
 
-def extract_text_from_pdf(pdf_file):
-    """Extract text from uploaded PDF file"""
-    try:
-        reader = PdfReader(pdf_file)
-        text = ""
-        for page in reader.pages:
-            text += page.extract_text() + "\n"
-        return text.strip()
-    except Exception as e:
-        print(f"Error extracting PDF: {e}")
-        return ""
+logger = logging.getLogger(__name__)
+
+
+def _is_mcq_item(item):
+    """Whether a parsed object is meant as a question; other objects in the response are not MCQs."""
+    return 'question' in item
+
+
+def _report_salvage(parser):
+    """Log when a response had to be salvaged: malformed items dropped or the array cut short."""
+    if not parser.salvaged and not parser.skipped:
+        logger.warning("No MCQ objects found in response")
+    elif parser.skipped or not parser.finished:
+        state = "complete" if parser.finished else "truncated"
+        logger.warning("Salvaged %d MCQs from a %s response (%d malformed items dropped)", parser.salvaged, state, parser.skipped)
+
 
 def extract_json(text):
-    """Extract JSON array from AI response text using regex"""
-    try:
-        text = text.strip()
-        
-        # Remove markdown code blocks if present
-        text = re.sub(r'\`\`\`json\s*', '', text)
-        text = re.sub(r'\`\`\`\s*', '', text)
-        
-        # Find JSON array
-        match = re.search(r'\[.*\]', text, re.DOTALL)
-        if match:
-            return json.loads(match.group())
-    except Exception as e:
-        print("JSON PARSE ERROR:", e)
-    return []
+    """
+    Extract the question objects from AI response text.
 
-import time
+    Uses the tolerant incremental parser, so fences and prose around the
+    array are ignored and a malformed item or a truncated array only loses
+    the broken items instead of the whole batch.
+    """
+    parser = IncrementalArrayParser(is_item=_is_mcq_item)
+    items = parser.feed(text or "")
+    _report_salvage(parser)
+    return items
 
+GROQ_MODEL = "llama-3.3-70b-versatile"
+MCQ_TEMPERATURE = 0.5
 BATCH_SIZE = 25  # Max questions per API call
+MAX_CONCURRENT_BATCHES = int(os.getenv('GROQ_MAX_CONCURRENT_BATCHES', '4'))  # Batches in flight per request
+MAX_GENERATION_ROUNDS = int(os.getenv('GROQ_MAX_GENERATION_ROUNDS', '3'))  # Top-up rounds before giving up
+JSON_MODE = os.getenv('GROQ_JSON_MODE', '1') not in ('0', 'false', 'False')  # Ask Groq for a guaranteed JSON object
+
+# One generated question. answer_index is what the prompts ask for; answer (the
+# option text) is still accepted from older cached or prompted output.
+MCQ_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'question': {'type': 'string', 'minLength': 1},
+        'options': {
+            'type': 'array',
+            'items': {'type': 'string', 'minLength': 1},
+            'minItems': 4,
+            'maxItems': 4,
+            'uniqueItems': True
+        },
+        'answer_index': {'type': 'integer', 'minimum': 0, 'maximum': 3},
+        'answer': {'type': 'string'}
+    },
+    'required': ['question', 'options'],
+    'anyOf': [{'required': ['answer_index']}, {'required': ['answer']}]
+}
+validate_mcq = fastjsonschema.compile(MCQ_SCHEMA)
+
+MCQ_JSON_FORMAT = """Required JSON format:
+{
+  "questions": [
+    {
+      "question": "Question text here?",
+      "options": ["Option A text", "Option B text", "Option C text", "Option D text"],
+      "answer_index": 0
+    }
+  ]
+}
+"answer_index" is the 0-based position of the correct option in the "options" list."""
 
 def _format_mcqs(mcqs_raw, difficulty):
-    """Format raw MCQ JSON into the expected structure."""
+    """Validate raw MCQ objects against MCQ_SCHEMA and format them; invalid ones are dropped."""
     formatted_mcqs = []
     for mcq in mcqs_raw:
-        if 'question' in mcq and 'options' in mcq and 'answer' in mcq:
-            options = mcq['options']
-            if not isinstance(options, list) or len(options) < 4:
-                continue
-            try:
-                option_a = str(options[0]) if options[0] is not None else ""
-                option_b = str(options[1]) if options[1] is not None else ""
-                option_c = str(options[2]) if options[2] is not None else ""
-                option_d = str(options[3]) if options[3] is not None else ""
-            except (IndexError, TypeError):
+        try:
+            validate_mcq(mcq)
+        except fastjsonschema.JsonSchemaException as e:
+            logger.warning("Dropped MCQ that failed validation: %s", e.message)
+            continue
+
+        options = mcq['options']
+        answer_index = mcq.get('answer_index')
+        if answer_index is None:
+            answer_text = mcq['answer'].strip()
+            matches = [i for i, option in enumerate(options) if option.strip() == answer_text]
+            if len(matches) != 1:
+                logger.warning("Dropped MCQ whose answer matches no option: %r", answer_text[:80])
                 continue
-
-            formatted_mcq = {
-                'question': str(mcq['question']),
-                'option_a': option_a,
-                'option_b': option_b,
-                'option_c': option_c,
-                'option_d': option_d,
-                'correct_answer': 'A',
-                'difficulty': difficulty
-            }
-            answer_text = str(mcq['answer']).strip()
-            option_list = [option_a, option_b, option_c, option_d]
-            for i in range(4):
-                if option_list[i].strip() == answer_text:
-                    formatted_mcq['correct_answer'] = ['A', 'B', 'C', 'D'][i]
-                    break
-            formatted_mcqs.append(formatted_mcq)
+            answer_index = matches[0]
+
+        formatted_mcqs.append({
+            'question': mcq['question'],
+            'option_a': options[0],
+            'option_b': options[1],
+            'option_c': options[2],
+            'option_d': options[3],
+            'correct_answer': 'ABCD'[answer_index],
+            'difficulty': difficulty
+        })
     return formatted_mcqs
 
 
-def _call_groq_api(api_key, messages, timeout=90):
-    """Make a single call to the Groq API and return parsed MCQs."""
-    url = "https://api.groq.com/openai/v1/chat/completions"
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
+def _failed_generation(error):
+    """The model output Groq rejected in JSON mode (400 json_validate_failed), if that is what error is."""
+    message = str(error)
+    if error.status_code != 400 or 'json_validate_failed' not in message or '{' not in message:
+        return None
+    try:
+        return json.loads(message[message.index('{'):])['error'].get('failed_generation')
+    except (ValueError, KeyError, AttributeError):
+        return None
+
+
+def _mcq_payload(messages, json_mode=False):
     payload = {
-        "model": "llama-3.3-70b-versatile",
+        "model": GROQ_MODEL,
         "messages": messages,
-        "temperature": 0.5,
+        "temperature": MCQ_TEMPERATURE,
         "max_tokens": 8000
     }
+    if json_mode:
+        payload["response_format"] = {"type": "json_object"}
+    return payload
 
-    response = requests.post(url, headers=headers, json=payload, timeout=timeout)
-    if response.status_code == 429:
-        print("[v0] Rate limited, waiting 5 seconds...")
-        time.sleep(5)
-        response = requests.post(url, headers=headers, json=payload, timeout=timeout)
 
-    if response.status_code != 200:
-        print(f"[v0] Groq API error {response.status_code}: {response.text}")
-        raise Exception(f"Groq API returned status {response.status_code}: {response.text}")
+def _salvage_rejected(error):
+    """Return the output Groq rejected in JSON mode so what parses can be kept; re-raise any other error."""
+    failed = _failed_generation(error)
+    if failed is None:
+        raise error
+    # Usually a complete answer with one broken item; keep what parses
+    logger.warning("Groq rejected the response as invalid JSON, salvaging it")
+    return failed
 
-    data = response.json()
-    raw_text = data['choices'][0]['message']['content'].strip()
-    print(f"[v0] Groq response tokens: {data.get('usage', {})}")
-    return extract_json(raw_text)
 
+def _record_usage(call_span, data):
+    call_span.add_attributes(**{f"usage.{key}": value for key, value in data.get('usage', {}).items()
+                                if isinstance(value, int)})
+    logger.debug("Groq response tokens: %s", data.get('usage', {}))
 
-def generate_mcqs_with_groq(text, num_questions=5, difficulty='medium'):
-    """
-    Generate MCQs using Groq API with batching for large requests.
-    """
-    api_key = os.getenv('GROQ_API_KEY')
-    if not api_key:
-        raise ValueError("GROQ_API_KEY not found in environment variables.")
 
-    num_questions = int(num_questions)
-    all_mcqs = []
-    remaining = num_questions
-    batch_num = 0
+def _parse_items(raw_text):
+    with span('mcq.extract_json', chars=len(raw_text)) as parse_span:
+        items = extract_json(raw_text)
+        parse_span.set_attribute('items', len(items))
+    return items
+
+
+def _call_groq_api(api_key, messages, timeout=90):
+    """Make a single call to the Groq API and return parsed MCQs."""
+    try:
+        with span('groq.chat_completion', model=GROQ_MODEL) as call_span:
+            data = groq_client.chat_completion(api_key, _mcq_payload(messages, json_mode=JSON_MODE), timeout=timeout)
+            _record_usage(call_span, data)
+    except LLMError as e:
+        raw_text = _salvage_rejected(e)
+    else:
+        raw_text = data['choices'][0]['message']['content'].strip()
+    return _parse_items(raw_text)
+
+
+async def _acall_groq_api(api_key, messages, timeout=90):
+    """_call_groq_api on the async client, yielding the parsed MCQs."""
+    try:
+        with span('groq.chat_completion', model=GROQ_MODEL) as call_span:
+            data = await async_groq_client.chat_completion(api_key, _mcq_payload(messages, json_mode=JSON_MODE),
+                                                           timeout=timeout)
+            _record_usage(call_span, data)
+    except LLMError as e:
+        raw_text = _salvage_rejected(e)
+    else:
+        raw_text = data['choices'][0]['message']['content'].strip()
+    for item in _parse_items(raw_text):
+        yield item
+
+
+def _stream_groq_api(api_key, messages, timeout=90):
+    """Stream a Groq completion and yield each raw MCQ object as soon as it is complete."""
+    parser = IncrementalArrayParser(is_item=_is_mcq_item)
+    # Parsing is interleaved with receiving, so both are covered by this one span
+    with span('groq.stream', model=GROQ_MODEL):
+        for delta in groq_client.stream_chat_completion(api_key, _mcq_payload(messages), timeout=timeout):
+            for item in parser.feed(delta):
+                yield item
+    _report_salvage(parser)
+
+
+async def _astream_groq_api(api_key, messages, timeout=90):
+    """_stream_groq_api on the async client."""
+    parser = IncrementalArrayParser(is_item=_is_mcq_item)
+    with span('groq.stream', model=GROQ_MODEL):
+        async for delta in async_groq_client.stream_chat_completion(api_key, _mcq_payload(messages), timeout=timeout):
+            for item in parser.feed(delta):
+                yield item
+    _report_salvage(parser)
+
+
+def _batch_variation(part, parts):
+    """Prompt hint that keeps concurrently generated batches from overlapping."""
+    if parts <= 1:
+        return ""
+    return (f"\nThis request is part {part} of {parts} generated in parallel for the same quiz. "
+            f"Focus on different details and aspects than the other parts would, so questions do not overlap.")
 
-    print(f"[v0] Generating {num_questions} MCQs from text (batches of {BATCH_SIZE})")
 
-    while remaining > 0:
-        batch_num += 1
-        batch_count = min(remaining, BATCH_SIZE)
-        print(f"[v0] Batch {batch_num}: requesting {batch_count} questions...")
+def _split_count(count):
+    """Split a question count into batch sizes of at most BATCH_SIZE."""
+    return [min(BATCH_SIZE, count - i) for i in range(0, count, BATCH_SIZE)]
 
-        # Build list of already-generated questions to avoid duplicates
-        existing_questions = [m['question'] for m in all_mcqs]
-        avoid_text = ""
-        if existing_questions:
-            avoid_text = "\n\nIMPORTANT: Do NOT repeat any of these previously generated questions:\n" + "\n".join(f"- {q[:80]}" for q in existing_questions[-20:])
 
-        prompt = f"""Generate exactly {batch_count} multiple choice questions from the following text.
+def _text_messages(chunk, run, sections, batch_count, part, parts, difficulty):
+    start, end = run
+    section_note = ""
+    if end - start > 1:
+        section_note = (f"\nThe text below covers sections {start + 1} to {end} of {sections} of a longer document; "
+                        f"passages marked [...] are omitted. Spread the questions across the whole text below.")
+    elif sections > 1:
+        section_note = f"\nThe text below is section {start + 1} of {sections} of a longer document. Only ask about this section."
+    prompt = f"""Generate exactly {batch_count} multiple choice questions from the following text.
 
 Difficulty level: {difficulty}
 
@@ -141,92 +247,62 @@ Rules:
 - Create exactly 4 options (A, B, C, D) for each question
 - Only ONE option should be correct
 - Questions should test understanding of the content
-- Return ONLY valid JSON array, no additional text
+- Return ONLY a valid JSON object, no additional text
 - No markdown formatting, no code blocks
-{avoid_text}
+{_batch_variation(part, parts)}{section_note}
 
-Required JSON format:
-[
-  {{
-    "question": "Question text here?",
-    "options": ["Option A text", "Option B text", "Option C text", "Option D text"],
-    "answer": "Option A text"
-  }}
-]
+{MCQ_JSON_FORMAT}
 
 Text to generate questions from:
-{text[:4000]}"""
-
-        messages = [
-            {"role": "system", "content": "You are an expert educator who creates high-quality multiple choice questions. Always return valid JSON arrays only, with no additional formatting or text."},
-            {"role": "user", "content": prompt}
-        ]
+{chunk}"""
 
-        try:
-            mcqs_raw = _call_groq_api(api_key, messages)
-            if mcqs_raw:
-                formatted = _format_mcqs(mcqs_raw, difficulty)
-                # Filter out duplicates
-                for mcq in formatted:
-                    if mcq['question'] not in [m['question'] for m in all_mcqs]:
-                        all_mcqs.append(mcq)
-                print(f"[v0] Batch {batch_num}: got {len(formatted)} MCQs, total so far: {len(all_mcqs)}")
-            else:
-                print(f"[v0] Batch {batch_num}: no MCQs parsed, retrying...")
-        except Exception as e:
-            print(f"[v0] Batch {batch_num} error: {e}")
-
-        remaining = num_questions - len(all_mcqs)
-        if remaining > 0:
-            time.sleep(0.3)
-
-    print(f"[v0] Total MCQs generated: {len(all_mcqs)}")
-    return all_mcqs[:num_questions]
-
-def generate_mcqs(text, num_questions=5, difficulty='medium'):
-    """
-    Main function to generate MCQs from text using Groq API
-    """
-    return generate_mcqs_with_groq(text, num_questions, difficulty)
+    return [
+        {"role": "system", "content": "You are an expert educator who creates high-quality multiple choice questions. Always return a valid JSON object only, with no additional formatting or text."},
+        {"role": "user", "content": prompt}
+    ]
 
-def generate_mcqs_from_pdf(pdf_file, num_questions=5, difficulty='medium'):
-    """Generate MCQs from PDF file using Groq API"""
-    text = extract_text_from_pdf(pdf_file)
-    if not text:
-        raise ValueError("Could not extract text from PDF")
-    return generate_mcqs_with_groq(text, num_questions, difficulty)
 
-def generate_mcqs_from_topic(topic, num_questions=5, difficulty='medium'):
+def _text_batches(text, difficulty):
     """
-    Generate MCQs based on a topic name using Groq API with batching.
+    Return a plan_batches(remaining, round_num) function for questions from text.
+
+    The text is split into overlapping, token-bounded chunks. Each round
+    makes ceil(remaining / BATCH_SIZE) calls, or more for documents too long
+    to digest in that many prompts (one per question at most), splitting the
+    questions evenly between them. Every chunk belongs to one call's run of
+    neighbouring chunks (see chunking.assign_runs); a run that does not fit
+    in one prompt is sent as a digest of excerpts from all its chunks, and
+    top-up rounds take other excerpts (see chunking.digest).
     """
-    api_key = os.getenv('GROQ_API_KEY')
-    if not api_key:
-        raise ValueError("GROQ_API_KEY not found in environment variables.")
-
-    num_questions = int(num_questions)
-    all_mcqs = []
-    remaining = num_questions
-    batch_num = 0
-
+    chunks = split_text(text)
+    logger.debug("Split text into %d chunks", len(chunks))
+
+    def plan_batches(remaining, round_num):
+        if not chunks:
+            return []
+        calls = max(-(-remaining // BATCH_SIZE), min(remaining, runs_needed(len(chunks))))
+        counts = [remaining // calls + (i < remaining % calls) for i in range(calls)]
+        runs = assign_runs(len(chunks), len(counts))
+        batches = []
+        for position, (batch_count, run) in enumerate(zip(counts, runs)):
+            # Batches given the same chunk are told apart so their questions do not overlap
+            part, parts = runs[:position + 1].count(run), runs.count(run)
+            text_part = digest(chunks[run[0]:run[1]], offset=round_num)
+            messages = _text_messages(text_part, run, len(chunks), batch_count, part, parts, difficulty)
+            batches.append((batch_count, messages))
+        return batches
+    return plan_batches
+
+
+def _topic_batches(topic, difficulty):
+    """Return a plan_batches(remaining, round_num) function for questions about a topic."""
     difficulty_instructions = {
         'easy': 'Create basic, straightforward questions that test fundamental understanding.',
         'medium': 'Create moderately challenging questions that test deeper understanding and application of concepts.',
         'hard': 'Create challenging questions requiring analysis, synthesis, or application of multiple concepts.'
     }
 
-    print(f"[v0] Generating {num_questions} MCQs from topic: {topic} (batches of {BATCH_SIZE})")
-
-    while remaining > 0:
-        batch_num += 1
-        batch_count = min(remaining, BATCH_SIZE)
-        print(f"[v0] Topic Batch {batch_num}: requesting {batch_count} questions...")
-
-        existing_questions = [m['question'] for m in all_mcqs]
-        avoid_text = ""
-        if existing_questions:
-            avoid_text = "\n\nIMPORTANT: Do NOT repeat any of these previously generated questions:\n" + "\n".join(f"- {q[:80]}" for q in existing_questions[-20:])
-
+    def build_messages(batch_count, part, parts):
         prompt = f"""You are an expert educator creating a quiz about "{topic}".
 
 Generate exactly {batch_count} high-quality multiple choice questions about {topic}.
@@ -240,41 +316,486 @@ IMPORTANT RULES:
 3. Questions should be factually accurate and educational
 4. Cover different aspects/subtopics of "{topic}"
 5. Make incorrect options plausible but clearly wrong
-6. Return ONLY valid JSON array, no additional text or markdown
-{avoid_text}
-
-Required JSON format:
-[
-  {{
-    "question": "Question text here?",
-    "options": ["Option A text", "Option B text", "Option C text", "Option D text"],
-    "answer": "The correct option text (must match exactly one of the options)"
-  }}
-]
+6. Return ONLY a valid JSON object, no additional text or markdown
+{_batch_variation(part, parts)}
+
+{MCQ_JSON_FORMAT}
 
 Generate {batch_count} questions about: {topic}"""
 
-        messages = [
-            {"role": "system", "content": "You are an expert educator who creates high-quality, factually accurate multiple choice questions. You have comprehensive knowledge across all subjects. Always return valid JSON arrays only, with no additional formatting or text."},
+        return [
+            {"role": "system", "content": "You are an expert educator who creates high-quality, factually accurate multiple choice questions. You have comprehensive knowledge across all subjects. Always return a valid JSON object only, with no additional formatting or text."},
             {"role": "user", "content": prompt}
         ]
 
+    def plan_batches(remaining, round_num):
+        counts = _split_count(remaining)
+        return [(batch_count, build_messages(batch_count, part, len(counts)))
+                for part, batch_count in enumerate(counts, start=1)]
+    return plan_batches
+
+
+class _Generation:
+    """
+    Bookkeeping of one multi-batch generation, shared by the thread pool and
+    asyncio batch runners: planning rounds, merging results with dedupe,
+    batch outcome metrics and the mcq.generate span.
+    """
+
+    def __init__(self, plan_batches, num_questions, label, progress, stream):
+        self.plan_batches = plan_batches
+        self.num_questions = num_questions
+        self.label = label
+        self.progress = progress
+        self.seen = NearDuplicateIndex()
+        self.received = 0
+        self.produced = 0
+        self.batch_num = 0
+        self.batches_done = 0
+        self.last_error = None
+        self.dedupe_seconds = 0.0
+        # Not made current: the runners yield to the caller, which must not inherit it
+        self.span = start_span('mcq.generate', activate=False, questions=num_questions, stream=stream)
+
+    @property
+    def complete(self):
+        return self.produced >= self.num_questions
+
+    def rounds(self):
+        """Yield each round's batches as (batch, batch_count, round_num, messages) tuples until enough MCQs arrived."""
+        for round_num in range(MAX_GENERATION_ROUNDS):
+            if self.complete:
+                return
+            remaining = self.num_questions - self.produced
+            if self.produced:
+                remaining = min(remaining * 2, math.ceil(remaining * self.received / self.produced))
+            with span('mcq.plan_batches', parent=self.span, round=round_num, questions=remaining):
+                batches = self.plan_batches(remaining, round_num)
+
+            planned = []
+            for batch_count, messages in batches:
+                self.batch_num += 1
+                logger.debug("%s %d: requesting %d questions", self.label, self.batch_num, batch_count)
+                planned.append((self.batch_num, batch_count, round_num, messages))
+            yield planned
+
+    def batch_span(self, batch, batch_count, round_num):
+        return span('mcq.batch', parent=self.span, batch=batch, questions=batch_count, round=round_num)
+
+    def merge(self, kind, batch, value):
+        """
+        Account for one ('item', batch, mcq), ('done', batch, count) or
+        ('error', batch, exception) result. Returns the MCQ if it is new.
+        """
+        if kind == 'item':
+            self.received += 1
+            started = time.perf_counter()
+            is_new = not self.complete and self.seen.add(value['question'])
+            self.dedupe_seconds += time.perf_counter() - started
+            if is_new:
+                self.produced += 1
+                return value
+            return None
+
+        self.batches_done += 1
+        if kind == 'error':
+            MCQ_BATCHES.inc(model=GROQ_MODEL, outcome='error')
+            logger.warning("%s %d error: %s", self.label, batch, value)
+            self.last_error = value
+        elif value == 0:
+            MCQ_BATCHES.inc(model=GROQ_MODEL, outcome='empty')
+            logger.warning("%s %d: no MCQs parsed", self.label, batch)
+        else:
+            MCQ_BATCHES.inc(model=GROQ_MODEL, outcome='ok')
+            logger.debug("%s %d: got %d MCQs, total so far: %d", self.label, batch, value, self.produced)
+        if self.progress:
+            self.progress(self.batches_done, self.batch_num, self.produced)
+        return None
+
+    def settle(self, pending):
+        """Count batches left in flight once enough MCQs arrived as done, so progress reaches the total."""
+        if not pending:
+            return
+        self.batches_done += pending
+        if self.progress:
+            self.progress(self.batches_done, self.batch_num, self.produced)
+
+    def finish(self):
+        self.span.add_attributes(batches=self.batch_num, received=self.received, produced=self.produced,
+                                 dedupe_ms=round(self.dedupe_seconds * 1000, 3))
+        if self.produced == 0 and self.last_error is not None:
+            self.span.record_exception(self.last_error)
+        self.span.end()
+
+    def check(self):
+        """Raise the last error if nothing at all was generated."""
+        if self.produced == 0 and self.last_error is not None:
+            raise self.last_error
+        if self.produced < self.num_questions:
+            logger.warning("%s: only %d of %d MCQs after %d rounds", self.label, self.produced, self.num_questions,
+                           MAX_GENERATION_ROUNDS)
+
+
+def _stream_batches(api_key, plan_batches, num_questions, difficulty, label="Batch", progress=None, stream=False):
+    """
+    Fan batches out over a thread pool and yield unique MCQs as they arrive.
+
+    Each round asks plan_batches(remaining, round_num) for a list of
+    (batch_count, messages) covering the outstanding question count and sends
+    up to MAX_CONCURRENT_BATCHES of them at once.
+    Duplicates, including near-duplicate paraphrases, are dropped on merge;
+    another round is only needed when a round comes back short, up to
+    MAX_GENERATION_ROUNDS. Top-up rounds ask for extra questions in
+    proportion to the duplicate rate seen so far, so they rarely come back
+    short again. If nothing at all could be generated the last error is
+    raised.
+
+    With stream=True each batch uses Groq's streaming mode and questions are
+    yielded as soon as their JSON object has been received; otherwise they
+    are yielded when their batch completes.
+
+    progress, if given, is called as progress(batches_done, batches_total,
+    questions_so_far) each time a batch finishes.
+
+    The run is traced as an mcq.generate span with a child span per round's
+    batch planning and per batch; dedupe time is recorded on mcq.generate.
+    """
+    fetch = _stream_groq_api if stream else _call_groq_api
+    results = queue.Queue()
+    generation = _Generation(plan_batches, num_questions, label, progress, stream)
+
+    def run_batch(batch, batch_count, round_num, messages):
+        count = 0
+        format_seconds = 0.0
+        with generation.batch_span(batch, batch_count, round_num) as batch_span:
+            try:
+                for item in fetch(api_key, messages):
+                    count += 1
+                    started = time.perf_counter()
+                    mcqs = _format_mcqs([item], difficulty)
+                    format_seconds += time.perf_counter() - started
+                    for mcq in mcqs:
+                        results.put(('item', batch, mcq))
+            except Exception as e:
+                batch_span.record_exception(e)
+                results.put(('error', batch, e))
+                return
+            finally:
+                batch_span.add_attributes(items=count, format_ms=round(format_seconds * 1000, 3))
+        results.put(('done', batch, count))
+
+    executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_BATCHES)
+    try:
+        for batches in generation.rounds():
+            for batch in batches:
+                executor.submit(in_context(run_batch), *batch)
+
+            pending = len(batches)
+            while pending and not generation.complete:
+                kind, batch, value = results.get()
+                if kind != 'item':
+                    pending -= 1
+                mcq = generation.merge(kind, batch, value)
+                if mcq is not None:
+                    yield mcq
+            generation.settle(pending)
+    finally:
+        # Batches still in flight once enough questions arrived are not waited for
+        executor.shutdown(wait=False, cancel_futures=True)
+        generation.finish()
+    generation.check()
+
+
+async def _astream_batches(api_key, plan_batches, num_questions, difficulty, label="Batch", stream=False):
+    """
+    Async generator version of _stream_batches for the ASGI app.
+
+    Batches run as tasks on the event loop, at most MAX_CONCURRENT_BATCHES
+    at a time, so a generation waiting on Groq holds no threads. Tasks still
+    running once enough questions arrived are cancelled.
+    """
+    fetch = _astream_groq_api if stream else _acall_groq_api
+    results = asyncio.Queue()
+    generation = _Generation(plan_batches, num_questions, label, None, stream)
+    slots = asyncio.Semaphore(MAX_CONCURRENT_BATCHES)
+    tasks = []
+
+    async def run_batch(batch, batch_count, round_num, messages):
+        async with slots:
+            count = 0
+            format_seconds = 0.0
+            with generation.batch_span(batch, batch_count, round_num) as batch_span:
+                try:
+                    async for item in fetch(api_key, messages):
+                        count += 1
+                        started = time.perf_counter()
+                        mcqs = _format_mcqs([item], difficulty)
+                        format_seconds += time.perf_counter() - started
+                        for mcq in mcqs:
+                            results.put_nowait(('item', batch, mcq))
+                except Exception as e:
+                    batch_span.record_exception(e)
+                    results.put_nowait(('error', batch, e))
+                    return
+                finally:
+                    batch_span.add_attributes(items=count, format_ms=round(format_seconds * 1000, 3))
+        results.put_nowait(('done', batch, count))
+
+    try:
+        for batches in generation.rounds():
+            tasks.extend(asyncio.create_task(run_batch(*batch)) for batch in batches)
+
+            pending = len(batches)
+            while pending and not generation.complete:
+                kind, batch, value = await results.get()
+                if kind != 'item':
+                    pending -= 1
+                mcq = generation.merge(kind, batch, value)
+                if mcq is not None:
+                    yield mcq
+            generation.settle(pending)
+    finally:
+        for task in tasks:
+            task.cancel()
+        generation.finish()
+    generation.check()
+
+
+def _run_batches(api_key, plan_batches, num_questions, difficulty, label="Batch", progress=None):
+    """Run batches concurrently and return the merged, de-duplicated MCQs."""
+    return list(_stream_batches(api_key, plan_batches, num_questions, difficulty, label=label, progress=progress))
+
+
+def _cache_complete(cache_key, mcqs, num_questions):
+    """Cache a generated set only if it is complete; a run that ended short must not be served again as the answer."""
+    if len(mcqs) >= int(num_questions):
+        llm_cache.set(cache_key, mcqs)
+
+
+def _cached_stream(cache_key, mcqs, num_questions):
+    """Pass MCQs through and cache the full list once the stream is exhausted."""
+    collected = []
+    for mcq in mcqs:
+        collected.append(mcq)
+        yield mcq
+    _cache_complete(cache_key, collected, num_questions)
+
+
+async def _acached_stream(cache_key, mcqs, num_questions):
+    """_cached_stream for async iterators."""
+    collected = []
+    async for mcq in mcqs:
+        collected.append(mcq)
+        yield mcq
+    await asyncio.to_thread(_cache_complete, cache_key, collected, num_questions)
+
+
+def _get_api_key():
+    api_key = os.getenv('GROQ_API_KEY')
+    if not api_key:
+        raise ValueError("GROQ_API_KEY not found in environment variables.")
+    return api_key
+
+
+def normalize_topic(topic):
+    """Canonical form of a topic name, shared by cache keys and the question pool."""
+    return " ".join(topic.lower().split())[:200]
+
+
+def _mcq_cache_key(kind, source, difficulty, num_questions):
+    """Cache key of a generated set; kind is 'text', 'topic' or 'pdf' (source is then the upload's SHA-256)."""
+    if kind == 'topic':
+        source = normalize_topic(source)
+    elif kind == 'pdf':
+        source = {'sha256': source}
+    return make_key(f'mcq_{kind}', source, difficulty, int(num_questions), GROQ_MODEL, MCQ_TEMPERATURE)
+
+
+def _describe(kind, source):
+    return f"for topic: {source}" if kind == 'topic' else "from PDF" if kind == 'pdf' else "from text"
+
+
+def _cache_lookup(cache_key, kind, source):
+    """The cached set for cache_key, or None."""
+    cached = llm_cache.get(cache_key)
+    if cached:
+        logger.info("Cache hit: %d MCQs %s", len(cached), _describe(kind, source))
+    return cached
+
+
+def _plan(kind, source, difficulty):
+    """(plan_batches, label) for generating MCQs from text or a topic."""
+    if kind == 'topic':
+        return _topic_batches(source, difficulty), "Topic Batch"
+    return _text_batches(source, difficulty), "Batch"
+
+
+# Text and topic generation share one implementation per calling style; the
+# public functions below only pick the kind. With use_cache=False nothing is
+# looked up or stored, so every call asks Groq for fresh questions.
+
+def _generate(kind, source, num_questions, difficulty, progress=None, use_cache=True):
+    api_key = _get_api_key()
+    num_questions = int(num_questions)
+
+    cache_key = _mcq_cache_key(kind, source, difficulty, num_questions)
+    cached = _cache_lookup(cache_key, kind, source) if use_cache else None
+    if cached:
+        return cached
+
+    logger.info("Generating %d MCQs %s (batches of %d)", num_questions, _describe(kind, source), BATCH_SIZE)
+    plan_batches, label = _plan(kind, source, difficulty)
+    all_mcqs = _run_batches(api_key, plan_batches, num_questions, difficulty, label=label, progress=progress)
+
+    logger.info("Total MCQs generated %s: %d", _describe(kind, source), len(all_mcqs))
+    if use_cache:
+        _cache_complete(cache_key, all_mcqs, num_questions)
+    return all_mcqs
+
+
+def _stream(kind, source, num_questions, difficulty, use_cache=True):
+    api_key = _get_api_key()
+    num_questions = int(num_questions)
+
+    cache_key = _mcq_cache_key(kind, source, difficulty, num_questions)
+    cached = _cache_lookup(cache_key, kind, source) if use_cache else None
+    if cached:
+        yield from cached
+        return
+
+    logger.info("Streaming %d MCQs %s (batches of %d)", num_questions, _describe(kind, source), BATCH_SIZE)
+    plan_batches, label = _plan(kind, source, difficulty)
+    mcqs = _stream_batches(api_key, plan_batches, num_questions, difficulty, label=label, stream=True)
+    yield from _cached_stream(cache_key, mcqs, num_questions) if use_cache else mcqs
+
+
+def generate_mcqs_with_groq(text, num_questions=5, difficulty='medium', progress=None):
+    """
+    Generate MCQs using Groq API with batching for large requests.
+    """
+    return _generate('text', text, num_questions, difficulty, progress=progress)
+
+def generate_mcqs(text, num_questions=5, difficulty='medium', progress=None):
+    """
+    Main function to generate MCQs from text using Groq API
+    """
+    return generate_mcqs_with_groq(text, num_questions, difficulty, progress=progress)
+
+def _extract_pdf_for_mcqs(pdf_file, num_questions, difficulty):
+    """Spool and extract a PDF upload. Returns (cache_key, cached_mcqs, text)."""
+    with SpooledPDF(pdf_file) as pdf:
+        cache_key = _mcq_cache_key('pdf', pdf.sha256, difficulty, num_questions)
+        cached = _cache_lookup(cache_key, 'pdf', None)
+        if cached:
+            return cache_key, cached, None
         try:
-            mcqs_raw = _call_groq_api(api_key, messages)
-            if mcqs_raw:
-                formatted = _format_mcqs(mcqs_raw, difficulty)
-                for mcq in formatted:
-                    if mcq['question'] not in [m['question'] for m in all_mcqs]:
-                        all_mcqs.append(mcq)
-                print(f"[v0] Topic Batch {batch_num}: got {len(formatted)} MCQs, total so far: {len(all_mcqs)}")
-            else:
-                print(f"[v0] Topic Batch {batch_num}: no MCQs parsed")
-        except Exception as e:
-            print(f"[v0] Topic Batch {batch_num} error: {e}")
-
-        remaining = num_questions - len(all_mcqs)
-        if remaining > 0:
-            time.sleep(0.3)
-
-    print(f"[v0] Total topic MCQs generated: {len(all_mcqs)}")
-    return all_mcqs[:num_questions]
+            with span('pdf.extract') as extract_span:
+                text = pdf.text()
+                extract_span.set_attribute('chars', len(text))
+        except Exception:
+            logger.exception("Error extracting PDF")
+            text = ""
+    if not text:
+        raise ValueError("Could not extract text from PDF")
+    return cache_key, None, text
+
+def generate_mcqs_from_pdf(pdf_file, num_questions=5, difficulty='medium', progress=None):
+    """Generate MCQs from PDF file using Groq API"""
+    cache_key, cached, text = _extract_pdf_for_mcqs(pdf_file, num_questions, difficulty)
+    if cached:
+        return cached
+
+    # Cached under the PDF's key only; the extracted text is not a key anyone else looks up
+    mcqs = _generate('text', text, num_questions, difficulty, progress=progress, use_cache=False)
+    _cache_complete(cache_key, mcqs, num_questions)
+    return mcqs
+
+def generate_mcqs_from_topic(topic, num_questions=5, difficulty='medium', progress=None, use_cache=True):
+    """
+    Generate MCQs based on a topic name using Groq API with batching.
+    """
+    return _generate('topic', topic, num_questions, difficulty, progress=progress, use_cache=use_cache)
+
+def stream_mcqs(text, num_questions=5, difficulty='medium'):
+    """
+    Yield MCQs generated from text one at a time, as soon as each is parsed.
+    """
+    return _stream('text', text, num_questions, difficulty)
+
+def stream_mcqs_from_pdf(pdf_file, num_questions=5, difficulty='medium'):
+    """Yield MCQs generated from a PDF file one at a time."""
+    cache_key, cached, text = _extract_pdf_for_mcqs(pdf_file, num_questions, difficulty)
+    if cached:
+        yield from cached
+        return
+
+    yield from _cached_stream(cache_key, _stream('text', text, num_questions, difficulty, use_cache=False), num_questions)
+
+def stream_mcqs_from_topic(topic, num_questions=5, difficulty='medium', use_cache=True):
+    """Yield MCQs about a topic one at a time, as soon as each is parsed."""
+    return _stream('topic', topic, num_questions, difficulty, use_cache=use_cache)
+
+# Async versions for the ASGI app (asgi.py). Groq calls run on the event
+# loop; cache lookups and PDF extraction run in worker threads.
+
+async def _agenerate(kind, source, num_questions, difficulty, use_cache=True):
+    """_generate on the async client."""
+    return [mcq async for mcq in _astream(kind, source, num_questions, difficulty, use_cache=use_cache, stream=False)]
+
+
+async def _astream(kind, source, num_questions, difficulty, use_cache=True, stream=True):
+    """_stream on the async client; stream=False asks Groq for whole responses instead of token streams."""
+    api_key = _get_api_key()
+    num_questions = int(num_questions)
+
+    cache_key = _mcq_cache_key(kind, source, difficulty, num_questions)
+    cached = await asyncio.to_thread(_cache_lookup, cache_key, kind, source) if use_cache else None
+    if cached:
+        for mcq in cached:
+            yield mcq
+        return
+
+    logger.info("%s %d MCQs %s (batches of %d)", "Streaming" if stream else "Generating", num_questions,
+                _describe(kind, source), BATCH_SIZE)
+    plan_batches, label = _plan(kind, source, difficulty)
+    mcqs = _astream_batches(api_key, plan_batches, num_questions, difficulty, label=label, stream=stream)
+    async for mcq in _acached_stream(cache_key, mcqs, num_questions) if use_cache else mcqs:
+        yield mcq
+
+async def generate_mcqs_async(text, num_questions=5, difficulty='medium'):
+    """generate_mcqs() for asyncio callers."""
+    return await _agenerate('text', text, num_questions, difficulty)
+
+async def generate_mcqs_from_pdf_async(pdf_file, num_questions=5, difficulty='medium'):
+    """generate_mcqs_from_pdf() for asyncio callers."""
+    cache_key, cached, text = await asyncio.to_thread(_extract_pdf_for_mcqs, pdf_file, num_questions, difficulty)
+    if cached:
+        return cached
+
+    mcqs = await _agenerate('text', text, num_questions, difficulty, use_cache=False)
+    await asyncio.to_thread(_cache_complete, cache_key, mcqs, num_questions)
+    return mcqs
+
+async def generate_mcqs_from_topic_async(topic, num_questions=5, difficulty='medium', use_cache=True):
+    """generate_mcqs_from_topic() for asyncio callers."""
+    return await _agenerate('topic', topic, num_questions, difficulty, use_cache=use_cache)
+
+def stream_mcqs_async(text, num_questions=5, difficulty='medium'):
+    """stream_mcqs() as an async generator."""
+    return _astream('text', text, num_questions, difficulty)
+
+async def stream_mcqs_from_pdf_async(pdf_file, num_questions=5, difficulty='medium'):
+    """stream_mcqs_from_pdf() as an async generator."""
+    cache_key, cached, text = await asyncio.to_thread(_extract_pdf_for_mcqs, pdf_file, num_questions, difficulty)
+    if cached:
+        for mcq in cached:
+            yield mcq
+        return
+
+    async for mcq in _acached_stream(cache_key, _astream('text', text, num_questions, difficulty, use_cache=False),
+                                     num_questions):
+        yield mcq
+
+def stream_mcqs_from_topic_async(topic, num_questions=5, difficulty='medium', use_cache=True):
+    """stream_mcqs_from_topic() as an async generator."""
+    return _astream('topic', topic, num_questions, difficulty, use_cache=use_cache)
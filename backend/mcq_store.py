@@ -0,0 +1,155 @@
+import json
+import hashlib
+import logging
+from sqlalchemy import insert, select
+from database import db
+from models import MCQSet, MCQ, Question, Test, TestAnswer
+from metrics import DB_WRITE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+HASH_LOOKUP_BATCH = 500  # Hashes per IN (...) lookup, well under SQLite's bound-parameter limit
+
+
+def question_hash(row):
+    """Content hash identifying a question: its text, options and correct answer, whitespace-trimmed."""
+    fields = [row['question'], row['option_a'], row['option_b'], row['option_c'], row['option_d'], row['correct_answer']]
+    payload = json.dumps([(field or '').strip() for field in fields], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def insert_ignoring_duplicates(model, rows, unique_columns):
+    """Bulk insert rows, skipping any that collide on unique_columns (where the database supports it)."""
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    elif dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        db.session.execute(insert(model), rows)
+        return
+    db.session.execute(dialect_insert(model).on_conflict_do_nothing(index_elements=unique_columns), rows)
+
+
+def store_questions(rows):
+    """
+    Add question rows (question, option_a-d, correct_answer) to the question
+    bank and return their ids in the same order. Questions already in the
+    bank are reused; only new ones are inserted.
+    """
+    hashes = [question_hash(row) for row in rows]
+    ids = {}
+    
+    def lookup(wanted):
+        for start in range(0, len(wanted), HASH_LOOKUP_BATCH):
+            batch = wanted[start:start + HASH_LOOKUP_BATCH]
+            ids.update(db.session.execute(
+                select(Question.content_hash, Question.id).where(Question.content_hash.in_(batch))
+            ).all())
+    
+    lookup(list(set(hashes)))
+    new_rows = {}
+    for content_hash, row in zip(hashes, rows):
+        if content_hash not in ids and content_hash not in new_rows:
+            new_rows[content_hash] = dict(
+                content_hash=content_hash,
+                question=row['question'],
+                option_a=row['option_a'],
+                option_b=row['option_b'],
+                option_c=row['option_c'],
+                option_d=row['option_d'],
+                correct_answer=row['correct_answer']
+            )
+    
+    if new_rows:
+        # Concurrent writers may insert the same question first; conflicts are skipped and looked up
+        insert_ignoring_duplicates(Question, list(new_rows.values()), ['content_hash'])
+        lookup(list(new_rows))
+    
+    return [ids[content_hash] for content_hash in hashes]
+
+
+@DB_WRITE_SECONDS.time(operation='save_mcq_set')
+def save_mcq_set(user_id, source_type, difficulty, mcqs):
+    """Save generated MCQs as a new set for the user and commit."""
+    mcq_set = MCQSet(
+        user_id=user_id,
+        title=f"MCQ Set - {source_type.upper()}",
+        source_type=source_type,
+        difficulty=difficulty
+    )
+    db.session.add(mcq_set)
+    db.session.flush()
+    
+    logger.debug("Created MCQ set %s", mcq_set.id)
+    
+    # Add all MCQs in one executemany, pointing at the shared question rows
+    question_ids = store_questions(mcqs)
+    db.session.execute(insert(MCQ), [
+        {
+            'mcq_set_id': mcq_set.id,
+            'question_id': question_id,
+            'difficulty': mcq_data.get('difficulty', difficulty)
+        }
+        for mcq_data, question_id in zip(mcqs, question_ids)
+    ])
+    
+    db.session.commit()
+    return mcq_set
+
+
+def _normalize_answer(answer):
+    return answer.strip().upper() if answer else None
+
+
+@DB_WRITE_SECONDS.time(operation='save_test_submission')
+def save_test_submission(user_id, title, difficulty, time_duration, questions, answers):
+    """Score a submitted test, save it with all its answers and commit."""
+    question_rows = []
+    rows = []
+    score = 0
+    
+    for idx, question in enumerate(questions):
+        # Get user answer (convert index to string for dict lookup)
+        user_answer = answers.get(str(idx))
+        correct_answer = question['correct_answer']
+        is_correct = _normalize_answer(user_answer) == _normalize_answer(correct_answer)
+        if is_correct:
+            score += 1
+        
+        options = question.get('options', {})
+        question_rows.append({
+            'question': question['question'],
+            'option_a': options.get('A') or options.get('a') or question.get('option_a') or '',
+            'option_b': options.get('B') or options.get('b') or question.get('option_b') or '',
+            'option_c': options.get('C') or options.get('c') or question.get('option_c') or '',
+            'option_d': options.get('D') or options.get('d') or question.get('option_d') or '',
+            'correct_answer': correct_answer
+        })
+        rows.append({
+            'user_answer': user_answer,
+            'is_correct': is_correct
+        })
+    
+    total_marks = len(questions)
+    test = Test(
+        user_id=user_id,
+        title=title,
+        difficulty=difficulty,
+        total_questions=total_marks,
+        time_duration=time_duration,
+        score=score,
+        total_marks=total_marks
+    )
+    db.session.add(test)
+    db.session.flush()
+    
+    for row, question_id in zip(rows, store_questions(question_rows)):
+        row['test_id'] = test.id
+        row['question_id'] = question_id
+    if rows:
+        db.session.execute(insert(TestAnswer), rows)
+    
+    test.percentage = round((score / total_marks * 100), 2) if total_marks > 0 else 0
+    db.session.commit()
+    return test
@@ -0,0 +1,194 @@
+"""
+In-process metrics in the Prometheus text exposition format.
+
+Counters and histograms are kept in memory per process and rendered by
+registry.render() for the /metrics endpoint. Label values should be
+low-cardinality (route templates, model names, status codes), never ids or
+user input. Separate worker processes (python jobs.py) keep their own
+metrics that are not included in the web process's /metrics output.
+"""
+import os
+import time
+import threading
+from contextlib import contextmanager
+from dotenv import load_dotenv
+
+basedir = os.path.abspath(os.path.dirname(__file__))
+dotenv_path = os.path.join(basedir, '.env')
+load_dotenv(dotenv_path)
+
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', '1') not in ('0', 'false', 'False')
+
+# Seconds; spans fast DB writes up to multi-batch LLM generations
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        with self._lock:
+            items = sorted(self._values.items())
+            lines.extend(self._render_samples(items))
+        return lines
+
+
+class Counter(Metric):
+    """Monotonically increasing count, e.g. requests or tokens."""
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _render_samples(self, items):
+        for key, value in items:
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Histogram(Metric):
+    """Distribution of observed values (usually seconds) over fixed cumulative buckets."""
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket (non-cumulative) counts, then sum and count
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the wall time of a with block (or, used as a decorator, of each call)."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _render_samples(self, items):
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, [('le', _format_value(float(bound)))])
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, key, [('le', '+Inf')])
+            yield f"{self.name}_bucket{labels} {count}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, key)} {count}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+# HTTP
+HTTP_REQUEST_SECONDS = registry.histogram(
+    'http_request_duration_seconds', 'Time to handle an HTTP request until the response starts, by route template.',
+    ['method', 'route', 'status']
+)
+
+# Groq
+LLM_REQUEST_SECONDS = registry.histogram(
+    'llm_request_duration_seconds', 'Time of one Groq HTTP attempt until the full response was read.',
+    ['model', 'mode']
+)
+LLM_REQUESTS = registry.counter(
+    'llm_requests_total', 'Groq HTTP attempts by response status (error = no response).', ['model', 'status']
+)
+LLM_RETRIES = registry.counter('llm_retries_total', 'Groq attempts that were retries of a failed attempt.', ['model'])
+LLM_RATE_LIMITED = registry.counter('llm_rate_limited_total', 'Groq responses with status 429.', ['model'])
+LLM_TOKENS = registry.counter('llm_tokens_total', 'Tokens reported in Groq usage, by kind.', ['model', 'kind'])
+MCQ_BATCHES = registry.counter(
+    'mcq_batches_total', 'MCQ generation batches by outcome (ok, empty or error).', ['model', 'outcome']
+)
+
+# Caches
+CACHE_REQUESTS = registry.counter(
+    'cache_requests_total', 'Result cache lookups by key namespace and result (hit or miss).', ['namespace', 'result']
+)
+
+# PDF extraction
+PDF_EXTRACT_SECONDS = registry.histogram(
+    'pdf_extract_duration_seconds', 'Time to extract text from an uploaded PDF (cache misses only).'
+)
+PDF_PAGES = registry.histogram(
+    'pdf_pages', 'Page count of PDFs that were extracted.', buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+)
+
+# Database
+DB_WRITE_SECONDS = registry.histogram(
+    'db_write_duration_seconds', 'Time to save and commit generated MCQ sets and test submissions.', ['operation']
+)
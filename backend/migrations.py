@@ -0,0 +1,106 @@
+"""
+In-place schema upgrades for databases created by older versions.
+
+db.create_all only adds missing tables (and init_db missing indexes), so
+changes to existing tables are made here before it runs. Every step checks
+the current schema first and does nothing when it is already up to date.
+"""
+import logging
+from sqlalchemy import inspect, select, text, Integer
+from database import db
+from models import Question, MCQ, TestAnswer
+from mcq_store import question_hash, HASH_LOOKUP_BATCH
+
+logger = logging.getLogger(__name__)
+
+MIGRATION_BATCH_SIZE = 1000
+
+
+def reset_sequence(conn, table):
+    """Move a Postgres id sequence past ids that were inserted explicitly."""
+    if conn.dialect.name == 'postgresql' and 'id' in table.c and isinstance(table.c.id.type, Integer):
+        conn.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), "
+            f"COALESCE((SELECT MAX(id) FROM {table.name}), 0) + 1, false)"
+        ))
+
+
+def _store_legacy_questions(conn, rows, known):
+    """Add the questions of legacy rows to the bank, returning their question ids."""
+    hashes = [question_hash(row) for row in rows]
+    new_rows = {}
+    for content_hash, row in zip(hashes, rows):
+        if content_hash not in known and content_hash not in new_rows:
+            new_rows[content_hash] = dict(
+                content_hash=content_hash,
+                question=row['question'],
+                option_a=row['option_a'],
+                option_b=row['option_b'],
+                option_c=row['option_c'],
+                option_d=row['option_d'],
+                correct_answer=row['correct_answer']
+            )
+    if new_rows:
+        conn.execute(Question.__table__.insert(), list(new_rows.values()))
+        wanted = list(new_rows)
+        for start in range(0, len(wanted), HASH_LOOKUP_BATCH):
+            known.update(conn.execute(
+                select(Question.content_hash, Question.id)
+                .where(Question.content_hash.in_(wanted[start:start + HASH_LOOKUP_BATCH]))
+            ).all())
+    return [known[content_hash] for content_hash in hashes]
+
+
+def _move_to_question_bank(conn, table, kept_columns):
+    """Rebuild a table that stored full question text so it references the question bank."""
+    legacy_name = f"{table.name}_legacy"
+    inspector = inspect(conn)
+    tables = inspector.get_table_names()
+    if table.name in tables and 'question' in {c['name'] for c in inspector.get_columns(table.name)}:
+        logger.info("Moving %s questions into the question bank", table.name)
+        # Index names are schema-wide, so free them up for the new table
+        for index in inspector.get_indexes(table.name):
+            conn.execute(text(f"DROP INDEX {index['name']}"))
+        conn.execute(text(f"ALTER TABLE {table.name} RENAME TO {legacy_name}"))
+    elif legacy_name in tables:
+        # An earlier upgrade stopped part way; redo the copy
+        table.drop(conn, checkfirst=True)
+    else:
+        return
+
+    db.metadata.create_all(conn, tables=[Question.__table__, table])
+    known = dict(conn.execute(select(Question.content_hash, Question.id)).all())
+    result = conn.execution_options(yield_per=MIGRATION_BATCH_SIZE).execute(
+        text(f"SELECT * FROM {legacy_name} ORDER BY id")
+    )
+    copied = 0
+    for batch in result.partitions():
+        rows = [dict(row._mapping) for row in batch]
+        question_ids = _store_legacy_questions(conn, rows, known)
+        conn.execute(table.insert(), [
+            dict({column: row[column] for column in kept_columns}, question_id=question_id)
+            for row, question_id in zip(rows, question_ids)
+        ])
+        copied += len(rows)
+    reset_sequence(conn, table)
+    conn.execute(text(f"DROP TABLE {legacy_name}"))
+    logger.info("Moved %d %s rows (%d distinct questions in the bank)", copied, table.name, len(known))
+
+
+def _add_job_heartbeat(conn):
+    conn.execute(text("ALTER TABLE generation_jobs ADD COLUMN heartbeat_at TIMESTAMP"))
+    logger.info("Added generation_jobs.heartbeat_at")
+
+
+def upgrade_schema(engine):
+    """Apply pending schema upgrades to the database behind engine."""
+    inspector = inspect(engine)
+    tables = set(inspector.get_table_names())
+    job_columns = {c['name'] for c in inspector.get_columns('generation_jobs')} if 'generation_jobs' in tables else None
+    with engine.begin() as conn:
+        if job_columns is not None and 'heartbeat_at' not in job_columns:
+            _add_job_heartbeat(conn)
+        if {'mcqs', 'mcqs_legacy'} & tables:
+            _move_to_question_bank(conn, MCQ.__table__, ['id', 'mcq_set_id', 'difficulty'])
+        if {'test_answers', 'test_answers_legacy'} & tables:
+            _move_to_question_bank(conn, TestAnswer.__table__, ['id', 'test_id', 'user_answer', 'is_correct'])
@@ -1,5 +1,7 @@
 from database import db
 from datetime import datetime
+from sqlalchemy import select, func
+from sqlalchemy.orm import column_property
 from werkzeug.security import generate_password_hash, check_password_hash
 
 class User(db.Model):
@@ -39,6 +41,11 @@ class MCQSet(db.Model):
     difficulty = db.Column(db.String(20))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    # Serves history pages: newest first per user, id breaking ties
+    __table_args__ = (
+        db.Index('ix_mcq_sets_user_created', user_id, created_at.desc(), id.desc()),
+    )
+    
     # Relationships
     mcqs = db.relationship('MCQ', backref='mcq_set', lazy=True, cascade='all, delete-orphan')
     
@@ -49,36 +56,56 @@ class MCQSet(db.Model):
             'source_type': self.source_type,
             'difficulty': self.difficulty,
             'created_at': self.created_at.isoformat(),
-            'mcq_count': len(self.mcqs)
+            'mcq_count': self.mcq_count
         }
 
-class MCQ(db.Model):
-    __tablename__ = 'mcqs'
+# Question bank: each distinct question is stored once and referenced by MCQs and test answers
+class Question(db.Model):
+    __tablename__ = 'questions'
     
     id = db.Column(db.Integer, primary_key=True)
-    mcq_set_id = db.Column(db.Integer, db.ForeignKey('mcq_sets.id'), nullable=False)
+    content_hash = db.Column(db.String(64), unique=True, nullable=False)  # SHA-256 of question, options and answer
     question = db.Column(db.Text, nullable=False)
     option_a = db.Column(db.Text, nullable=False)
     option_b = db.Column(db.Text, nullable=False)
     option_c = db.Column(db.Text, nullable=False)
     option_d = db.Column(db.Text, nullable=False)
     correct_answer = db.Column(db.String(1), nullable=False)  # A, B, C, or D
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def options(self):
+        return {
+            'A': self.option_a,
+            'B': self.option_b,
+            'C': self.option_c,
+            'D': self.option_d
+        }
+
+class MCQ(db.Model):
+    __tablename__ = 'mcqs'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    mcq_set_id = db.Column(db.Integer, db.ForeignKey('mcq_sets.id'), nullable=False, index=True)
+    question_id = db.Column(db.Integer, db.ForeignKey('questions.id'), nullable=False)
     difficulty = db.Column(db.String(20))
     
+    # Relationships
+    bank_question = db.relationship('Question', lazy='joined')
+    
     def to_dict(self):
         return {
             'id': self.id,
-            'question': self.question,
-            'options': {
-                'A': self.option_a,
-                'B': self.option_b,
-                'C': self.option_c,
-                'D': self.option_d
-            },
-            'correct_answer': self.correct_answer,
+            'question': self.bank_question.question,
+            'options': self.bank_question.options(),
+            'correct_answer': self.bank_question.correct_answer,
             'difficulty': self.difficulty
         }
 
+# Question count loaded with the set itself, so listing sets never loads their questions
+MCQSet.mcq_count = column_property(
+    select(func.count(MCQ.id)).where(MCQ.mcq_set_id == MCQSet.id).correlate_except(MCQ).scalar_subquery()
+)
+
 class Test(db.Model):
     __tablename__ = 'tests'
     
@@ -92,6 +119,10 @@ class Test(db.Model):
     total_marks = db.Column(db.Integer, nullable=False)
     submitted_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    __table_args__ = (
+        db.Index('ix_tests_user_submitted', user_id, submitted_at.desc(), id.desc()),
+    )
+    
     # Relationships
     answers = db.relationship('TestAnswer', backref='test', lazy=True, cascade='all, delete-orphan')
     
@@ -112,27 +143,69 @@ class TestAnswer(db.Model):
     __tablename__ = 'test_answers'
     
     id = db.Column(db.Integer, primary_key=True)
-    test_id = db.Column(db.Integer, db.ForeignKey('tests.id'), nullable=False)
-    question = db.Column(db.Text, nullable=False)
-    option_a = db.Column(db.Text, nullable=False)
-    option_b = db.Column(db.Text, nullable=False)
-    option_c = db.Column(db.Text, nullable=False)
-    option_d = db.Column(db.Text, nullable=False)
-    correct_answer = db.Column(db.String(1), nullable=False)
+    test_id = db.Column(db.Integer, db.ForeignKey('tests.id'), nullable=False, index=True)
+    question_id = db.Column(db.Integer, db.ForeignKey('questions.id'), nullable=False)
     user_answer = db.Column(db.String(1))
     is_correct = db.Column(db.Boolean, default=False)
     
+    # Relationships
+    bank_question = db.relationship('Question', lazy='joined')
+    
     def to_dict(self):
         return {
             'id': self.id,
-            'question': self.question,
-            'options': {
-                'A': self.option_a,
-                'B': self.option_b,
-                'C': self.option_c,
-                'D': self.option_d
-            },
-            'correct_answer': self.correct_answer,
+            'question': self.bank_question.question,
+            'options': self.bank_question.options(),
+            'correct_answer': self.bank_question.correct_answer,
             'user_answer': self.user_answer,
             'is_correct': self.is_correct
         }
+
+# Question pool: bank questions generated for a topic, filed under the normalized topic and difficulty
+class TopicQuestion(db.Model):
+    __tablename__ = 'topic_questions'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    topic = db.Column(db.String(200), nullable=False)  # Lowercased, whitespace-collapsed
+    difficulty = db.Column(db.String(20), nullable=False)
+    question_id = db.Column(db.Integer, db.ForeignKey('questions.id'), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.UniqueConstraint('topic', 'difficulty', 'question_id', name='uq_topic_questions'),
+    )
+
+class GenerationJob(db.Model):
+    __tablename__ = 'generation_jobs'
+    
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 hex
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    kind = db.Column(db.String(20), nullable=False)  # 'mcq' or 'test'
+    status = db.Column(db.String(20), nullable=False, default='queued', index=True)  # queued, running, completed, failed
+    params = db.Column(db.Text, nullable=False)  # JSON request parameters
+    source_blob = db.Column(db.LargeBinary)  # Uploaded PDF bytes, if any
+    batches_done = db.Column(db.Integer, default=0)
+    batches_total = db.Column(db.Integer, default=0)
+    questions_done = db.Column(db.Integer, default=0)
+    result = db.Column(db.Text)  # JSON response payload once completed
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    heartbeat_at = db.Column(db.DateTime)  # Last sign of life from the worker running the job
+    finished_at = db.Column(db.DateTime)
+    
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'progress': {
+                'batches_done': self.batches_done or 0,
+                'batches_total': self.batches_total or 0,
+                'questions_done': self.questions_done or 0
+            },
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
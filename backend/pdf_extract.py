@@ -0,0 +1,183 @@
+import os
+import mmap
+import multiprocessing
+import time
+import hashlib
+import tempfile
+import threading
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from PyPDF2 import PdfReader
+from dotenv import load_dotenv
+from llm_cache import ResultCache
+from metrics import PDF_EXTRACT_SECONDS, PDF_PAGES
+
+basedir = os.path.abspath(os.path.dirname(__file__))
+dotenv_path = os.path.join(basedir, '.env')
+load_dotenv(dotenv_path)
+
+logger = logging.getLogger(__name__)
+
+SPOOL_CHUNK_SIZE = 1024 * 1024  # Bytes copied per read when spooling uploads
+PARALLEL_PAGE_THRESHOLD = int(os.getenv('PDF_PARALLEL_PAGE_THRESHOLD', '100'))  # Use worker processes from this many pages (0 = never)
+EXTRACT_PROCESSES = int(os.getenv('PDF_EXTRACT_PROCESSES', str(os.cpu_count() or 1)))
+TEXT_CACHE_ENABLED = os.getenv('PDF_TEXT_CACHE_ENABLED', '1') not in ('0', 'false', 'False')
+PAGES_PER_TASK = int(os.getenv('PDF_PAGES_PER_TASK', '50'))  # Each task re-opens the PDF, so keep ranges coarse
+
+_process_pool = None
+_process_pool_lock = threading.Lock()
+
+# Extracted text by SHA-256 of the uploaded bytes, shared by MCQ, test and summary uploads
+text_cache = ResultCache(
+    path=os.getenv('PDF_TEXT_CACHE_PATH', os.path.join(basedir, 'instance', 'pdf_text_cache.db')),
+    ttl=int(os.getenv('PDF_TEXT_CACHE_TTL', str(30 * 24 * 3600))),
+    max_bytes=int(os.getenv('PDF_TEXT_CACHE_MAX_MB', '512')) * 1024 * 1024,
+    enabled=TEXT_CACHE_ENABLED
+)
+
+
+def _get_process_pool():
+    """Shared extraction process pool, started on first use so small uploads never pay for it."""
+    global _process_pool
+    if _process_pool is None:
+        with _process_pool_lock:
+            if _process_pool is None:
+                # Spawned, not forked: the server is multithreaded and a forked child can inherit held locks
+                _process_pool = ProcessPoolExecutor(max_workers=EXTRACT_PROCESSES,
+                                                    mp_context=multiprocessing.get_context('spawn'))
+                logger.info("Started PDF extraction pool with %d processes", EXTRACT_PROCESSES)
+    return _process_pool
+
+
+def _extract_page_range(path, start, end):
+    """Worker process: extract the text of pages [start, end) of the PDF at path."""
+    with open(path, 'rb') as handle:
+        with mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            reader = PdfReader(mapped)
+            return [reader.pages[i].extract_text() or "" for i in range(start, end)]
+
+
+class SpooledPDF:
+    """
+    An uploaded PDF spooled to a temporary file and memory-mapped for reading.
+
+    The upload is copied to disk in fixed-size chunks (hashing it on the way)
+    instead of being read into memory, and PyPDF2 reads it through an mmap so
+    the OS pages the file in and out as needed. Use as a context manager; the
+    temporary file is removed on exit.
+    """
+
+    def __init__(self, pdf_file):
+        digest = hashlib.sha256()
+        handle = tempfile.NamedTemporaryFile(prefix='upload-', suffix='.pdf', delete=False)
+        try:
+            while True:
+                chunk = pdf_file.read(SPOOL_CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                handle.write(chunk)
+        finally:
+            handle.close()
+        self.path = handle.name
+        self.size = os.path.getsize(self.path)
+        self.sha256 = digest.hexdigest()
+        self._file = None
+        self._map = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _reader(self):
+        if self._map is None:
+            self._file = open(self.path, 'rb')
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return PdfReader(self._map)
+
+    def iter_pages(self):
+        """
+        Yield the text of each page in order, one page at a time.
+
+        Documents with at least PARALLEL_PAGE_THRESHOLD pages are split into
+        page ranges that are extracted in worker processes; results are still
+        yielded in page order, and ranges not yet needed are cancelled if the
+        caller stops early.
+        """
+        if self.size == 0:
+            return
+        reader = self._reader()
+        page_count = len(reader.pages)
+        PDF_PAGES.observe(page_count)
+
+        if PARALLEL_PAGE_THRESHOLD and page_count >= PARALLEL_PAGE_THRESHOLD and EXTRACT_PROCESSES > 1:
+            logger.info("Extracting %d PDF pages in parallel", page_count)
+            pool = _get_process_pool()
+            futures = [
+                pool.submit(_extract_page_range, self.path, start, min(start + PAGES_PER_TASK, page_count))
+                for start in range(0, page_count, PAGES_PER_TASK)
+            ]
+            try:
+                for future in futures:
+                    yield from future.result()
+            finally:
+                for future in futures:
+                    future.cancel()
+            return
+
+        for page in reader.pages:
+            yield page.extract_text() or ""
+
+    def text(self):
+        """
+        Extract the text of every page of the document.
+
+        Results are kept in text_cache under the upload's SHA-256, so the
+        same PDF uploaded again is not re-extracted.
+        """
+        cache_key = f"pdf_text:{self.sha256}"
+        cached = text_cache.get(cache_key)
+        # Entries written before extraction always read every page may be partial
+        if cached and cached.get('complete', True):
+            logger.info("PDF text cache hit (%d chars)", len(cached['text']))
+            return cached['text']
+
+        started = time.perf_counter()
+        text = "\n".join(self.iter_pages()).strip()
+        PDF_EXTRACT_SECONDS.observe(time.perf_counter() - started)
+
+        if text:
+            text_cache.set(cache_key, {'text': text, 'complete': True})
+        return text
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        try:
+            os.remove(self.path)
+        except OSError:
+            # Already gone, or still open in an extraction worker (Windows)
+            pass
+
+
+def iter_pdf_pages(pdf_file):
+    """Yield the text of each page of an uploaded PDF lazily."""
+    with SpooledPDF(pdf_file) as pdf:
+        yield from pdf.iter_pages()
+
+
+def extract_text_from_pdf(pdf_file):
+    """Extract text from uploaded PDF file"""
+    try:
+        with SpooledPDF(pdf_file) as pdf:
+            return pdf.text()
+    except Exception:
+        logger.exception("Error extracting PDF")
+        return ""
+
@@ -0,0 +1,184 @@
+"""
+Question pool for topic-based generation.
+
+Every question generated for a topic is filed under the normalized topic and
+difficulty. Topic requests are served from that pool first, skipping
+questions the user already has in a saved set or a submitted test, and only
+the shortfall is generated by the LLM. That shortfall always bypasses the LLM
+result cache: every cached topic set was filed in the pool when it was made,
+so a cached answer could only repeat questions the pool just ruled out.
+"""
+import os
+import asyncio
+import logging
+from sqlalchemy import select, func
+from dotenv import load_dotenv
+
+basedir = os.path.abspath(os.path.dirname(__file__))
+dotenv_path = os.path.join(basedir, '.env')
+load_dotenv(dotenv_path)
+
+from database import db
+from models import MCQSet, MCQ, Question, Test, TestAnswer, TopicQuestion
+from mcq_store import store_questions, insert_ignoring_duplicates
+from mcq_ai import normalize_topic, generate_mcqs_from_topic, stream_mcqs_from_topic
+from mcq_ai import generate_mcqs_from_topic_async, stream_mcqs_from_topic_async
+from dedupe import NearDuplicateIndex
+
+logger = logging.getLogger(__name__)
+
+QUESTION_POOL_ENABLED = os.getenv('QUESTION_POOL_ENABLED', '1') not in ('0', 'false', 'False')
+
+
+def sample_pool(topic, difficulty, count, user_id=None):
+    """Pick up to count random pooled questions for the topic that the user has not been given yet."""
+    query = select(Question).join(TopicQuestion, TopicQuestion.question_id == Question.id).where(
+        TopicQuestion.topic == normalize_topic(topic),
+        TopicQuestion.difficulty == difficulty
+    )
+    if user_id is not None:
+        seen = select(MCQ.question_id).join(MCQSet, MCQSet.id == MCQ.mcq_set_id).where(MCQSet.user_id == user_id).union(
+            select(TestAnswer.question_id).join(Test, Test.id == TestAnswer.test_id).where(Test.user_id == user_id)
+        )
+        query = query.where(Question.id.not_in(seen))
+
+    questions = db.session.scalars(query.order_by(func.random()).limit(count)).all()
+    return [
+        {
+            'question': q.question,
+            'option_a': q.option_a,
+            'option_b': q.option_b,
+            'option_c': q.option_c,
+            'option_d': q.option_d,
+            'correct_answer': q.correct_answer,
+            'difficulty': difficulty
+        }
+        for q in questions
+    ]
+
+
+def add_to_pool(topic, difficulty, mcqs):
+    """File newly generated MCQs under the topic. Failures are logged, never raised."""
+    if not mcqs:
+        return
+    try:
+        topic = normalize_topic(topic)
+        insert_ignoring_duplicates(TopicQuestion, [
+            {'topic': topic, 'difficulty': difficulty, 'question_id': question_id}
+            for question_id in set(store_questions(mcqs))
+        ], ['topic', 'difficulty', 'question_id'])
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.warning("Could not add MCQs to the question pool: %s", e)
+
+
+def generate_topic_mcqs(topic, num_questions=5, difficulty='medium', user_id=None, progress=None):
+    """Generate MCQs about a topic, reusing pooled questions and generating only the shortfall."""
+    num_questions = int(num_questions)
+    if not QUESTION_POOL_ENABLED:
+        return generate_mcqs_from_topic(topic, num_questions, difficulty, progress=progress)
+
+    mcqs = sample_pool(topic, difficulty, num_questions, user_id)
+    shortfall = num_questions - len(mcqs)
+    logger.info("Question pool served %d/%d MCQs for topic: %s", len(mcqs), num_questions, topic)
+    if shortfall <= 0:
+        return mcqs
+
+    try:
+        generated = generate_mcqs_from_topic(topic, shortfall, difficulty, progress=progress, use_cache=False)
+    except Exception as e:
+        if not mcqs:
+            raise
+        logger.warning("Topic generation failed, returning %d pooled MCQs: %s", len(mcqs), e)
+        return mcqs
+
+    add_to_pool(topic, difficulty, generated)
+    return _top_up(mcqs, generated, num_questions)
+
+
+def _top_up(pooled, generated, num_questions):
+    """Add generated MCQs that do not repeat pooled ones until num_questions is reached."""
+    seen = NearDuplicateIndex()
+    for mcq in pooled:
+        seen.add(mcq['question'])
+    for mcq in generated:
+        if len(pooled) < num_questions and seen.add(mcq['question']):
+            pooled.append(mcq)
+    return pooled
+
+
+def stream_topic_mcqs(topic, num_questions=5, difficulty='medium', user_id=None):
+    """Yield pooled MCQs for a topic right away, then stream generated ones for the shortfall."""
+    num_questions = int(num_questions)
+    if not QUESTION_POOL_ENABLED:
+        yield from stream_mcqs_from_topic(topic, num_questions, difficulty)
+        return
+
+    pooled = sample_pool(topic, difficulty, num_questions, user_id)
+    logger.info("Question pool served %d/%d MCQs for topic: %s", len(pooled), num_questions, topic)
+    yield from pooled
+    shortfall = num_questions - len(pooled)
+    if shortfall <= 0:
+        return
+
+    seen = NearDuplicateIndex()
+    for mcq in pooled:
+        seen.add(mcq['question'])
+    generated = []
+    for mcq in stream_mcqs_from_topic(topic, shortfall, difficulty, use_cache=False):
+        generated.append(mcq)
+        if seen.add(mcq['question']):
+            yield mcq
+    add_to_pool(topic, difficulty, generated)
+
+
+async def generate_topic_mcqs_async(topic, num_questions=5, difficulty='medium', user_id=None):
+    """generate_topic_mcqs() for asyncio callers; pool queries run in worker threads under the caller's app context."""
+    num_questions = int(num_questions)
+    if not QUESTION_POOL_ENABLED:
+        return await generate_mcqs_from_topic_async(topic, num_questions, difficulty)
+
+    mcqs = await asyncio.to_thread(sample_pool, topic, difficulty, num_questions, user_id)
+    shortfall = num_questions - len(mcqs)
+    logger.info("Question pool served %d/%d MCQs for topic: %s", len(mcqs), num_questions, topic)
+    if shortfall <= 0:
+        return mcqs
+
+    try:
+        generated = await generate_mcqs_from_topic_async(topic, shortfall, difficulty, use_cache=False)
+    except Exception as e:
+        if not mcqs:
+            raise
+        logger.warning("Topic generation failed, returning %d pooled MCQs: %s", len(mcqs), e)
+        return mcqs
+
+    await asyncio.to_thread(add_to_pool, topic, difficulty, generated)
+    return _top_up(mcqs, generated, num_questions)
+
+
+async def stream_topic_mcqs_async(topic, num_questions=5, difficulty='medium', user_id=None):
+    """stream_topic_mcqs() as an async generator."""
+    num_questions = int(num_questions)
+    if not QUESTION_POOL_ENABLED:
+        async for mcq in stream_mcqs_from_topic_async(topic, num_questions, difficulty):
+            yield mcq
+        return
+
+    pooled = await asyncio.to_thread(sample_pool, topic, difficulty, num_questions, user_id)
+    logger.info("Question pool served %d/%d MCQs for topic: %s", len(pooled), num_questions, topic)
+    for mcq in pooled:
+        yield mcq
+    shortfall = num_questions - len(pooled)
+    if shortfall <= 0:
+        return
+
+    seen = NearDuplicateIndex()
+    for mcq in pooled:
+        seen.add(mcq['question'])
+    generated = []
+    async for mcq in stream_mcqs_from_topic_async(topic, shortfall, difficulty, use_cache=False):
+        generated.append(mcq)
+        if seen.add(mcq['question']):
+            yield mcq
+    await asyncio.to_thread(add_to_pool, topic, difficulty, generated)
@@ -0,0 +1,223 @@
+import re
+import time
+import asyncio
+import threading
+
+
+class LLMError(Exception):
+    """Raised when a Groq call fails for good (non-retryable error or retries exhausted)."""
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class RateLimitTimeout(LLMError):
+    """Raised when no rate limit capacity became available within max_wait."""
+
+
+class CircuitOpenError(LLMError):
+    """Raised when the circuit breaker is rejecting calls to a failing upstream."""
+
+
+def parse_reset(value):
+    """
+    Parse a Groq rate-limit reset header into seconds.
+
+    Groq sends durations like "7.66s", "2m59.56s" or "120ms"; retry-after is a
+    plain number of seconds.
+    """
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    total = 0.0
+    matched = False
+    for amount, unit in re.findall(r'([\d.]+)(ms|h|m|s)', value):
+        matched = True
+        amount = float(amount)
+        total += {'h': 3600, 'm': 60, 's': 1, 'ms': 0.001}[unit] * amount
+    return total if matched else None
+
+
+class TokenBucket:
+    """Thread-safe token bucket that refills continuously at rate units per second."""
+
+    def __init__(self, capacity, rate):
+        self.capacity = float(capacity)
+        self.rate = float(rate)
+        self.level = float(capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, cost, now):
+        """Seconds until cost units are available (0 if they are now)."""
+        self._refill(now)
+        # A single call larger than the whole bucket only waits for a full bucket
+        needed = min(cost, self.capacity)
+        if self.level >= needed:
+            return 0.0
+        return (needed - self.level) / self.rate if self.rate > 0 else float('inf')
+
+    def consume(self, cost):
+        self.level -= cost
+
+
+class AdaptiveRateLimiter:
+    """
+    Process-wide limiter for requests and tokens per minute.
+
+    Starts from the configured limits and adapts to the x-ratelimit-* headers
+    Groq returns: the token bucket is resized to the advertised limit, levels
+    are clamped to what the server says remains, and when a window is
+    exhausted (or a 429 carries retry-after) every caller pauses until the
+    reset time instead of each hammering the API on its own.
+    """
+
+    def __init__(self, requests_per_minute=30, tokens_per_minute=12000, max_wait=60):
+        self.requests = TokenBucket(requests_per_minute, requests_per_minute / 60.0)
+        self.tokens = TokenBucket(tokens_per_minute, tokens_per_minute / 60.0)
+        self.max_wait = max_wait
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _try_acquire(self, estimated_tokens, deadline):
+        """
+        Take capacity if it is available now and return 0, else return the
+        seconds to sleep before checking again.
+
+        Keeps waiting until the deadline even when the computed wait is longer:
+        refunds from record_usage() and fresh rate-limit headers often free
+        capacity sooner than the buckets predict.
+        """
+        with self._lock:
+            now = time.monotonic()
+            wait = max(
+                self.blocked_until - now,
+                self.requests.wait_time(1, now),
+                self.tokens.wait_time(estimated_tokens, now)
+            )
+            if wait <= 0:
+                self.requests.consume(1)
+                self.tokens.consume(estimated_tokens)
+                return 0
+        if now >= deadline:
+            raise RateLimitTimeout(f"Rate limit capacity not available within {self.max_wait}s")
+        return min(wait, 1.0, deadline - now)
+
+    def acquire(self, estimated_tokens=0):
+        """
+        Block until one request and estimated_tokens tokens may be sent.
+
+        estimated_tokens should cover the completion as well as the prompt
+        (see llm_client.estimate_tokens); record_usage() refunds what the
+        call did not use.
+        """
+        deadline = time.monotonic() + self.max_wait
+        while True:
+            wait = self._try_acquire(estimated_tokens, deadline)
+            if not wait:
+                return
+            time.sleep(wait)
+
+    async def acquire_async(self, estimated_tokens=0):
+        """acquire() for coroutines: waits with asyncio.sleep instead of blocking the event loop."""
+        deadline = time.monotonic() + self.max_wait
+        while True:
+            wait = self._try_acquire(estimated_tokens, deadline)
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+    def record_usage(self, estimated_tokens, actual_tokens):
+        """Settle a reservation against the reported usage, refunding unused tokens (or charging extra)."""
+        if actual_tokens is None:
+            return
+        with self._lock:
+            self.tokens.consume(actual_tokens - estimated_tokens)
+
+    def update_from_headers(self, headers):
+        """Adapt limits and levels to the rate-limit headers of a response."""
+        with self._lock:
+            now = time.monotonic()
+            limit_tokens = headers.get('x-ratelimit-limit-tokens')
+            if limit_tokens:
+                try:
+                    limit_tokens = float(limit_tokens)
+                    self.tokens.capacity = limit_tokens
+                    self.tokens.rate = limit_tokens / 60.0
+                except ValueError:
+                    pass
+
+            for bucket, remaining_header, reset_header in (
+                (self.requests, 'x-ratelimit-remaining-requests', 'x-ratelimit-reset-requests'),
+                (self.tokens, 'x-ratelimit-remaining-tokens', 'x-ratelimit-reset-tokens'),
+            ):
+                remaining = headers.get(remaining_header)
+                if remaining is None:
+                    continue
+                try:
+                    remaining = float(remaining)
+                except ValueError:
+                    continue
+                bucket._refill(now)
+                bucket.level = min(bucket.level, remaining)
+                if remaining <= 0:
+                    reset = parse_reset(headers.get(reset_header))
+                    if reset:
+                        self.blocked_until = max(self.blocked_until, now + reset)
+
+            retry_after = parse_reset(headers.get('retry-after'))
+            if retry_after:
+                self.blocked_until = max(self.blocked_until, now + retry_after)
+
+
+class CircuitBreaker:
+    """
+    Stops calling an upstream that keeps failing.
+
+    After failure_threshold consecutive failures the circuit opens and calls
+    fail fast for reset_timeout seconds. Then a single trial call is let
+    through; success closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Raise CircuitOpenError if calls are currently being rejected."""
+        with self._lock:
+            if self.opened_at is None:
+                return
+            if time.monotonic() - self.opened_at < self.reset_timeout or self.trial_in_flight:
+                raise CircuitOpenError("Groq API is failing repeatedly; not sending more requests for now")
+            self.trial_in_flight = True
+
+    def release(self):
+        """Forget a call that was abandoned before it got a response, so it does not hold the trial slot."""
+        with self._lock:
+            self.trial_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.trial_in_flight or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self.trial_in_flight = False
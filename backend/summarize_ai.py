@@ -1,47 +1,177 @@
 import os
-import requests
-from PyPDF2 import PdfReader
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+from llm_cache import llm_cache, make_key
+from llm_client import groq_client, async_groq_client
+from chunking import split_text, estimate_tokens
+from pdf_extract import SpooledPDF
+from tracing import span, in_context
 
 basedir = os.path.abspath(os.path.dirname(__file__))
 dotenv_path = os.path.join(basedir, '.env')
 load_dotenv(dotenv_path)
 
-def extract_text_from_pdf(pdf_file):
-    """Extract text from uploaded PDF file"""
-    try:
-        reader = PdfReader(pdf_file)
-        text = ""
-        for page in reader.pages:
-            text += page.extract_text() + "\n"
-        return text.strip()
-    except Exception as e:
-        print(f"Error extracting PDF: {e}")
-        return ""
+logger = logging.getLogger(__name__)
 
-def summarize_with_groq(text, summary_length='medium'):
+GROQ_MODEL = "llama-3.3-70b-versatile"
+SUMMARY_TEMPERATURE = 0.7
+SUMMARY_CHUNK_TOKENS = int(os.getenv('SUMMARY_CHUNK_TOKENS', '3000'))  # Text per map call; shorter texts use one call
+SUMMARY_SECTION_MAX_TOKENS = 600  # Length cap for each partial summary
+SUMMARY_REDUCE_TOKENS = int(os.getenv('SUMMARY_REDUCE_TOKENS', '6000'))  # Max partial summaries fed to one reduce call
+SUMMARY_MAX_CONCURRENT = int(os.getenv('SUMMARY_MAX_CONCURRENT', '4'))  # Map calls in flight per request
+
+SUMMARIZER_SYSTEM_PROMPT = "You are an expert summarizer who creates clear, concise summaries that capture the essential information while maintaining readability. Provide only the summary text without any additional commentary."
+
+def _summary_payload(prompt, max_tokens):
+    return {
+        "model": GROQ_MODEL,
+        "messages": [
+            {
+                "role": "system",
+                "content": SUMMARIZER_SYSTEM_PROMPT
+            },
+            {
+                "role": "user",
+                "content": prompt
+            }
+        ],
+        "temperature": SUMMARY_TEMPERATURE,
+        "max_tokens": max_tokens
+    }
+
+def _call_summary_api(api_key, prompt, max_tokens=2000):
+    """Send one summarization prompt to Groq and return the summary text."""
+    logger.debug("Sending summarization request to Groq")
+    with span('groq.chat_completion', model=GROQ_MODEL, max_tokens=max_tokens) as call_span:
+        data = groq_client.chat_completion(api_key, _summary_payload(prompt, max_tokens), timeout=60)
+        call_span.add_attributes(**{f"usage.{key}": value for key, value in data.get('usage', {}).items()
+                                    if isinstance(value, int)})
+    return data['choices'][0]['message']['content'].strip()
+
+async def _acall_summary_api(api_key, prompt, max_tokens=2000):
+    """_call_summary_api on the async client."""
+    logger.debug("Sending summarization request to Groq")
+    with span('groq.chat_completion', model=GROQ_MODEL, max_tokens=max_tokens) as call_span:
+        data = await async_groq_client.chat_completion(api_key, _summary_payload(prompt, max_tokens), timeout=60)
+        call_span.add_attributes(**{f"usage.{key}": value for key, value in data.get('usage', {}).items()
+                                    if isinstance(value, int)})
+    return data['choices'][0]['message']['content'].strip()
+
+def _section_prompt(text, section, sections):
+    return f"""The text below is part {section + 1} of {sections} of a longer document.
+Summarize it in one or two dense paragraphs, keeping every key fact, definition, name and figure so it can later be merged with the summaries of the other parts.
+
+Text to summarize:
+{text}"""
+
+def _summary_cache_key(kind, source, *length):
+    """Cache key of a summary; kind is 'chunk', 'text' or 'pdf' (source is then the upload's SHA-256)."""
+    if kind == 'pdf':
+        source = {'sha256': source}
+    return make_key(f'summary_{kind}', source, *length, GROQ_MODEL, SUMMARY_TEMPERATURE)
+
+def _store_summary(cache_key, summary):
+    if summary:
+        llm_cache.set(cache_key, summary)
+
+def _summarize_section(api_key, text, section, sections):
     """
-    Summarize text using Groq API
-    
-    Args:
-        text (str): Input text to summarize
-        summary_length (str): Summary length (short/medium/long)
-    
-    Returns:
-        str: Summarized text
+    Map step: summarize one chunk of a long document.
+
+    The result does not depend on the requested summary length, so it is
+    cached on its own and reused when the same document is summarized again
+    at a different length.
+    """
+    with span('summary.section', section=section, sections=sections, chars=len(text)) as section_span:
+        cache_key = _summary_cache_key('chunk', text)
+        cached = llm_cache.get(cache_key)
+        section_span.set_attribute('cached', bool(cached))
+        if cached:
+            return cached
+
+        summary = _call_summary_api(api_key, _section_prompt(text, section, sections), max_tokens=SUMMARY_SECTION_MAX_TOKENS)
+        _store_summary(cache_key, summary)
+        return summary
+
+async def _asummarize_section(api_key, text, section, sections):
+    """_summarize_section on the async client."""
+    with span('summary.section', section=section, sections=sections, chars=len(text)) as section_span:
+        cache_key = _summary_cache_key('chunk', text)
+        cached = await asyncio.to_thread(llm_cache.get, cache_key)
+        section_span.set_attribute('cached', bool(cached))
+        if cached:
+            return cached
+
+        summary = await _acall_summary_api(api_key, _section_prompt(text, section, sections),
+                                           max_tokens=SUMMARY_SECTION_MAX_TOKENS)
+        await asyncio.to_thread(_store_summary, cache_key, summary)
+        return summary
+
+def _map_sections(api_key, sections):
+    """Summarize sections concurrently, keeping document order."""
+    with ThreadPoolExecutor(max_workers=SUMMARY_MAX_CONCURRENT) as executor:
+        return list(executor.map(
+            in_context(lambda indexed: _summarize_section(api_key, indexed[1], indexed[0], len(sections))),
+            enumerate(sections)
+        ))
+
+async def _amap_sections(api_key, sections):
+    """_map_sections as event loop tasks, at most SUMMARY_MAX_CONCURRENT in flight."""
+    slots = asyncio.Semaphore(SUMMARY_MAX_CONCURRENT)
+
+    async def summarize(section, text):
+        async with slots:
+            return await _asummarize_section(api_key, text, section, len(sections))
+    return list(await asyncio.gather(*(summarize(section, text) for section, text in enumerate(sections))))
+
+def _needs_reduce(partials):
+    return estimate_tokens("\n\n".join(partials)) > SUMMARY_REDUCE_TOKENS and len(partials) > 1
+
+def _group_partials(partials):
+    """Group neighbouring partial summaries that fit within SUMMARY_REDUCE_TOKENS together."""
+    groups = []
+    for partial in partials:
+        if groups and estimate_tokens("\n\n".join(groups[-1] + [partial])) <= SUMMARY_REDUCE_TOKENS:
+            groups[-1].append(partial)
+        else:
+            groups.append([partial])
+    if len(groups) == len(partials):
+        # Nothing fits together any more; pair neighbours so every pass shrinks the list
+        groups = [partials[i:i + 2] for i in range(0, len(partials), 2)]
+    logger.debug("Reduce pass: %d partial summaries -> %d", len(partials), len(groups))
+    return ["\n\n".join(group) for group in groups]
+
+def _reduce_sections(api_key, partials):
+    """
+    Merge partial summaries until they fit into a single final prompt.
+
+    Each pass groups neighbouring partials that fit within
+    SUMMARY_REDUCE_TOKENS and condenses every group concurrently.
     """
+    while _needs_reduce(partials):
+        groups = _group_partials(partials)
+        with span('summary.reduce_pass', partials=len(partials), groups=len(groups)):
+            partials = _map_sections(api_key, groups)
+    return partials
+
+async def _areduce_sections(api_key, partials):
+    """_reduce_sections on the async client."""
+    while _needs_reduce(partials):
+        groups = _group_partials(partials)
+        with span('summary.reduce_pass', partials=len(partials), groups=len(groups)):
+            partials = await _amap_sections(api_key, groups)
+    return partials
+
+def _get_api_key():
     api_key = os.getenv('GROQ_API_KEY')
     
     if not api_key:
         raise ValueError("GROQ_API_KEY not found in environment variables. Make sure GROQ_API_KEY is set in backend/.env")
-    
-    url = "https://api.groq.com/openai/v1/chat/completions"
-    
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
+    return api_key
 
+def _length_instruction(summary_length):
     # Define summary length guidelines
     length_guidelines = {
         'short': '2-3 sentences',
@@ -49,54 +179,99 @@ def summarize_with_groq(text, summary_length='medium'):
         'long': '5-7 paragraphs'
     }
 
-    length_instruction = length_guidelines.get(summary_length, '3-5 paragraphs')
+    return length_guidelines.get(summary_length, '3-5 paragraphs')
 
-    prompt = f"""Provide a clear, concise summary that captures the main points and key information in {length_instruction}.
+def _single_prompt(text, length_instruction):
+    return f"""Provide a clear, concise summary that captures the main points and key information in {length_instruction}.
 
 Text to summarize:
-{text[:3000]}"""
+{text}"""
 
-    payload = {
-        "model": "llama-3.3-70b-versatile",
-        "messages": [
-            {
-                "role": "system",
-                "content": "You are an expert summarizer who creates clear, concise summaries that capture the essential information while maintaining readability. Provide only the summary text without any additional commentary."
-            },
-            {
-                "role": "user",
-                "content": prompt
-            }
-        ],
-        "temperature": 0.7,
-        "max_tokens": 2000
-    }
+def _combine_prompt(partials, length_instruction):
+    combined = "\n\n".join(partials)
+    return f"""The following are summaries of consecutive parts of one document, in order.
+Combine them into a single clear, concise summary of the whole document that captures the main points and key information in {length_instruction}.
+
+Partial summaries:
+{combined}"""
+
+def _prepare_summary(text, summary_length):
+    """
+    Returns (cache_key, cached_summary, length_instruction, sections) for
+    summarizing text; sections is None when the text fits in one prompt.
+    """
+    length_instruction = _length_instruction(summary_length)
+    cache_key = _summary_cache_key('text', text, length_instruction)
+    cached = llm_cache.get(cache_key)
+    if cached:
+        logger.info("Cache hit: summary")
+        return cache_key, cached, length_instruction, None
+    sections = split_text(text, max_tokens=SUMMARY_CHUNK_TOKENS, overlap_tokens=0)
+    return cache_key, None, length_instruction, sections if len(sections) > 1 else None
+
+def summarize_with_groq(text, summary_length='medium'):
+    """
+    Summarize text using Groq API
+    
+    Short texts are summarized in one call. Longer texts are split into
+    chunks that are summarized concurrently (map) and then combined into
+    the final summary (reduce), so the whole document is covered.
+    
+    Args:
+        text (str): Input text to summarize
+        summary_length (str): Summary length (short/medium/long)
+    
+    Returns:
+        str: Summarized text
+    """
+    api_key = _get_api_key()
+    cache_key, cached, length_instruction, sections = _prepare_summary(text, summary_length)
+    if cached:
+        return cached
+
+    try:
+        if sections is None:
+            prompt = _single_prompt(text, length_instruction)
+        else:
+            logger.info("Map-reduce summarization over %d sections", len(sections))
+            with span('summary.map', sections=len(sections)):
+                partials = _map_sections(api_key, sections)
+            partials = _reduce_sections(api_key, partials)
+            prompt = _combine_prompt(partials, length_instruction)
+
+        summary = _call_summary_api(api_key, prompt)
+        logger.info("Summary generated (%d chars)", len(summary))
+        _store_summary(cache_key, summary)
+        return summary
+
+    except Exception as e:
+        logger.exception("Error calling Groq API")
+        raise Exception(f"Failed to generate summary with Groq: {str(e)}")
+
+async def summarize_with_groq_async(text, summary_length='medium'):
+    """summarize_with_groq() for asyncio callers; map calls run as event loop tasks."""
+    api_key = _get_api_key()
+    cache_key, cached, length_instruction, sections = await asyncio.to_thread(_prepare_summary, text, summary_length)
+    if cached:
+        return cached
 
     try:
-        print("[v0] Sending request to Groq API for summarization...")
-        response = requests.post(url, headers=headers, json=payload, timeout=60)
-        
-        print(f"[v0] Response status code: {response.status_code}")
-        
-        if response.status_code != 200:
-            print(f"[v0] Error response: {response.text}")
-            raise Exception(f"Groq API returned status {response.status_code}: {response.text}")
-        
-        data = response.json()
-        
-        print("\n--- GROQ API RESPONSE ---")
-        print(f"Model: {data.get('model', 'llama-3.3-70b-versatile')}")
-        
-        # Extract summary from Groq response
-        summary = data['choices'][0]['message']['content'].strip()
-        print(f"Summary generated successfully")
-        
+        if sections is None:
+            prompt = _single_prompt(text, length_instruction)
+        else:
+            logger.info("Map-reduce summarization over %d sections", len(sections))
+            with span('summary.map', sections=len(sections)):
+                partials = await _amap_sections(api_key, sections)
+            partials = await _areduce_sections(api_key, partials)
+            prompt = _combine_prompt(partials, length_instruction)
+
+        summary = await _acall_summary_api(api_key, prompt)
+        logger.info("Summary generated (%d chars)", len(summary))
+        await asyncio.to_thread(_store_summary, cache_key, summary)
         return summary
 
     except Exception as e:
-        print(f"[v0] Error calling Groq API: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error calling Groq API")
         raise Exception(f"Failed to generate summary with Groq: {str(e)}")
 
 def generate_summary(text, summary_length='medium'):
@@ -105,9 +280,42 @@ def generate_summary(text, summary_length='medium'):
     """
     return summarize_with_groq(text, summary_length)
 
-def generate_summary_from_pdf(pdf_file, summary_length='medium'):
-    """Generate summary from PDF file using Groq API"""
-    text = extract_text_from_pdf(pdf_file)
+def _extract_pdf_for_summary(pdf_file, summary_length):
+    """Spool and extract a PDF upload. Returns (cache_key, cached_summary, text)."""
+    with SpooledPDF(pdf_file) as pdf:
+        cache_key = _summary_cache_key('pdf', pdf.sha256, summary_length)
+        cached = llm_cache.get(cache_key)
+        if cached:
+            logger.info("Cache hit: summary from PDF")
+            return cache_key, cached, None
+        try:
+            with span('pdf.extract') as extract_span:
+                text = pdf.text()
+                extract_span.set_attribute('chars', len(text))
+        except Exception:
+            logger.exception("Error extracting PDF")
+            text = ""
+
     if not text:
         raise ValueError("Could not extract text from PDF")
-    return summarize_with_groq(text, summary_length)
+    return cache_key, None, text
+
+def generate_summary_from_pdf(pdf_file, summary_length='medium'):
+    """Generate summary from PDF file using Groq API"""
+    cache_key, cached, text = _extract_pdf_for_summary(pdf_file, summary_length)
+    if cached:
+        return cached
+
+    summary = summarize_with_groq(text, summary_length)
+    _store_summary(cache_key, summary)
+    return summary
+
+async def generate_summary_from_pdf_async(pdf_file, summary_length='medium'):
+    """generate_summary_from_pdf() for asyncio callers; extraction runs in a worker thread."""
+    cache_key, cached, text = await asyncio.to_thread(_extract_pdf_for_summary, pdf_file, summary_length)
+    if cached:
+        return cached
+
+    summary = await summarize_with_groq_async(text, summary_length)
+    await asyncio.to_thread(_store_summary, cache_key, summary)
+    return summary
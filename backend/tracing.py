@@ -0,0 +1,274 @@
+"""
+Lightweight tracing of the generation pipeline.
+
+A trace is a tree of spans (name, start/end time, attributes, status). The
+current span is kept in a contextvar, so nested span() blocks form the tree
+without passing spans around; work handed to thread pools keeps its parent
+when submitted through in_context(). Incoming W3C traceparent headers are
+honoured, so traces join ones started by a caller.
+
+Finished traces are written by the local exporter as one OpenTelemetry
+(OTLP/JSON) file per request under TRACE_DIR, which the OTel collector's
+file receiver and most trace viewers can load. Tracing is off unless
+TRACING_ENABLED is set; when off, span() costs one contextvar lookup.
+"""
+import os
+import json
+import time
+import random
+import logging
+import secrets
+import threading
+import contextvars
+from contextlib import contextmanager
+from dotenv import load_dotenv
+
+basedir = os.path.abspath(os.path.dirname(__file__))
+dotenv_path = os.path.join(basedir, '.env')
+load_dotenv(dotenv_path)
+
+logger = logging.getLogger(__name__)
+
+TRACING_ENABLED = os.getenv('TRACING_ENABLED', '0') not in ('0', 'false', 'False')
+TRACE_DIR = os.getenv('TRACE_DIR', os.path.join(basedir, 'instance', 'traces'))
+TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', '1'))  # Share of new traces recorded
+TRACE_MIN_DURATION_MS = float(os.getenv('TRACE_MIN_DURATION_MS', '0'))  # Only export traces at least this slow
+
+SERVICE_NAME = 'mcqgenerator-backend'
+
+_current_span = contextvars.ContextVar('current_span', default=None)
+
+
+class _Trace:
+    """Spans of one trace recorded in this process, exported when its local root ends."""
+
+    def __init__(self, trace_id):
+        self.trace_id = trace_id
+        self.spans = []
+        self.exported = False
+        self.lock = threading.Lock()
+
+
+class Span:
+    def __init__(self, name, trace, parent_id=None, kind=1, attributes=None):
+        self.name = name
+        self.trace = trace
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.kind = kind  # OTLP SpanKind: 1 internal, 2 server
+        self.attributes = dict(attributes or {})
+        self.events = []
+        self.error = None
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.is_local_root = False
+        self._token = None
+
+    @property
+    def trace_id(self):
+        return self.trace.trace_id
+
+    @property
+    def traceparent(self):
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def add_attributes(self, **attributes):
+        self.attributes.update(attributes)
+
+    def set_error(self, message):
+        self.error = message
+
+    def record_exception(self, exc):
+        self.set_error(f"{type(exc).__name__}: {exc}")
+        self.events.append({
+            'timeUnixNano': str(time.time_ns()),
+            'name': 'exception',
+            'attributes': _otlp_attributes({'exception.type': type(exc).__name__, 'exception.message': str(exc)})
+        })
+
+    def end(self):
+        if self.end_ns is not None:
+            return
+        self.end_ns = time.time_ns()
+        if self._token is not None:
+            try:
+                _current_span.reset(self._token)
+            except ValueError:
+                # Ended from another context (e.g. an abandoned generator); nothing to restore
+                pass
+        with self.trace.lock:
+            if self.trace.exported:
+                # Stragglers such as batches still in flight after a stream was closed
+                return
+            self.trace.spans.append(self)
+            if not self.is_local_root:
+                return
+            self.trace.exported = True
+        if (self.end_ns - self.start_ns) / 1e6 >= TRACE_MIN_DURATION_MS:
+            exporter.export(self.trace.spans)
+
+    def to_otlp(self):
+        entry = {
+            'traceId': self.trace_id,
+            'spanId': self.span_id,
+            'name': self.name,
+            'kind': self.kind,
+            'startTimeUnixNano': str(self.start_ns),
+            'endTimeUnixNano': str(self.end_ns),
+            'attributes': _otlp_attributes(self.attributes),
+            'status': {'code': 2, 'message': self.error} if self.error else {}
+        }
+        if self.parent_id:
+            entry['parentSpanId'] = self.parent_id
+        if self.events:
+            entry['events'] = self.events
+        return entry
+
+
+class _NoopSpan:
+    """Stands in for a span when tracing is off or the trace was not sampled."""
+    traceparent = None
+
+    def __init__(self, token=None):
+        self._token = token
+
+    def set_attribute(self, key, value):
+        pass
+
+    def add_attributes(self, **attributes):
+        pass
+
+    def set_error(self, message):
+        pass
+
+    def record_exception(self, exc):
+        pass
+
+    def end(self):
+        if self._token is not None:
+            try:
+                _current_span.reset(self._token)
+            except ValueError:
+                pass
+            self._token = None
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+def _otlp_attributes(attributes):
+    result = []
+    for key, value in attributes.items():
+        if isinstance(value, bool):
+            typed = {'boolValue': value}
+        elif isinstance(value, int):
+            typed = {'intValue': str(value)}
+        elif isinstance(value, float):
+            typed = {'doubleValue': value}
+        else:
+            typed = {'stringValue': str(value)}
+        result.append({'key': key, 'value': typed})
+    return result
+
+
+def _parse_traceparent(header):
+    """(trace_id, parent_span_id, sampled) from a W3C traceparent header, or None."""
+    parts = (header or '').strip().split('-')
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16 or set(parts[1]) == {'0'}:
+        return None
+    try:
+        int(parts[1], 16), int(parts[2], 16)
+        sampled = bool(int(parts[3], 16) & 1)
+    except ValueError:
+        return None
+    return parts[1], parts[2], sampled
+
+
+class JsonFileExporter:
+    """Write each finished trace as an OTLP/JSON file named after its trace and root span."""
+
+    def __init__(self, directory=TRACE_DIR):
+        self.directory = directory
+
+    def export(self, spans):
+        if not spans:
+            return
+        root = spans[-1]
+        document = {'resourceSpans': [{
+            'resource': {'attributes': _otlp_attributes({'service.name': SERVICE_NAME})},
+            'scopeSpans': [{
+                'scope': {'name': __name__},
+                'spans': [span.to_otlp() for span in spans]
+            }]
+        }]}
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, f"{root.trace_id}-{root.span_id}.json")
+            with open(path, 'w') as f:
+                json.dump(document, f)
+        except OSError as e:
+            logger.warning("Could not write trace %s: %s", root.trace_id, e)
+
+
+exporter = JsonFileExporter()
+
+
+def current_span():
+    return _current_span.get() or NOOP_SPAN
+
+
+def start_span(name, parent=None, traceparent=None, kind=1, activate=True, **attributes):
+    """
+    Start a span and, unless activate=False, make it the current span until
+    it ends. The parent is the given span, else the current span, else the
+    remote caller in traceparent; without any of those a new trace starts.
+    Spans must be ended with span.end().
+    """
+    if parent is None:
+        parent = _current_span.get()
+    if isinstance(parent, _NoopSpan):
+        return NOOP_SPAN
+    if parent is not None:
+        new_span = Span(name, parent.trace, parent.span_id, kind, attributes)
+    else:
+        if not TRACING_ENABLED:
+            return NOOP_SPAN
+        remote = _parse_traceparent(traceparent)
+        if remote:
+            trace_id, parent_id, sampled = remote
+        else:
+            trace_id, parent_id, sampled = secrets.token_hex(16), None, random.random() < TRACE_SAMPLE_RATE
+        if not sampled:
+            if activate:
+                # Keep children of an unsampled request from starting traces of their own
+                return _NoopSpan(_current_span.set(NOOP_SPAN))
+            return NOOP_SPAN
+        new_span = Span(name, _Trace(trace_id), parent_id, kind, attributes)
+        new_span.is_local_root = True
+    if activate:
+        new_span._token = _current_span.set(new_span)
+    return new_span
+
+
+@contextmanager
+def span(name, parent=None, **attributes):
+    """Trace a with block as a span; exceptions mark the span as failed and are re-raised."""
+    active = start_span(name, parent=parent, **attributes)
+    try:
+        yield active
+    except BaseException as e:
+        if not isinstance(e, GeneratorExit):
+            active.record_exception(e)
+        raise
+    finally:
+        active.end()
+
+
+def in_context(fn):
+    """Wrap fn to run in a copy of the caller's context, so spans it starts on a pool thread keep their parent."""
+    context = contextvars.copy_context()
+    # A context can only be entered by one thread at a time, so every call gets its own copy
+    return lambda *args, **kwargs: context.copy().run(fn, *args, **kwargs)